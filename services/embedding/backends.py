@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Model backends for the embedding server.
+
+The server runs SentenceTransformer either on PyTorch ("torch") or on ONNX
+Runtime ("onnx"), optionally with a dynamically int8-quantized ONNX graph.
+The ONNX backend needs the onnx extra:
+    uv sync --extra onnx
+
+Export an ONNX copy of the model, with an int8 variant for AVX-512 VNNI CPUs:
+    python backends.py export --output models/minilm-onnx --quantize avx512_vnni
+
+Check that it agrees with the torch model on a sample of category titles:
+    python backends.py parity --model models/minilm-onnx \\
+        --model-file onnx/model_qint8_avx512_vnni.onnx \\
+        --titles ../../data/enwiki/categories.parquet
+
+Serve it:
+    python embedding_server.py --model models/minilm-onnx --backend onnx \\
+        --model-file onnx/model_qint8_avx512_vnni.onnx
+"""
+
+import argparse
+import logging
+from typing import List, Optional
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from titles import read_titles
+
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L12-v2"
+BACKENDS = ("torch", "onnx")
+QUANTIZATION_CONFIGS = ("arm64", "avx2", "avx512", "avx512_vnni")
+
+
+def load_model(
+    model_name: str = DEFAULT_MODEL,
+    backend: str = "torch",
+    model_file: Optional[str] = None,
+) -> SentenceTransformer:
+    """
+    Load a SentenceTransformer on the requested backend.
+
+    Args:
+        model_name: Hugging Face model id or local model directory
+        backend: "torch" or "onnx"
+        model_file: ONNX file inside the model directory, e.g. a quantized
+            "onnx/model_qint8_avx512_vnni.onnx"
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+    model_kwargs = {"file_name": model_file} if model_file else None
+    return SentenceTransformer(model_name, backend=backend, model_kwargs=model_kwargs)
+
+
+def model_id(model_name: str, backend: str, model_file: Optional[str]) -> str:
+    """Identify a model and backend, so caches never mix their embeddings."""
+    if backend == "torch":
+        return model_name
+    return f"{model_name}#{model_file or backend}"
+
+
+def export(model_name: str, output: str, quantize: Optional[str] = None):
+    """
+    Export a model to ONNX and optionally add a dynamically quantized copy.
+
+    Args:
+        model_name: Hugging Face model id or local model directory
+        output: Directory to save the exported model to
+        quantize: Quantization config, one of QUANTIZATION_CONFIGS
+    """
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    model = SentenceTransformer(model_name, backend="onnx")
+    model.save_pretrained(output)
+    logging.info(f"Exported ONNX model to {output}/onnx/model.onnx")
+
+    if quantize:
+        export_dynamic_quantized_onnx_model(model, quantize, output)
+        logging.info(
+            f"Exported int8 model to {output}/onnx/model_qint8_{quantize}.onnx"
+        )
+
+
+def parity(
+    model_name: str,
+    backend: str,
+    model_file: Optional[str],
+    titles: List[str],
+    reference_model: str = DEFAULT_MODEL,
+) -> dict:
+    """
+    Compare a backend against the torch reference model.
+
+    Returns:
+        Dict with the mean, minimum and 1st percentile cosine similarity
+        between matching embeddings
+    """
+    reference = load_model(reference_model, "torch").encode(
+        titles, normalize_embeddings=True
+    )
+    candidate = load_model(model_name, backend, model_file).encode(
+        titles, normalize_embeddings=True
+    )
+    cosine = np.sum(reference * candidate, axis=1)
+    return {
+        "titles": len(titles),
+        "mean": float(cosine.mean()),
+        "min": float(cosine.min()),
+        "p1": float(np.percentile(cosine, 1)),
+    }
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    parser = argparse.ArgumentParser(description="Export and check model backends")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export the model to ONNX")
+    export_parser.add_argument("--model", default=DEFAULT_MODEL)
+    export_parser.add_argument("--output", required=True, help="Output directory")
+    export_parser.add_argument(
+        "--quantize",
+        choices=QUANTIZATION_CONFIGS,
+        default=None,
+        help="Also write a dynamically int8-quantized model for this CPU family",
+    )
+
+    parity_parser = subparsers.add_parser(
+        "parity", help="Report cosine agreement with the torch model"
+    )
+    parity_parser.add_argument("--model", default=DEFAULT_MODEL)
+    parity_parser.add_argument("--backend", choices=BACKENDS, default="onnx")
+    parity_parser.add_argument("--model-file", default=None)
+    parity_parser.add_argument(
+        "--reference-model",
+        default=DEFAULT_MODEL,
+        help="Torch model the backend should agree with",
+    )
+    parity_parser.add_argument(
+        "--titles",
+        default=None,
+        help="categories.parquet or a text file of titles (defaults to a small sample)",
+    )
+    parity_parser.add_argument("--sample", type=int, default=2000)
+
+    args = parser.parse_args()
+    if args.command == "export":
+        export(args.model, args.output, quantize=args.quantize)
+    elif args.command == "parity":
+        titles = read_titles(args.titles, args.sample)
+        report = parity(
+            args.model, args.backend, args.model_file, titles, args.reference_model
+        )
+        print(
+            f"Cosine agreement over {report['titles']} titles: "
+            f"mean={report['mean']:.5f} min={report['min']:.5f} p1={report['p1']:.5f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,516 @@
+"""
+Dynamic micro-batching for the embedding server.
+
+Concurrent Encode RPCs submit their texts to a single BatchScheduler. A
+background thread merges whatever arrives within a short window into one
+forward pass, then hands every caller back its own slice of the result.
+Interactive requests have their own lane with a much shorter window, and are
+batched ahead of bulk ingestion. Requests are turned away up front when their
+lane is full or their deadline cannot be met, and texts nobody waits for any
+more are dropped before their batch runs.
+
+A merged batch mixes short titles with long compound names, so it is split
+into token-length buckets first; each bucket is padded only to its own
+longest member.
+
+Before texts reach the scheduler, RequestCoalescer drops repeats within a
+request and lets a request wait on texts another request is already
+encoding, so each distinct text is computed once.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+# encode_fn(texts, prompt_name, stages) may record the seconds it spent per
+# stage, e.g. {"tokenize": ..., "forward": ...}, into stages
+EncodeFn = Callable[[List[str], Optional[str], Dict[str, float]], np.ndarray]
+
+# Priority lanes, highest first
+LANES = ("interactive", "bulk")
+
+
+# Weight of the latest batch in the running seconds-per-text estimate
+THROUGHPUT_SMOOTHING = 0.2
+
+
+class Overloaded(Exception):
+    """A request was turned away before being queued."""
+
+
+class QueueFull(Overloaded):
+    """The request's lane already holds max_queue_texts texts."""
+
+
+class DeadlineUnreachable(Overloaded):
+    """The queue ahead of the request would outlast its deadline."""
+
+
+def resolve(future: Future, result=None, error: Optional[BaseException] = None) -> bool:
+    """
+    Set the outcome of future unless it already has one.
+
+    Callers may cancel a request's future from another thread at any time, so
+    checking done() before setting it is not enough.
+
+    Returns:
+        False if future was cancelled or resolved before
+    """
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+        return True
+    except InvalidStateError:
+        return False
+
+
+@dataclass
+class BatchTiming:
+    """Where the time of one request went, reported back to its caller."""
+
+    # Seconds per stage, e.g. queue, tokenize, forward, serialize
+    stages: Dict[str, float] = field(default_factory=dict)
+    # Texts in the merged batch the request rode in
+    batch_size: Optional[int] = None
+    # Texts answered without a forward pass of this request: cache hits,
+    # repeats and texts computed by a concurrent request
+    reused: Optional[int] = None
+
+
+@dataclass
+class PendingRequest:
+    """Texts from one RPC waiting to be batched."""
+
+    texts: List[str]
+    prompt_name: Optional[str]
+    future: Future = field(default_factory=Future)
+    enqueued_at: float = field(default_factory=time.monotonic)
+    # Returns True once nobody waits for the result, so it can be skipped
+    abandoned: Optional[Callable[[], bool]] = None
+    timing: Optional[BatchTiming] = None
+
+
+def length_buckets(lengths: List[int], width: int) -> List[np.ndarray]:
+    """
+    Group text indices by token length.
+
+    Args:
+        lengths: Token count of each text
+        width: Bucket width in tokens; 0 puts everything in one bucket
+
+    Returns:
+        Index arrays, one per bucket, shortest bucket first
+    """
+    indices = np.arange(len(lengths))
+    if width <= 0:
+        return [indices]
+    keys = (np.asarray(lengths) + width - 1) // width
+    return [indices[keys == key] for key in np.unique(keys)]
+
+
+class PaddingStats:
+    """Counts real and padded tokens across forward passes."""
+
+    def __init__(self):
+        self.tokens = 0
+        self.padded_tokens = 0
+        self._lock = threading.Lock()
+
+    def record(self, lengths: List[int], buckets: List[np.ndarray]):
+        lengths = np.asarray(lengths)
+        padded = sum(len(bucket) * int(lengths[bucket].max()) for bucket in buckets)
+        with self._lock:
+            self.tokens += int(lengths.sum())
+            self.padded_tokens += padded
+
+    @property
+    def efficiency(self) -> float:
+        """Fraction of computed token positions that held real tokens."""
+        return self.tokens / self.padded_tokens if self.padded_tokens else 1.0
+
+
+class RequestCoalescer:
+    """Tracks texts being encoded so identical texts share one computation."""
+
+    def __init__(self):
+        # key -> (future of the claiming request, row in its result)
+        self._in_flight: Dict[Hashable, Tuple[Future, int]] = {}
+        # claiming future -> (keys it owns, futures of every request using it)
+        self._claims: Dict[Future, Tuple[List[Hashable], set]] = {}
+        self._lock = threading.Lock()
+        self.duplicates = 0
+        self.coalesced = 0
+
+    def dedupe(self, texts: List[str]) -> Tuple[List[str], np.ndarray]:
+        """
+        Drop repeated texts.
+
+        Returns:
+            (unique texts in first-seen order, index into them for every text)
+        """
+        first: Dict[str, int] = {}
+        positions = np.array([first.setdefault(text, len(first)) for text in texts])
+        with self._lock:
+            self.duplicates += len(texts) - len(first)
+        return list(first), positions
+
+    def claim(
+        self, keys: List[Hashable], consumer: Future
+    ) -> Tuple[Future, List[int], List[Tuple[int, Future, int]]]:
+        """
+        Claim the keys nobody is computing yet.
+
+        Args:
+            keys: Cache keys of the texts to encode
+            consumer: Future of the calling request; once it and every other
+                consumer of a claim are cancelled, abandon() drops the claim
+
+        Returns:
+            (future, owned, joined): the caller must encode the owned keys
+            (indices into keys) and resolve future with their embeddings, in
+            that order, then call release(). joined lists (index, future, row)
+            for keys another request is already encoding.
+        """
+        future = Future()
+        owned, joined = [], []
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self._in_flight.get(key)
+                if entry is None:
+                    self._in_flight[key] = (future, len(owned))
+                    owned.append(i)
+                else:
+                    joined.append((i, *entry))
+                    self._claims[entry[0]][1].add(consumer)
+            if owned:
+                self._claims[future] = ([keys[i] for i in owned], {consumer})
+            self.coalesced += len(joined)
+        return future, owned, joined
+
+    def abandon(self, future: Future) -> bool:
+        """
+        Drop the claim of future if all of its consumers were cancelled.
+
+        Returns:
+            True if the claim was dropped; later requests claim its keys anew
+        """
+        with self._lock:
+            claim = self._claims.get(future)
+            if claim is None or not all(c.cancelled() for c in claim[1]):
+                return False
+            self._forget(future)
+            return True
+
+    def release(self, future: Future):
+        """Forget the keys claimed with future once their embeddings are stored."""
+        with self._lock:
+            self._forget(future)
+
+    def _forget(self, future: Future):
+        keys, _ = self._claims.pop(future, ((), None))
+        for key in keys:
+            entry = self._in_flight.get(key)
+            if entry is not None and entry[0] is future:
+                del self._in_flight[key]
+
+
+class LaneStats:
+    """Queue depth, latency and load-shedding counters of one priority lane."""
+
+    def __init__(self):
+        self.queued_requests = 0
+        self.queued_texts = 0
+        self.requests = 0
+        # Turned away by admit() and dropped after their RPC ended
+        self.rejected = 0
+        self.skipped = 0
+        self.queue_seconds = 0.0
+        self.latency_seconds = 0.0
+
+    def record(self, request: PendingRequest, started_at: float):
+        finished_at = time.monotonic()
+        self.requests += 1
+        self.queue_seconds += started_at - request.enqueued_at
+        self.latency_seconds += finished_at - request.enqueued_at
+
+    @property
+    def mean_queue_ms(self) -> float:
+        return 1000.0 * self.queue_seconds / self.requests if self.requests else 0.0
+
+    @property
+    def mean_latency_ms(self) -> float:
+        return 1000.0 * self.latency_seconds / self.requests if self.requests else 0.0
+
+
+class BatchScheduler:
+    """
+    Merges texts from concurrent requests into shared forward passes.
+
+    Requests wait in one of LANES. Whenever a runner is free, the next batch
+    is formed from the interactive lane if it has anything queued, and from
+    the bulk lane otherwise, so interactive texts never wait behind queued
+    bulk batches, only behind the ones already running. A bulk batch that is
+    still collecting texts when an interactive request arrives is put back.
+
+    Callers check admit() before submitting, which sheds load with Overloaded
+    instead of letting the lanes grow without bound.
+    """
+
+    def __init__(
+        self,
+        encode_fn: EncodeFn,
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+        concurrency: int = 1,
+        interactive_wait_ms: float = 0.5,
+        max_queue_texts: int = 0,
+        observe_queue: Optional[Callable[[str, float], None]] = None,
+    ):
+        """
+        Start the scheduler thread.
+
+        Args:
+            encode_fn: Callable that encodes a list of texts with a prompt name
+            max_batch_size: Maximum number of texts per forward pass
+            max_wait_ms: How long a bulk batch waits for more texts after the
+                first arrives
+            concurrency: Number of batches that may run at the same time
+            interactive_wait_ms: Same for interactive batches
+            max_queue_texts: Texts a lane may hold before admit() rejects new
+                requests; 0 leaves the lanes unbounded
+            observe_queue: Called with the lane and the seconds each request
+                waited before its batch started, e.g. to feed a metrics
+                histogram
+        """
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_queue_texts = max_queue_texts
+        self.observe_queue = observe_queue
+        self.concurrency = concurrency
+        # Running estimate of forward pass seconds per text, 0 until measured
+        self.seconds_per_text = 0.0
+        self.max_wait = {
+            "interactive": interactive_wait_ms / 1000.0,
+            "bulk": max_wait_ms / 1000.0,
+        }
+        self.lanes: Dict[str, LaneStats] = {lane: LaneStats() for lane in LANES}
+        self._queues: Dict[str, Deque[PendingRequest]] = {
+            lane: deque() for lane in LANES
+        }
+        self._changed = threading.Condition()
+        self._stopping = False
+        # A batch is only formed once a runner is free, so texts keep
+        # accumulating in the lanes while every runner is busy
+        self._runners = threading.Semaphore(concurrency)
+        self._executor = ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="batch-runner"
+        )
+        self._thread = threading.Thread(
+            target=self._run, name="batch-scheduler", daemon=True
+        )
+        self._thread.start()
+
+    def estimate_wait(self, num_texts: int, lane: str = "bulk") -> float:
+        """Seconds until num_texts submitted now to lane would be encoded."""
+        with self._changed:
+            ahead = self.lanes["interactive"].queued_texts
+            if lane == "bulk":
+                ahead += self.lanes["bulk"].queued_texts
+            compute = (ahead + num_texts) * self.seconds_per_text / self.concurrency
+            return self.max_wait[lane] + compute
+
+    def admit(
+        self, num_texts: int, lane: str = "bulk", timeout: Optional[float] = None
+    ):
+        """
+        Check that a request can be queued.
+
+        Args:
+            num_texts: Texts the request would submit
+            lane: "interactive" or "bulk"
+            timeout: Seconds left until the request's deadline, if it has one
+
+        Raises:
+            QueueFull: The lane holds max_queue_texts texts already
+            DeadlineUnreachable: The estimated wait is longer than timeout
+        """
+        with self._changed:
+            stats = self.lanes[lane]
+            queued = stats.queued_texts
+            # A request larger than the cap is still taken on an empty lane
+            if (
+                self.max_queue_texts
+                and queued
+                and queued + num_texts > self.max_queue_texts
+            ):
+                stats.rejected += 1
+                raise QueueFull(f"The {lane} queue is full ({queued} texts waiting)")
+            if timeout is not None:
+                wait = self.estimate_wait(num_texts, lane)
+                if wait > timeout:
+                    stats.rejected += 1
+                    raise DeadlineUnreachable(
+                        f"Expected to wait {wait * 1000:.0f} ms with "
+                        f"{timeout * 1000:.0f} ms left before the deadline"
+                    )
+
+    def submit(
+        self,
+        texts: List[str],
+        prompt_name: Optional[str] = None,
+        lane: str = "bulk",
+        abandoned: Optional[Callable[[], bool]] = None,
+        timing: Optional[BatchTiming] = None,
+    ) -> Future:
+        """
+        Queue texts for encoding.
+
+        Args:
+            texts: Texts to encode
+            prompt_name: Prompt name for the forward pass
+            lane: "interactive" or "bulk"
+            abandoned: Checked when the batch is formed; if it returns True,
+                the texts are dropped and the future is cancelled
+            timing: Filled in with the queue and encode stages and the batch
+                size before the future resolves
+
+        Returns:
+            Future resolving to a numpy array of shape (len(texts), embedding_dim)
+        """
+        request = PendingRequest(
+            texts=list(texts),
+            prompt_name=prompt_name,
+            abandoned=abandoned,
+            timing=timing,
+        )
+        with self._changed:
+            if self._stopping:
+                request.future.set_exception(RuntimeError("Batch scheduler stopped"))
+                return request.future
+            self._queues[lane].append(request)
+            self.lanes[lane].queued_requests += 1
+            self.lanes[lane].queued_texts += len(request.texts)
+            self._changed.notify()
+        return request.future
+
+    def encode(
+        self, texts: List[str], prompt_name: Optional[str] = None, lane: str = "bulk"
+    ) -> np.ndarray:
+        """Queue texts and block until their embeddings are ready."""
+        return self.submit(texts, prompt_name, lane).result()
+
+    def stop(self):
+        """Finish queued work and stop the scheduler thread."""
+        with self._changed:
+            self._stopping = True
+            self._changed.notify()
+        self._thread.join()
+        self._executor.shutdown()
+
+    def _run(self):
+        while True:
+            self._runners.acquire()
+            lane, batch = self._next_batch()
+            if batch is None:
+                break
+            if not batch:
+                # Everything taken was abandoned
+                self._runners.release()
+                continue
+            self._executor.submit(self._run_batch, lane, batch).add_done_callback(
+                lambda _: self._runners.release()
+            )
+
+    def _next_batch(self) -> Tuple[str, Optional[List[PendingRequest]]]:
+        """Wait for the next batch; None once stopped with nothing queued."""
+        with self._changed:
+            while not self._stopping and not any(self._queues.values()):
+                self._changed.wait()
+            if not any(self._queues.values()):
+                return "bulk", None
+
+            lane = "interactive" if self._queues["interactive"] else "bulk"
+            deadline = time.monotonic() + self.max_wait[lane]
+            while not self._stopping:
+                if lane == "bulk" and self._queues["interactive"]:
+                    # Preempt the bulk batch that is still being collected
+                    lane = "interactive"
+                    deadline = time.monotonic() + self.max_wait[lane]
+                if self.lanes[lane].queued_texts >= self.max_batch_size:
+                    break
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                self._changed.wait(timeout)
+
+            queue = self._queues[lane]
+            stats = self.lanes[lane]
+            batch = []
+            size = 0
+            while queue and (
+                not batch or size + len(queue[0].texts) <= self.max_batch_size
+            ):
+                request = queue.popleft()
+                stats.queued_requests -= 1
+                stats.queued_texts -= len(request.texts)
+                if request.abandoned is not None and request.abandoned():
+                    stats.skipped += 1
+                    request.future.cancel()
+                    continue
+                batch.append(request)
+                size += len(request.texts)
+            return lane, batch
+
+    def _run_batch(self, lane: str, batch: List[PendingRequest]):
+        started_at = time.monotonic()
+        num_texts = sum(len(request.texts) for request in batch)
+        if self.observe_queue is not None:
+            for request in batch:
+                self.observe_queue(lane, started_at - request.enqueued_at)
+        # A forward pass takes a single prompt, so split by prompt_name first
+        groups: Dict[Optional[str], List[PendingRequest]] = {}
+        for request in batch:
+            groups.setdefault(request.prompt_name, []).append(request)
+
+        for prompt_name, requests in groups.items():
+            texts = [text for request in requests for text in request.texts]
+            logging.debug(
+                f"Running {lane} batch of {len(texts)} texts from {len(requests)} "
+                f"requests with prompt_name={prompt_name}"
+            )
+            stages: Dict[str, float] = {}
+            try:
+                embeddings = self.encode_fn(texts, prompt_name, stages)
+            except Exception as e:
+                for request in requests:
+                    resolve(request.future, error=e)
+                continue
+
+            offset = 0
+            for request in requests:
+                if request.timing is not None:
+                    request.timing.stages["queue"] = started_at - request.enqueued_at
+                    request.timing.stages.update(stages)
+                    request.timing.batch_size = len(texts)
+                end = offset + len(request.texts)
+                resolve(request.future, embeddings[offset:end])
+                offset = end
+
+        with self._changed:
+            for request in batch:
+                self.lanes[lane].record(request, started_at)
+            seconds = (time.monotonic() - started_at) / num_texts
+            if self.seconds_per_text:
+                seconds = (
+                    THROUGHPUT_SMOOTHING * seconds
+                    + (1 - THROUGHPUT_SMOOTHING) * self.seconds_per_text
+                )
+            self.seconds_per_text = seconds
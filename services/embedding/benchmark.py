@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+Load benchmark for the embedding server.
+
+Starts a server (or targets a running one with --address), replays a corpus
+of category titles as Encode calls at several concurrency levels, and
+reports throughput, latency percentiles and the server's CPU use per level.
+A share of the calls (--query-fraction) sends short search queries cut from
+the titles with the "query" prompt instead, like the web search does:
+
+    python benchmark.py --titles ../../data/enwiki/categories.parquet \\
+        --concurrency 1 4 16 64 --output results.json
+
+Extra server flags go after --server-args. They are added after
+DEFAULT_SERVER_ARGS, which disable the embedding cache so repeated titles
+still reach the model; repeat a default flag to override it:
+
+    python benchmark.py --server-args --aio --max-batch-size 128
+    python benchmark.py --server-args --cache-mb 256
+
+Pass --baseline to compare against the results of an earlier run. Levels
+whose throughput dropped or whose p99 latency grew by more than --tolerance
+are reported as regressions and make the script exit with status 1:
+
+    python benchmark.py --output results.json --baseline baseline.json
+
+Record the baseline on the host that runs the comparisons; numbers from
+different machines are not comparable.
+
+The server's CPU use is read from /proc, summed over the server and its
+worker processes, so it is only reported for a local server on Linux.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+import grpc
+import numpy as np
+
+import embedding_pb2
+import embedding_pb2_grpc
+from titles import read_titles
+
+# Server flags passed before the ones given with --server-args
+DEFAULT_SERVER_ARGS = ["--cache-mb", "0"]
+
+
+def make_queries(titles: List[str]) -> List[str]:
+    """Cut short, lowercase search queries of one to three words from titles."""
+    rng = random.Random(0)
+    queries = []
+    for title in titles:
+        words = title.lower().split()
+        size = min(len(words), rng.randint(1, 3))
+        start = rng.randint(0, len(words) - size)
+        queries.append(" ".join(words[start : start + size]))
+    return queries
+
+
+def free_port() -> int:
+    """Ask the OS for a free TCP port."""
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def process_cpu_seconds(pid: int) -> float:
+    """CPU seconds used by a process and its direct children, from /proc."""
+    ticks = os.sysconf("SC_CLK_TCK")
+    total = 0.0
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces, so split after it
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        # fields[1] is the parent pid; utime and stime follow at 11 and 12
+        if int(entry) == pid or int(fields[1]) == pid:
+            total += (int(fields[11]) + int(fields[12])) / ticks
+    return total
+
+
+def start_server(port: int, server_args: List[str]) -> subprocess.Popen:
+    """Start embedding_server.py on port and wait until it answers HealthCheck."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(here, "embedding_server.py")]
+        + ["--port", str(port)]
+        + server_args,
+        cwd=here,
+    )
+    channel = grpc.insecure_channel(f"localhost:{port}")
+    stub = embedding_pb2_grpc.EmbeddingServiceStub(channel)
+    deadline = time.monotonic() + 600
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"Server exited with status {process.returncode}")
+        try:
+            stub.HealthCheck(embedding_pb2.HealthCheckRequest(), timeout=1)
+            channel.close()
+            return process
+        except grpc.RpcError:
+            time.sleep(0.5)
+    process.terminate()
+    raise SystemExit("Server did not become healthy within 10 minutes")
+
+
+def run_level(
+    stub,
+    titles: List[str],
+    queries: List[str],
+    query_fraction: float,
+    concurrency: int,
+    batch_size: int,
+    duration: float,
+    warmup: float,
+    server_pid: Optional[int],
+) -> Dict:
+    """
+    Keep concurrency Encode calls in flight for warmup + duration seconds.
+
+    Only calls that start after the warmup are measured.
+
+    Returns:
+        Dict with the level's request, text and error counts, throughput,
+        latency percentiles and server CPU use
+    """
+    latencies: List[List[float]] = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    started = time.monotonic()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    def worker(index: int):
+        # Spread the callers over the corpus so batches mix different titles
+        offset = index * len(titles) // concurrency
+        rng = random.Random(index)
+        while True:
+            begin = time.monotonic()
+            if begin >= stop_at:
+                return
+            if rng.random() < query_fraction:
+                corpus, prompt_name = queries, "query"
+            else:
+                corpus, prompt_name = titles, None
+            texts = [corpus[(offset + i) % len(corpus)] for i in range(batch_size)]
+            offset += batch_size
+            request = embedding_pb2.EncodeRequest(
+                texts=texts, prompt_name=prompt_name, packed=True
+            )
+            try:
+                stub.Encode(request)
+            except grpc.RpcError:
+                if begin >= measure_from:
+                    errors[index] += 1
+                continue
+            if begin >= measure_from:
+                latencies[index].append(time.monotonic() - begin)
+
+    threads = [
+        threading.Thread(target=worker, args=(i,), daemon=True)
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+
+    time.sleep(max(0.0, measure_from - time.monotonic()))
+    cpu_before = process_cpu_seconds(server_pid) if server_pid else None
+    client_before = time.process_time()
+    wall_before = time.monotonic()
+    for thread in threads:
+        thread.join()
+    # Calls still in flight at stop_at finish late, so use the real span
+    wall = time.monotonic() - wall_before
+    cpu_after = process_cpu_seconds(server_pid) if server_pid else None
+
+    samples = np.array([latency for worker in latencies for latency in worker])
+    requests = len(samples)
+    percentiles = (
+        np.percentile(samples, [50, 95, 99]) * 1000 if requests else [None] * 3
+    )
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "texts": requests * batch_size,
+        "errors": sum(errors),
+        "seconds": wall,
+        "requests_per_second": requests / wall,
+        "texts_per_second": requests * batch_size / wall,
+        "p50_ms": percentiles[0],
+        "p95_ms": percentiles[1],
+        "p99_ms": percentiles[2],
+        "server_cpu_cores": (
+            (cpu_after - cpu_before) / wall if server_pid is not None else None
+        ),
+        "client_cpu_cores": (time.process_time() - client_before) / wall,
+    }
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """
+    Compare two runs level by level.
+
+    Returns:
+        One message per level whose throughput fell, or whose p99 latency
+        rose, by more than tolerance (a fraction)
+    """
+    regressions = []
+    previous = {level["concurrency"]: level for level in baseline["levels"]}
+    print(f"\n{'conc':>5} {'texts/s':>18} {'p99 ms':>20}")
+    for level in results["levels"]:
+        before = previous.get(level["concurrency"])
+        if before is None or not before["texts_per_second"]:
+            continue
+        throughput = level["texts_per_second"] / before["texts_per_second"] - 1
+        p99 = (
+            level["p99_ms"] / before["p99_ms"] - 1
+            if level["p99_ms"] and before["p99_ms"]
+            else 0.0
+        )
+        print(
+            f"{level['concurrency']:>5} "
+            f"{level['texts_per_second']:>9.1f} ({throughput:+6.1%}) "
+            f"{level['p99_ms'] or 0:>10.2f} ({p99:+6.1%})"
+        )
+        if throughput < -tolerance:
+            regressions.append(
+                f"concurrency {level['concurrency']}: throughput {throughput:+.1%}"
+            )
+        if p99 > tolerance:
+            regressions.append(f"concurrency {level['concurrency']}: p99 {p99:+.1%}")
+    return regressions
+
+
+def print_level(level: Dict):
+    cpu = level["server_cpu_cores"]
+    print(
+        f"concurrency={level['concurrency']:<4} "
+        f"texts/s={level['texts_per_second']:<9.1f} "
+        f"p50={level['p50_ms'] or 0:.2f}ms p95={level['p95_ms'] or 0:.2f}ms "
+        f"p99={level['p99_ms'] or 0:.2f}ms errors={level['errors']} "
+        f"server_cpu={'-' if cpu is None else f'{cpu:.2f}'} "
+        f"client_cpu={level['client_cpu_cores']:.2f}"
+    )
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    parser = argparse.ArgumentParser(description="Benchmark the embedding server")
+    parser.add_argument(
+        "--titles",
+        default=None,
+        help="categories.parquet or a text file of titles (defaults to a small sample)",
+    )
+    parser.add_argument(
+        "--sample", type=int, default=20000, help="Titles sampled from --titles"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        nargs="+",
+        default=[1, 4, 16, 64],
+        help="Concurrent callers per level",
+    )
+    parser.add_argument(
+        "--query-fraction",
+        type=float,
+        default=0.2,
+        help="Share of calls that send short search queries instead of titles",
+    )
+    parser.add_argument("--batch-size", type=int, default=1, help="Texts per call")
+    parser.add_argument(
+        "--duration", type=float, default=20.0, help="Measured seconds per level"
+    )
+    parser.add_argument(
+        "--warmup", type=float, default=3.0, help="Unmeasured seconds per level"
+    )
+    parser.add_argument(
+        "--address",
+        default=None,
+        help="host:port of a running server instead of starting one",
+    )
+    parser.add_argument("--output", default=None, help="Write the results as JSON")
+    parser.add_argument(
+        "--baseline", default=None, help="JSON results of an earlier run to compare"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="Allowed relative throughput loss or p99 growth against the baseline",
+    )
+    parser.add_argument(
+        "--server-args",
+        nargs=argparse.REMAINDER,
+        default=[],
+        help="Everything after this flag is passed to embedding_server.py, "
+        f"after {' '.join(DEFAULT_SERVER_ARGS)}",
+    )
+    args = parser.parse_args()
+    # The server's argparse keeps the last value of a repeated flag
+    server_args = DEFAULT_SERVER_ARGS + args.server_args
+
+    titles = read_titles(args.titles, args.sample)
+    queries = make_queries(titles)
+    server = None
+    if args.address:
+        address = args.address
+    else:
+        port = free_port()
+        logging.info(f"Starting server on port {port}: {' '.join(server_args)}")
+        server = start_server(port, server_args)
+        address = f"localhost:{port}"
+
+    channel = grpc.insecure_channel(
+        address, options=[("grpc.max_receive_message_length", 100 * 1024 * 1024)]
+    )
+    stub = embedding_pb2_grpc.EmbeddingServiceStub(channel)
+    levels = []
+    try:
+        for concurrency in args.concurrency:
+            level = run_level(
+                stub,
+                titles,
+                queries,
+                args.query_fraction,
+                concurrency,
+                args.batch_size,
+                args.duration,
+                args.warmup,
+                server.pid if server is not None else None,
+            )
+            print_level(level)
+            levels.append(level)
+    finally:
+        channel.close()
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    results = {
+        "config": {
+            "titles": args.titles,
+            "sample": len(titles),
+            "query_fraction": args.query_fraction,
+            "batch_size": args.batch_size,
+            "duration": args.duration,
+            "server_args": None if args.address else server_args,
+            "address": args.address,
+            "host": platform.node(),
+            "cpus": os.cpu_count(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "levels": levels,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        logging.info(f"Wrote results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions against the baseline:")
+            for message in regressions:
+                print(f"  {message}")
+            sys.exit(1)
+        print("\nNo regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
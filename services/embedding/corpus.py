@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+Preloaded category corpus for in-process vector search.
+
+A corpus directory holds the vectors of one Qdrant collection, e.g.
+enwiki-categories, in four files plus an optional HNSW index:
+
+    meta.json        collection name, embedding dimension and row count
+    embeddings.f32   L2-normalized little-endian float32 rows
+    qids.u32         little-endian uint32 category qid per row
+    titles.txt       category page title per row, one per line
+    hnsw.faiss       faiss HNSW graph over the rows, built by build-hnsw
+
+The matrix and qids are memory-mapped, so several servers on the same host
+share one copy in the page cache. So is the HNSW index when the installed
+faiss-cpu has IO_FLAG_MMAP_IFC; older releases read it into each server's
+memory.
+
+Searches can be restricted to the categories of one wiki. The allowed rows
+are the corpus qids that appear in {data_dir}/{wiki}/categories.parquet; the
+bitmap is built on first use and cached per wiki.
+
+Export a corpus from Qdrant (needs qdrant-client installed):
+    python corpus.py export enwiki-categories /var/lib/embedding/corpus/enwiki
+
+Build the HNSW index (needs faiss-cpu installed). The build checkpoints the
+index file as it goes and resumes from the rows it already holds:
+    python corpus.py build-hnsw /var/lib/embedding/corpus/enwiki
+
+Serve it:
+    python embedding_server.py --corpus /var/lib/embedding/corpus/enwiki --hnsw
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from vector_search import blocked_top_k, normalize, pack_mask
+
+MATRIX_FILE = "embeddings.f32"
+QIDS_FILE = "qids.u32"
+TITLES_FILE = "titles.txt"
+META_FILE = "meta.json"
+HNSW_FILE = "hnsw.faiss"
+
+# Wiki database names, e.g. enwiki, tawiki, zh_min_nanwiki
+WIKI_NAME = re.compile(r"^[a-z0-9_]+$")
+
+# Search-time HNSW candidate list size when a request does not set one
+DEFAULT_EF = 64
+
+
+def _import_faiss():
+    try:
+        import faiss
+    except ImportError as e:
+        raise SystemExit(
+            "The HNSW index needs faiss-cpu installed (uv sync --extra hnsw)"
+        ) from e
+    return faiss
+
+
+def read_wiki_qids(path: str) -> np.ndarray:
+    """Read the category qids of one wiki from its categories.parquet."""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise SystemExit("Reading wiki categories needs pyarrow installed") from e
+    column = pq.read_table(path, columns=["qid"]).column(0).drop_null()
+    return column.to_numpy().astype(np.uint32)
+
+
+class Corpus:
+    """Category vectors with their qids and titles, searched by brute force."""
+
+    def __init__(self, path: str, hnsw: bool = False, data_dir: str = "data"):
+        """
+        Map a corpus directory.
+
+        Args:
+            path: Corpus directory written by export()
+            hnsw: Also load the HNSW index written by build_hnsw()
+            data_dir: Directory holding {wiki}/categories.parquet for allowlists
+
+        Raises:
+            ValueError: If the files do not agree on the number of rows
+        """
+        self.path = path
+        self.data_dir = data_dir
+        self._allowlists: Dict[str, np.ndarray] = {}
+        self._allowlists_lock = threading.Lock()
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        self.collection = meta["collection"]
+        self.dim = meta["dim"]
+        self.num_rows = meta["rows"]
+
+        self.embeddings = np.memmap(
+            os.path.join(path, MATRIX_FILE),
+            dtype="<f4",
+            mode="r",
+            shape=(self.num_rows, self.dim),
+        )
+        self.qids = np.memmap(
+            os.path.join(path, QIDS_FILE), dtype="<u4", mode="r", shape=(self.num_rows,)
+        )
+        self._titles = np.memmap(
+            os.path.join(path, TITLES_FILE), dtype=np.uint8, mode="r"
+        )
+        self._title_ends = np.flatnonzero(self._titles == ord("\n"))
+        if len(self._title_ends) != self.num_rows:
+            raise ValueError(
+                f"Corpus at {path} has {len(self._title_ends)} titles "
+                f"for {self.num_rows} rows"
+            )
+        logging.info(
+            f"Loaded corpus {self.collection} from {path} "
+            f"with {self.num_rows} rows of dimension {self.dim}"
+        )
+
+        self.hnsw = None
+        if hnsw:
+            faiss = _import_faiss()
+            # IO_FLAG_MMAP_IFC maps the graph and vectors in place; older
+            # faiss-cpu releases only have IO_FLAG_MMAP, which reads them
+            mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+            if mmap_flag is None:
+                logging.warning(
+                    f"faiss {faiss.__version__} cannot memory-map HNSW indexes, "
+                    "reading the whole index into memory; upgrade faiss-cpu to "
+                    "share it between servers"
+                )
+                mmap_flag = faiss.IO_FLAG_MMAP
+            self.hnsw = faiss.read_index(
+                os.path.join(path, HNSW_FILE), mmap_flag | faiss.IO_FLAG_READ_ONLY
+            )
+            if self.hnsw.ntotal != self.num_rows:
+                raise ValueError(
+                    f"HNSW index at {path} covers {self.hnsw.ntotal} of "
+                    f"{self.num_rows} rows, finish it with build-hnsw"
+                )
+            logging.info(f"Loaded HNSW index over {self.hnsw.ntotal} rows")
+
+    def title(self, row: int) -> str:
+        start = int(self._title_ends[row - 1]) + 1 if row else 0
+        return bytes(self._titles[start : self._title_ends[row]]).decode("utf-8")
+
+    def categories_path(self, wiki: str) -> str:
+        return os.path.join(self.data_dir, wiki, "categories.parquet")
+
+    def allowlist(self, wiki: str) -> np.ndarray:
+        """
+        Bitmap of the rows whose qid is a category of the given wiki.
+
+        Built from the wiki's categories.parquet on first use, then cached.
+        """
+        with self._allowlists_lock:
+            bitmap = self._allowlists.get(wiki)
+            if bitmap is None:
+                qids = read_wiki_qids(self.categories_path(wiki))
+                mask = np.isin(self.qids, qids)
+                bitmap = pack_mask(mask)
+                self._allowlists[wiki] = bitmap
+                logging.info(
+                    f"Built {wiki} allowlist: {int(mask.sum())} of "
+                    f"{self.num_rows} corpus rows"
+                )
+        return bitmap
+
+    def search(
+        self, query: np.ndarray, k: int, wiki: Optional[str] = None
+    ) -> List[Tuple[float, int, str]]:
+        """
+        Find the k categories closest to a query embedding.
+
+        Args:
+            query: Query embedding
+            k: Number of results
+            wiki: Only consider categories that exist in this wiki
+
+        Returns:
+            (score, qid, page_title) tuples, best first
+        """
+        return self.search_many(query[np.newaxis], k, wiki)[0]
+
+    def search_many(
+        self, queries: np.ndarray, k: int, wiki: Optional[str] = None
+    ) -> List[List[Tuple[float, int, str]]]:
+        """
+        Find the k categories closest to each of several query embeddings.
+
+        All queries are scored together, one matrix multiply per block of
+        corpus rows, so the matrix is streamed through once for the batch.
+
+        Args:
+            queries: Query embeddings of shape (num_queries, dim)
+            k: Number of results per query
+            wiki: Only consider categories that exist in this wiki
+
+        Returns:
+            One list of (score, qid, page_title) tuples per query, best first
+        """
+        allowed = self.allowlist(wiki) if wiki else None
+        indices, scores = blocked_top_k(
+            normalize(queries), self.embeddings, k, allowed=allowed
+        )
+        return [
+            self._results(row_indices, row_scores)
+            for row_indices, row_scores in zip(indices, scores)
+        ]
+
+    def search_hnsw(
+        self,
+        query: np.ndarray,
+        k: int,
+        ef: int = DEFAULT_EF,
+        wiki: Optional[str] = None,
+    ) -> List[Tuple[float, int, str]]:
+        """
+        Find approximately the k categories closest to a query embedding.
+
+        Args:
+            query: Query embedding
+            k: Number of results
+            ef: Candidate list size; larger is slower and more accurate.
+                Raised to k when smaller.
+            wiki: Only return categories that exist in this wiki. Rows outside
+                the allowlist are still traversed, so a wiki with few
+                categories may need a larger ef.
+
+        Returns:
+            (score, qid, page_title) tuples, best first
+        """
+        faiss = _import_faiss()
+        options = {"efSearch": max(ef, k)}
+        if wiki:
+            bitmap = self.allowlist(wiki)
+            # Takes the bitmap's length in bytes. Passed to the constructor,
+            # which keeps the selector referenced
+            options["sel"] = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+        params = faiss.SearchParametersHNSW(**options)
+        scores, indices = self.hnsw.search(
+            normalize(query[np.newaxis]), k, params=params
+        )
+        # faiss pads with -1 when the graph yields fewer than k rows
+        found = indices[0] >= 0
+        return self._results(indices[0][found], scores[0][found])
+
+    def _results(
+        self, indices: np.ndarray, scores: np.ndarray
+    ) -> List[Tuple[float, int, str]]:
+        return [
+            (score, int(self.qids[row]), self.title(row))
+            for row, score in zip(indices.tolist(), scores.tolist())
+        ]
+
+
+def export(collection: str, output: str, url: str, batch_size: int = 1000):
+    """
+    Export every point of a Qdrant collection into a corpus directory.
+
+    Args:
+        collection: Qdrant collection, e.g. "enwiki-categories"
+        output: Directory to write the corpus to
+        url: Qdrant gRPC URL
+        batch_size: Points fetched per scroll request
+    """
+    try:
+        from qdrant_client import QdrantClient
+    except ImportError as e:
+        raise SystemExit("Exporting a corpus needs qdrant-client installed") from e
+
+    client = QdrantClient(url=url, prefer_grpc=True)
+    total = client.count(collection, exact=True).count
+    os.makedirs(output, exist_ok=True)
+
+    rows = 0
+    dim = None
+    offset = None
+    with (
+        open(os.path.join(output, MATRIX_FILE), "wb") as matrix_file,
+        open(os.path.join(output, QIDS_FILE), "wb") as qids_file,
+        open(os.path.join(output, TITLES_FILE), "w", encoding="utf-8") as titles_file,
+    ):
+        while True:
+            points, offset = client.scroll(
+                collection,
+                limit=batch_size,
+                offset=offset,
+                with_payload=["qid", "page_title"],
+                with_vectors=True,
+            )
+            if points:
+                vectors = normalize([point.vector for point in points])
+                dim = vectors.shape[1]
+                matrix_file.write(vectors.astype("<f4").tobytes())
+                qids = [point.payload["qid"] for point in points]
+                qids_file.write(np.asarray(qids, dtype="<u4").tobytes())
+                for point in points:
+                    title = point.payload["page_title"].replace("\n", " ")
+                    titles_file.write(title + "\n")
+                rows += len(points)
+                logging.info(f"Exported {rows}/{total} points")
+            if offset is None:
+                break
+
+    with open(os.path.join(output, META_FILE), "w") as f:
+        json.dump({"collection": collection, "dim": dim, "rows": rows}, f)
+    logging.info(f"Wrote corpus of {rows} rows to {output}")
+
+
+def build_hnsw(
+    path: str,
+    m: int = 32,
+    ef_construction: int = 200,
+    checkpoint_rows: int = 250_000,
+):
+    """
+    Build the HNSW index of a corpus directory, resuming a partial build.
+
+    Rows are added in corpus order, so the index label of a vector is its
+    corpus row. The index file is rewritten after every checkpoint_rows rows;
+    an interrupted build continues from the last checkpoint. m and
+    ef_construction only apply when a new index is started.
+
+    Args:
+        path: Corpus directory written by export()
+        m: Graph neighbours per node
+        ef_construction: Candidate list size while inserting
+        checkpoint_rows: Rows added between index file writes
+    """
+    faiss = _import_faiss()
+    corpus = Corpus(path)
+    index_path = os.path.join(path, HNSW_FILE)
+
+    if os.path.exists(index_path):
+        index = faiss.read_index(index_path)
+        if index.d != corpus.dim or index.ntotal > corpus.num_rows:
+            raise ValueError(
+                f"{index_path} holds {index.ntotal} vectors of dimension {index.d}, "
+                f"which does not fit a corpus of {corpus.num_rows}x{corpus.dim}"
+            )
+        logging.info(f"Resuming HNSW build at row {index.ntotal}")
+    else:
+        index = faiss.IndexHNSWFlat(corpus.dim, m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = ef_construction
+
+    for start in range(index.ntotal, corpus.num_rows, checkpoint_rows):
+        index.add(
+            np.ascontiguousarray(corpus.embeddings[start : start + checkpoint_rows])
+        )
+        faiss.write_index(index, index_path + ".tmp")
+        os.replace(index_path + ".tmp", index_path)
+        logging.info(f"Indexed {index.ntotal}/{corpus.num_rows} rows")
+
+    logging.info(f"HNSW index at {index_path} covers all {index.ntotal} rows")
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    parser = argparse.ArgumentParser(description="Manage vector search corpora")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser(
+        "export", help="Export a Qdrant collection into a corpus directory"
+    )
+    export_parser.add_argument("collection", help="Collection, e.g. enwiki-categories")
+    export_parser.add_argument("output", help="Corpus directory")
+    export_parser.add_argument(
+        "--qdrant-url",
+        default=os.environ.get("QUADRANT_SERVER", "http://localhost:6334"),
+        help="Qdrant gRPC URL (defaults to $QUADRANT_SERVER)",
+    )
+    export_parser.add_argument("--batch-size", type=int, default=1000)
+
+    hnsw_parser = subparsers.add_parser(
+        "build-hnsw", help="Build or resume the HNSW index of a corpus directory"
+    )
+    hnsw_parser.add_argument("path", help="Corpus directory")
+    hnsw_parser.add_argument(
+        "--m", type=int, default=32, help="Graph neighbours per node"
+    )
+    hnsw_parser.add_argument(
+        "--ef-construction",
+        type=int,
+        default=200,
+        help="Candidate list size while inserting",
+    )
+    hnsw_parser.add_argument(
+        "--checkpoint-rows",
+        type=int,
+        default=250_000,
+        help="Rows added between writes of the index file",
+    )
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export(args.collection, args.output, args.qdrant_url, args.batch_size)
+    elif args.command == "build-hnsw":
+        build_hnsw(args.path, args.m, args.ef_construction, args.checkpoint_rows)
+
+
+if __name__ == "__main__":
+    main()
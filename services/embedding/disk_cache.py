@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Persistent memory-mapped embedding cache.
+
+A cache directory holds three files:
+
+    meta.json        model name and embedding dimension
+    embeddings.f32   fixed-width little-endian float32 rows, append-only
+    index.bin        append-only (key hash, row) records, 16 bytes each
+
+Rows are appended before their index records, so a crash can at worst leave
+unreferenced rows behind. Appends take an exclusive flock on the index, which
+lets several servers on the same host share one directory. Each server picks
+up rows written by the others when it next misses.
+
+The directory only grows; max_rows stops appending once the matrix holds
+that many rows. Compact a cache directory (with the servers using it
+stopped) to drop duplicates and old entries:
+    python disk_cache.py compact /var/cache/embedding --max-entries 3000000
+"""
+
+import argparse
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, Hashable, List, Optional
+
+import numpy as np
+
+INDEX_RECORD = np.dtype([("hash", "<u8"), ("row", "<u8")])
+MATRIX_FILE = "embeddings.f32"
+INDEX_FILE = "index.bin"
+META_FILE = "meta.json"
+# Index entries kept in a dict before they are merged into the sorted arrays
+RECENT_LIMIT = 65536
+
+
+def key_hash(key: Hashable) -> int:
+    """Stable 64-bit hash of a (model name, prompt_name, text) key."""
+    joined = "\0".join("" if part is None else part for part in key)
+    digest = hashlib.blake2b(joined.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def _latest(hashes: np.ndarray, rows: np.ndarray):
+    """Sort by hash, keeping the last of the given rows for every hash."""
+    order = np.argsort(hashes, kind="stable")
+    hashes = hashes[order]
+    rows = rows[order]
+    last = np.append(hashes[1:] != hashes[:-1], True)[: len(hashes)]
+    return hashes[last], rows[last]
+
+
+def _load_index(index_path: str, num_rows: int):
+    """Read index records, keeping the last row per hash that fits the matrix."""
+    if not os.path.exists(index_path):
+        empty = np.empty(0, dtype="<u8")
+        return empty, empty, 0
+    count = os.path.getsize(index_path) // INDEX_RECORD.itemsize
+    records = np.fromfile(index_path, dtype=INDEX_RECORD, count=count)
+    records = records[records["row"] < num_rows]
+    return (*_latest(records["hash"], records["row"]), count * INDEX_RECORD.itemsize)
+
+
+class DiskEmbeddingCache:
+    """Embedding cache backed by an mmapped float32 matrix and a hash index."""
+
+    def __init__(
+        self, path: str, model_name: str, dim: int, max_rows: Optional[int] = None
+    ):
+        """
+        Open or create a cache directory.
+
+        Args:
+            path: Cache directory
+            model_name: Model whose embeddings are stored here
+            dim: Embedding dimension of the model
+            max_rows: Stop appending once the matrix holds this many rows;
+                lookups keep working
+
+        Raises:
+            ValueError: If the directory was written for another model or dimension
+        """
+        self.path = path
+        self.dim = dim
+        self.max_rows = max_rows
+        self.row_bytes = dim * 4
+        self.hits = 0
+        self.misses = 0
+        self._matrix_path = os.path.join(path, MATRIX_FILE)
+        self._index_path = os.path.join(path, INDEX_FILE)
+        self._lock = threading.Lock()
+
+        os.makedirs(path, exist_ok=True)
+        meta_path = os.path.join(path, META_FILE)
+        meta = {"model_name": model_name, "dim": dim}
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                stored = json.load(f)
+            if stored != meta:
+                raise ValueError(
+                    f"Cache at {path} holds {stored}, cannot use it for {meta}"
+                )
+        else:
+            with open(meta_path, "w") as f:
+                json.dump(meta, f)
+
+        self._matrix: Optional[np.memmap] = None
+        self._map_matrix()
+        self._hashes, self._rows, self._index_offset = _load_index(
+            self._index_path, self.num_rows
+        )
+        # Entries appended since the sorted index was last merged, at most
+        # RECENT_LIMIT of them
+        self._recent: Dict[int, int] = {}
+        self._full = False
+        logging.info(f"Opened disk cache at {path} with {self.num_rows} rows")
+
+    @property
+    def num_rows(self) -> int:
+        return 0 if self._matrix is None else self._matrix.shape[0]
+
+    def _map_matrix(self):
+        size = (
+            os.path.getsize(self._matrix_path)
+            if os.path.exists(self._matrix_path)
+            else 0
+        )
+        rows = size // self.row_bytes
+        self._matrix = (
+            np.memmap(self._matrix_path, dtype="<f4", mode="r", shape=(rows, self.dim))
+            if rows
+            else None
+        )
+
+    def _refresh(self):
+        """Pick up index records appended by other processes."""
+        size = os.path.getsize(self._index_path)
+        count = (size - self._index_offset) // INDEX_RECORD.itemsize
+        if count <= 0:
+            return
+        with open(self._index_path, "rb") as f:
+            f.seek(self._index_offset)
+            records = np.fromfile(f, dtype=INDEX_RECORD, count=count)
+        self._index_offset += count * INDEX_RECORD.itemsize
+        self._add_recent(records)
+
+    def _add_recent(self, records: np.ndarray):
+        """Index appended records, merging them into the sorted index in bulk."""
+        self._recent.update(zip(records["hash"].tolist(), records["row"].tolist()))
+        if len(self._recent) <= RECENT_LIMIT:
+            return
+        # Recent entries come last, so they win over older rows of a hash
+        self._hashes, self._rows = _latest(
+            np.concatenate([self._hashes, np.fromiter(self._recent, dtype="<u8")]),
+            np.concatenate(
+                [self._rows, np.fromiter(self._recent.values(), dtype="<u8")]
+            ),
+        )
+        self._recent = {}
+
+    def _find_row(self, hash_value: int) -> Optional[int]:
+        row = self._recent.get(hash_value)
+        if row is not None:
+            return row
+        pos = np.searchsorted(self._hashes, hash_value)
+        if pos < len(self._hashes) and self._hashes[pos] == hash_value:
+            return int(self._rows[pos])
+        return None
+
+    def get_many(self, keys: List[Hashable]) -> List[Optional[np.ndarray]]:
+        """
+        Look up several keys.
+
+        Returns:
+            List aligned with keys holding a copy of the stored embedding or None
+        """
+        hashes = [key_hash(key) for key in keys]
+        with self._lock:
+            rows = [self._find_row(h) for h in hashes]
+            if any(row is None for row in rows) and os.path.exists(self._index_path):
+                self._refresh()
+                rows = [self._find_row(h) for h in hashes]
+            if any(row is not None and row >= self.num_rows for row in rows):
+                self._map_matrix()
+
+            found = []
+            for row in rows:
+                if row is None or row >= self.num_rows:
+                    self.misses += 1
+                    found.append(None)
+                else:
+                    self.hits += 1
+                    found.append(np.array(self._matrix[row]))
+        return found
+
+    def put_many(self, keys: List[Hashable], embeddings: np.ndarray):
+        """Append embeddings and their index records, up to max_rows rows."""
+        embeddings = np.ascontiguousarray(embeddings, dtype="<f4")
+        records = np.empty(len(keys), dtype=INDEX_RECORD)
+        records["hash"] = [key_hash(key) for key in keys]
+
+        with self._lock:
+            if self._full:
+                return
+            with open(self._index_path, "ab") as index_file:
+                fcntl.flock(index_file, fcntl.LOCK_EX)
+                try:
+                    with open(self._matrix_path, "ab") as matrix_file:
+                        # Drop a partial row left behind by an interrupted write
+                        start = matrix_file.seek(0, os.SEEK_END) // self.row_bytes
+                        matrix_file.truncate(start * self.row_bytes)
+                        if self.max_rows is not None:
+                            room = max(0, self.max_rows - start)
+                            embeddings, records = embeddings[:room], records[:room]
+                        matrix_file.write(embeddings.tobytes())
+                    records["row"] = np.arange(start, start + len(records))
+                    end = index_file.seek(0, os.SEEK_END) // INDEX_RECORD.itemsize
+                    index_file.truncate(end * INDEX_RECORD.itemsize)
+                    index_file.write(records.tobytes())
+                finally:
+                    fcntl.flock(index_file, fcntl.LOCK_UN)
+
+            if self.max_rows is not None and start + len(records) >= self.max_rows:
+                self._full = True
+                logging.warning(
+                    f"Disk cache at {self.path} reached {self.max_rows} rows, "
+                    "no longer adding to it; compact it to make room"
+                )
+            self._add_recent(records)
+
+
+def compact(path: str, max_entries: Optional[int] = None):
+    """
+    Rewrite a cache directory without duplicate or unreferenced rows.
+
+    Args:
+        path: Cache directory
+        max_entries: Keep only the most recently appended entries
+    """
+    matrix_path = os.path.join(path, MATRIX_FILE)
+    index_path = os.path.join(path, INDEX_FILE)
+    with open(os.path.join(path, META_FILE)) as f:
+        dim = json.load(f)["dim"]
+    row_bytes = dim * 4
+
+    with open(index_path, "ab") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            num_rows = os.path.getsize(matrix_path) // row_bytes
+            hashes, rows, _ = _load_index(index_path, num_rows)
+
+            order = np.argsort(rows)
+            if max_entries is not None:
+                order = order[-max_entries:] if max_entries > 0 else order[:0]
+            hashes, rows = hashes[order], rows[order]
+
+            matrix = np.memmap(
+                matrix_path, dtype="<f4", mode="r", shape=(num_rows, dim)
+            )
+            with open(matrix_path + ".tmp", "wb") as out:
+                for start in range(0, len(rows), 65536):
+                    out.write(np.ascontiguousarray(matrix[rows[start : start + 65536]]))
+            del matrix
+
+            records = np.empty(len(rows), dtype=INDEX_RECORD)
+            records["hash"] = hashes
+            records["row"] = np.arange(len(rows))
+            records.tofile(index_path + ".tmp")
+
+            os.replace(matrix_path + ".tmp", matrix_path)
+            os.replace(index_path + ".tmp", index_path)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    logging.info(f"Compacted {path}: {num_rows} rows -> {len(rows)} rows")
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    parser = argparse.ArgumentParser(description="Manage the disk embedding cache")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compact_parser = subparsers.add_parser(
+        "compact", help="Drop duplicate and unreferenced rows"
+    )
+    compact_parser.add_argument("path", help="Cache directory")
+    compact_parser.add_argument(
+        "--max-entries",
+        type=int,
+        default=None,
+        help="Keep only the most recently appended entries",
+    )
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        compact(args.path, max_entries=args.max_entries)
+
+
+if __name__ == "__main__":
+    main()
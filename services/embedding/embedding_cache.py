@@ -0,0 +1,77 @@
+"""
+In-memory LRU cache of embeddings for the embedding server.
+
+Entries are keyed by (model name, prompt_name, text) and bounded by the
+number of bytes they hold rather than by entry count, so the budget stays
+meaningful whichever model dimension is loaded.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Hashable, List, Optional
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """Thread-safe LRU cache with a byte budget."""
+
+    def __init__(self, max_bytes: int):
+        """
+        Create an empty cache.
+
+        Args:
+            max_bytes: Upper bound on the bytes held by cached entries
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _entry_bytes(key: Hashable, embedding: np.ndarray) -> int:
+        # The text dominates the key; the tuple overhead is ignored
+        return embedding.nbytes + len(key[-1])
+
+    def get_many(self, keys: List[Hashable]) -> List[Optional[np.ndarray]]:
+        """
+        Look up several keys, marking hits as most recently used.
+
+        Returns:
+            List aligned with keys holding the cached embedding or None
+        """
+        found = []
+        with self._lock:
+            for key in keys:
+                embedding = self._entries.get(key)
+                if embedding is None:
+                    self.misses += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                found.append(embedding)
+        return found
+
+    def put_many(self, keys: List[Hashable], embeddings: np.ndarray):
+        """Store embeddings, evicting least recently used entries over budget."""
+        with self._lock:
+            for key, embedding in zip(keys, embeddings):
+                # Copy so a cached row does not pin the whole batch array
+                embedding = np.array(embedding, dtype=np.float32)
+                size = self._entry_bytes(key, embedding)
+                if size > self.max_bytes:
+                    continue
+                previous = self._entries.pop(key, None)
+                if previous is not None:
+                    self.current_bytes -= self._entry_bytes(key, previous)
+                self._entries[key] = embedding
+                self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                key, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= self._entry_bytes(key, evicted)
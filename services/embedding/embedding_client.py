@@ -5,77 +5,487 @@ Python client for the Embedding gRPC service.
 Usage:
     python embedding_client.py
 
+EmbeddingClient(local=True) loads the model in this process instead, with
+the same batching and caches as the server, for offline jobs on the machine
+that holds the model; every method returns the same results without any RPC:
+
+    with EmbeddingClient(local=True, local_options={"backend": "onnx"}) as client:
+        embeddings = client.encode_documents(titles)
+
+EmbeddingClient makes one blocking call at a time. AsyncEmbeddingClient is
+built on grpc.aio and keeps several Encode calls in flight, which keeps the
+server's batches full when encoding large inputs:
+
+    async with AsyncEmbeddingClient() as client:
+        embeddings = await client.encode_many(titles, batch_size=100, max_in_flight=8)
+
 Make sure the server is running and you've generated the protobuf code:
     python -m grpc_tools.protoc -I. --python_out=. --grpc_python_out=. embedding.proto
 """
 
+import asyncio
 import grpc
 import numpy as np
-from typing import List, Optional, Tuple
+import queue
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 import logging
 
 # Import generated protobuf code
 import embedding_pb2
 import embedding_pb2_grpc
+from batching import BatchTiming
+from hash_ring import HashRing, routing_key
+from vector_search import top_k_cosine
+
+
+CHANNEL_OPTIONS = [
+    ("grpc.max_send_message_length", 100 * 1024 * 1024),
+    ("grpc.max_receive_message_length", 100 * 1024 * 1024),
+]
+
+
+# Scheduling lanes accepted by encode() and encode_stream()
+PRIORITIES = {
+    None: embedding_pb2.PRIORITY_DEFAULT,
+    "interactive": embedding_pb2.PRIORITY_INTERACTIVE,
+    "bulk": embedding_pb2.PRIORITY_BULK,
+}
+
+
+# Prefix of the trailing metadata keys carrying the server's stage timings
+TIMING_METADATA_PREFIX = "x-embedding-"
+
+
+def parse_timing(metadata) -> Dict[str, float]:
+    """
+    Read the stage timings a server reported in its trailing metadata.
+
+    Returns:
+        Dict such as {"queue_ms": 0.4, "tokenize_ms": 0.2, "forward_ms": 7.9,
+        "serialize_ms": 0.1, "total_ms": 8.8, "batch_size": 12, "reused": 0};
+        empty for servers that report nothing
+    """
+    timing = {}
+    for key, value in metadata or ():
+        if key.startswith(TIMING_METADATA_PREFIX):
+            name = key[len(TIMING_METADATA_PREFIX) :].replace("-", "_")
+            timing[name] = float(value)
+    return timing
+
+
+def decode_tensor(tensor) -> np.ndarray:
+    """Wrap a packed Tensor message as a read-only numpy array without copying."""
+    dtype = np.dtype(tensor.dtype).newbyteorder("<")
+    return np.frombuffer(tensor.data, dtype=dtype).reshape(tensor.rows, tensor.dim)
+
+
+def decode_embeddings(response) -> np.ndarray:
+    """
+    Convert an EncodeResponse into a float32 numpy array.
+
+    Packed (v2) responses are wrapped with np.frombuffer without copying, so
+    the returned array is read-only. Servers that predate the packed format
+    answer with repeated Embedding messages, which are converted row by row.
+
+    Args:
+        response: EncodeResponse from the server
+
+    Returns:
+        numpy array of shape (rows, embedding_dim)
+    """
+    if response.HasField("tensor"):
+        return decode_tensor(response.tensor)
+    return np.array([list(emb.values) for emb in response.embeddings], dtype=np.float32)
+
+
+def encode_request(
+    texts: List[str], prompt_name: Optional[str], priority: Optional[str]
+) -> "embedding_pb2.EncodeRequest":
+    """Build a packed EncodeRequest."""
+    request = embedding_pb2.EncodeRequest(
+        texts=texts, packed=True, priority=PRIORITIES[priority]
+    )
+    if prompt_name:
+        request.prompt_name = prompt_name
+    return request
+
+
+def similarity_request(
+    query_embeddings: np.ndarray, document_embeddings: np.ndarray
+) -> "embedding_pb2.SimilarityRequest":
+    """Convert numpy arrays into a SimilarityRequest."""
+    request = embedding_pb2.SimilarityRequest()
+
+    for query_emb in query_embeddings:
+        emb_msg = request.query_embeddings.add()
+        emb_msg.values.extend(query_emb.tolist())
+
+    for doc_emb in document_embeddings:
+        emb_msg = request.document_embeddings.add()
+        emb_msg.values.extend(doc_emb.tolist())
+
+    return request
+
+
+# How calls are spread over several replicas
+ROUTINGS = ("least_outstanding", "hash")
+
+# Recent latencies kept per RPC to derive the hedging delay from
+LATENCY_WINDOW = 256
+# An RPC is only hedged once this many of its latencies have been seen
+HEDGE_MIN_SAMPLES = 20
+
+
+class LatencyWindow:
+    """Latencies of the most recent calls of one RPC."""
+
+    def __init__(self, size: int = LATENCY_WINDOW):
+        self.samples = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """The q-th percentile in seconds, or None while there are too few samples."""
+        with self.lock:
+            samples = list(self.samples)
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return float(np.percentile(samples, q))
+
+
+class Replica:
+    """One server endpoint and the calls this client has outstanding on it."""
+
+    def __init__(self, address: str):
+        self.address = address
+        self.channel = grpc.insecure_channel(address, options=CHANNEL_OPTIONS)
+        self.stub = embedding_pb2_grpc.EmbeddingServiceStub(self.channel)
+        self.outstanding = 0
 
 
 class EmbeddingClient:
     """Client for interacting with the Embedding gRPC service."""
 
-    def __init__(self, host: str = "localhost", port: int = 50051):
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 50051,
+        endpoints: Optional[List[str]] = None,
+        hedge: bool = False,
+        hedge_delay_ms: Optional[float] = None,
+        routing: str = "least_outstanding",
+        local: bool = False,
+        local_options: Optional[Dict[str, Any]] = None,
+    ):
         """
         Initialize the client.
 
+        With local=True no server is used: the model is loaded in this process
+        by an EmbeddingServicer, so backends, batching and caches behave as in
+        the server while embeddings never go through protobuf. The search
+        methods use the corpus given as local_options["corpus_dir"], and fail
+        with ValueError where a server would answer with an error status.
+
+        With several endpoints, each call goes to the replica with the fewest
+        calls outstanding from this client. With routing="hash", texts and
+        queries go to the replica that owns them on a consistent hash ring
+        instead, so every replica caches a different share of them and the
+        total cache grows with the number of replicas; a batch is split into
+        one call per replica and the answers are merged in order. Streams
+        are not split and still go to the least loaded replica.
+
+        A hedged call is sent to a second replica as well when the first has
+        not answered within the hedging delay, and the first answer wins; the
+        delay is the p95 latency of the RPC's recent calls unless
+        hedge_delay_ms is given.
+
         Args:
             host: Server hostname
             port: Server port
+            endpoints: "host:port" of each server replica, used instead of
+                host and port
+            hedge: Whether interactive calls are hedged unless a call says
+                otherwise; bulk calls are never hedged
+            hedge_delay_ms: Fixed hedging delay instead of the recent p95
+            routing: "least_outstanding" or "hash"
+            local: Encode in this process instead of calling a server
+            local_options: EmbeddingServicer arguments for local mode, e.g.
+                {"model_name": ..., "backend": "onnx", "corpus_dir": ...}
         """
-        self.address = f"{host}:{port}"
-        self.channel = grpc.insecure_channel(
-            self.address,
-            options=[
-                ("grpc.max_send_message_length", 100 * 1024 * 1024),
-                ("grpc.max_receive_message_length", 100 * 1024 * 1024),
-            ],
-        )
-        self.stub = embedding_pb2_grpc.EmbeddingServiceStub(self.channel)
+        if routing not in ROUTINGS:
+            raise ValueError(f"routing must be one of {', '.join(ROUTINGS)}")
+        self.hedge = hedge
+        self.hedge_delay_ms = hedge_delay_ms
+        self.ring = None
+        self._executor = None
+        self._latencies: Dict[str, LatencyWindow] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._servicer = None
+        if local:
+            # Imported here so remote clients do not need the model's packages
+            from embedding_server import EmbeddingServicer
+
+            # One process has nothing to shed load for
+            options = {"max_queue_texts": 0, **(local_options or {})}
+            self._servicer = EmbeddingServicer(**options)
+            self.replicas = []
+            self.address = "local"
+            logging.info(f"Loaded {self._servicer.model_name} in process")
+            return
+
+        self.replicas = [
+            Replica(address) for address in endpoints or [f"{host}:{port}"]
+        ]
+        self.address = ", ".join(replica.address for replica in self.replicas)
+        if routing == "hash" and len(self.replicas) > 1:
+            self.ring = HashRing([replica.address for replica in self.replicas])
+            # Sends the per-replica parts of a split batch at once
+            self._executor = ThreadPoolExecutor(
+                max_workers=len(self.replicas), thread_name_prefix="embedding-client"
+            )
         logging.info(f"Connected to embedding service at {self.address}")
 
+    @property
+    def last_timing(self) -> Dict[str, float]:
+        """
+        Server-side stage timings of this thread's last unary call.
+
+        Filled in by encode, compute_similarity, top_k_similarity and the
+        search methods; see parse_timing() for the keys.
+        """
+        return getattr(self._local, "timing", {})
+
+    def _pick(
+        self, exclude: Optional[Replica] = None, owner: Optional[Replica] = None
+    ) -> Replica:
+        """Claim owner, or else the replica with the fewest outstanding calls."""
+        with self._lock:
+            replica = owner or min(
+                (replica for replica in self.replicas if replica is not exclude),
+                key=lambda replica: (replica.outstanding, random.random()),
+            )
+            replica.outstanding += 1
+            return replica
+
+    def _release(self, replica: Replica):
+        with self._lock:
+            replica.outstanding -= 1
+
+    def _latency(self, rpc: str) -> LatencyWindow:
+        with self._lock:
+            return self._latencies.setdefault(rpc, LatencyWindow())
+
+    def _hedge_delay(
+        self, rpc: str, hedge: Optional[bool], priority: Optional[str]
+    ) -> Optional[float]:
+        """Seconds to wait before hedging a call, or None to not hedge it."""
+        if hedge is None:
+            hedge = self.hedge
+        if not hedge or priority == "bulk" or len(self.replicas) < 2:
+            return None
+        if self.hedge_delay_ms is not None:
+            return self.hedge_delay_ms / 1000
+        return self._latency(rpc).percentile(95)
+
+    def _call(
+        self,
+        rpc: str,
+        request,
+        hedge_delay: Optional[float] = None,
+        owner: Optional[Replica] = None,
+    ):
+        """
+        Make a unary call on owner, or else on the least loaded replica.
+
+        Keeps the stage timings from the trailers of the answer that was used
+        and records the call's latency for the hedging delay. In local mode
+        the servicer answers the search requests itself.
+        """
+        if self._servicer is not None:
+            return self._local_call(
+                lambda timing: self._servicer.search(request, timing)
+            )
+        started = time.monotonic()
+        if hedge_delay is None:
+            replica = self._pick(owner=owner)
+            try:
+                response, call = getattr(replica.stub, rpc).with_call(request)
+            finally:
+                self._release(replica)
+        else:
+            response, call = self._hedged_call(rpc, request, hedge_delay, owner)
+        self._latency(rpc).add(time.monotonic() - started)
+        self._local.timing = parse_timing(call.trailing_metadata())
+        return response
+
+    def _hedged_call(
+        self, rpc: str, request, delay: float, owner: Optional[Replica] = None
+    ):
+        """Send request to a second replica too if the first is slower than delay."""
+        finished = queue.Queue()
+
+        def start(replica: Replica):
+            def done(call):
+                self._release(replica)
+                finished.put(call)
+
+            call = getattr(replica.stub, rpc).future(request)
+            call.add_done_callback(done)
+            return call
+
+        first = self._pick(owner=owner)
+        calls = [start(first)]
+        try:
+            try:
+                call = finished.get(timeout=delay)
+            except queue.Empty:
+                logging.debug(f"Hedging {rpc} after {delay * 1000:.1f} ms")
+                calls.append(start(self._pick(exclude=first)))
+                call = finished.get()
+                if call.exception() is not None:
+                    # The other replica may still answer
+                    call = finished.get()
+            return call.result(), call
+        finally:
+            for call in calls:
+                call.cancel()
+
+    def _local_call(self, run):
+        """Return run(timing) from the in-process servicer, keeping its timings."""
+        from embedding_server import timing_metadata
+
+        started = time.perf_counter()
+        timing = BatchTiming()
+        result = run(timing)
+        self._local.timing = parse_timing(timing_metadata(timing, started))
+        return result
+
+    def _encode_local(
+        self, texts: List[str], prompt_name: Optional[str], priority: Optional[str]
+    ) -> np.ndarray:
+        lane = "bulk" if priority == "bulk" else "interactive"
+        return self._local_call(
+            lambda timing: self._servicer.encode(texts, prompt_name, lane, timing)
+        )
+
+    def _owner(self, text: str, prompt_name: Optional[str]) -> Optional[Replica]:
+        """The replica a text is routed to, or None without hash routing."""
+        if self.ring is None:
+            return None
+        return self.replicas[self.ring.assign([routing_key(text, prompt_name)])[0]]
+
+    def _shares(
+        self, texts: List[str], prompt_name: Optional[str]
+    ) -> List[Tuple[Optional[Replica], np.ndarray]]:
+        """
+        Split the rows of a batch by the replica owning their text.
+
+        Returns:
+            (replica, row indices) per replica with rows; a single share of
+            all rows without a replica when hash routing is off
+        """
+        if self.ring is None or not texts:
+            return [(None, np.arange(len(texts)))]
+        owners = self.ring.assign([routing_key(text, prompt_name) for text in texts])
+        return [
+            (self.replicas[index], np.flatnonzero(owners == index))
+            for index in np.unique(owners)
+        ]
+
+    def _map_shares(self, call, shares: List[Tuple[Optional[Replica], np.ndarray]]):
+        """
+        Run call(replica, rows) for every share, in parallel when there are several.
+
+        The stage timings of the slowest share become this thread's last_timing.
+        """
+        if len(shares) == 1:
+            return [call(*shares[0])]
+
+        def run(share):
+            # last_timing is per thread, so pass it back with the result
+            return call(*share), self.last_timing
+
+        outcomes = list(self._executor.map(run, shares))
+        self._local.timing = max(
+            (timing for _, timing in outcomes),
+            key=lambda timing: timing.get("total_ms", 0.0),
+        )
+        return [result for result, _ in outcomes]
+
     def health_check(self) -> Tuple[bool, str]:
         """
         Check if the service is healthy.
 
         Returns:
-            Tuple of (healthy: bool, model_name: str)
+            Tuple of (healthy: bool, model_name: str); healthy only when every
+            replica is
         """
-        try:
-            request = embedding_pb2.HealthCheckRequest()
-            response = self.stub.HealthCheck(request)
-            return response.healthy, response.model_name
-        except grpc.RpcError as e:
-            logging.error(f"Health check failed: {e}")
-            return False, ""
+        if self._servicer is not None:
+            return True, self._servicer.model_name
+        healthy, model_name = True, ""
+        for replica in self.replicas:
+            try:
+                request = embedding_pb2.HealthCheckRequest()
+                response = replica.stub.HealthCheck(request)
+                healthy = healthy and response.healthy
+                model_name = model_name or response.model_name
+            except grpc.RpcError as e:
+                logging.error(f"Health check of {replica.address} failed: {e}")
+                healthy = False
+        return healthy, model_name
 
-    def encode(self, texts: List[str], prompt_name: Optional[str] = None) -> np.ndarray:
+    def encode(
+        self,
+        texts: List[str],
+        prompt_name: Optional[str] = None,
+        priority: Optional[str] = None,
+        hedge: Optional[bool] = None,
+    ) -> np.ndarray:
         """
         Encode texts into embeddings.
 
         Args:
             texts: List of text strings to encode
             prompt_name: Optional prompt name (e.g., "query" for queries)
+            priority: "interactive" (the server default for Encode) or "bulk"
+                for ingestion jobs that should not delay interactive callers
+            hedge: Hedge this call across replicas; defaults to the client's
+                setting
+
+        Raises:
+            ValueError: texts is empty
 
         Returns:
             numpy array of shape (len(texts), embedding_dim)
         """
-        try:
-            request = embedding_pb2.EncodeRequest(texts=texts)
-            if prompt_name:
-                request.prompt_name = prompt_name
+        if not texts:
+            raise ValueError("texts cannot be empty")
+        if self._servicer is not None:
+            return self._encode_local(texts, prompt_name, priority)
+        hedge_delay = self._hedge_delay("Encode", hedge, priority)
 
-            response = self.stub.Encode(request)
+        def encode_share(owner: Optional[Replica], rows: np.ndarray) -> np.ndarray:
+            request = encode_request([texts[i] for i in rows], prompt_name, priority)
+            return decode_embeddings(self._call("Encode", request, hedge_delay, owner))
 
-            # Convert protobuf embeddings to numpy array
-            embeddings = np.array([list(emb.values) for emb in response.embeddings])
+        try:
+            shares = self._shares(texts, prompt_name)
+            blocks = self._map_shares(encode_share, shares)
+            if len(blocks) == 1:
+                embeddings = blocks[0]
+            else:
+                embeddings = np.empty((len(texts), blocks[0].shape[1]), np.float32)
+                for (_, rows), block in zip(shares, blocks):
+                    embeddings[rows] = block
 
             logging.debug(f"Encoded {len(texts)} texts into shape {embeddings.shape}")
             return embeddings
@@ -84,6 +494,134 @@ class EmbeddingClient:
             logging.error(f"Encode failed: {e.code()}: {e.details()}")
             raise
 
+    def encode_chunks(
+        self,
+        items: Iterable[Tuple[Any, str]],
+        batch_size: int = 100,
+        prompt_name: Optional[str] = None,
+        priority: Optional[str] = None,
+        max_in_flight: int = 4,
+    ) -> Iterator[Tuple[List[Any], np.ndarray]]:
+        """
+        Encode an iterable of (id, text) pairs over one EncodeStream call.
+
+        The iterable is read lazily, batch_size texts per chunk, and at most
+        max_in_flight chunks are sent ahead of the one being consumed, so
+        memory stays at a few chunks however large the corpus is and the
+        output can be written out as it arrives:
+
+            for ids, block in client.encode_chunks(rows, batch_size=256):
+                writer.write(ids, block)
+
+        Args:
+            items: Iterable of (id, text) pairs; ids stay on the client, so any
+                value works
+            batch_size: Number of texts per streamed chunk
+            prompt_name: Optional prompt name (e.g., "query" for queries)
+            priority: "bulk" (the server default for streams) or "interactive"
+            max_in_flight: Chunks sent but not yet consumed; the server also
+                caps this at its --stream-window
+
+        Yields:
+            (ids, embeddings) per chunk in input order, where embeddings is a
+            read-only float32 array of shape (len(ids), embedding_dim)
+        """
+        if self._servicer is not None:
+            yield from self._encode_chunks_local(
+                items, batch_size, prompt_name, priority
+            )
+            return
+
+        # Ids of the chunks sent so far; the server answers them in order
+        sent = deque()
+        window = threading.Semaphore(max_in_flight)
+        stopped = threading.Event()
+
+        def request(number: int, texts: List[str]):
+            # The server only sees positions; the caller's ids are kept here
+            return embedding_pb2.EncodeStreamRequest(
+                ids=range(number, number + len(texts)),
+                texts=texts,
+                prompt_name=prompt_name,
+                priority=PRIORITIES[priority],
+            )
+
+        def chunks():
+            number = 0
+            ids, texts = [], []
+            for item_id, text in items:
+                ids.append(item_id)
+                texts.append(text)
+                if len(texts) == batch_size:
+                    window.acquire()
+                    if stopped.is_set():
+                        return
+                    sent.append(ids)
+                    yield request(number, texts)
+                    number += len(texts)
+                    ids, texts = [], []
+            if texts:
+                window.acquire()
+                if stopped.is_set():
+                    return
+                sent.append(ids)
+                yield request(number, texts)
+
+        replica = self._pick()
+        responses = replica.stub.EncodeStream(chunks())
+        try:
+            for response in responses:
+                yield sent.popleft(), decode_tensor(response.tensor)
+                window.release()
+        except grpc.RpcError as e:
+            logging.error(f"EncodeStream failed: {e.code()}: {e.details()}")
+            raise
+        finally:
+            # Wake the sending thread so it stops reading items
+            stopped.set()
+            window.release()
+            responses.cancel()
+            self._release(replica)
+
+    def _encode_chunks_local(
+        self,
+        items: Iterable[Tuple[Any, str]],
+        batch_size: int,
+        prompt_name: Optional[str],
+        priority: Optional[str],
+    ) -> Iterator[Tuple[List[Any], np.ndarray]]:
+        """encode_chunks() on the in-process servicer; streams default to bulk."""
+        priority = priority or "bulk"
+        ids, texts = [], []
+        for item_id, text in items:
+            ids.append(item_id)
+            texts.append(text)
+            if len(texts) == batch_size:
+                yield ids, self._encode_local(texts, prompt_name, priority)
+                ids, texts = [], []
+        if texts:
+            yield ids, self._encode_local(texts, prompt_name, priority)
+
+    def encode_stream(
+        self,
+        items: Iterable[Tuple[int, str]],
+        batch_size: int = 100,
+        prompt_name: Optional[str] = None,
+        priority: Optional[str] = None,
+    ) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Encode an iterable of (id, text) pairs, one embedding at a time.
+
+        Same as encode_chunks(), with the chunks split into single rows.
+
+        Yields:
+            (id, embedding) pairs in input order
+        """
+        for ids, embeddings in self.encode_chunks(
+            items, batch_size, prompt_name, priority
+        ):
+            yield from zip(ids, embeddings)
+
     def encode_queries(self, queries: List[str]) -> np.ndarray:
         """
         Encode queries with the appropriate prompt.
@@ -100,6 +638,9 @@ class EmbeddingClient:
         """
         Encode documents without a prompt.
 
+        All documents and embeddings are held in memory at once; use
+        encode_chunks() for corpora that do not fit.
+
         Args:
             documents: List of document strings
 
@@ -119,26 +660,21 @@ class EmbeddingClient:
             document_embeddings: numpy array of shape (num_docs, embedding_dim)
 
         Returns:
-            numpy array of shape (num_queries, num_docs) with similarity scores
+            float32 array of shape (num_queries, num_docs) with similarity scores
         """
+        if self._servicer is not None:
+            return self._servicer.similarity(
+                np.asarray(query_embeddings, dtype=np.float32),
+                np.asarray(document_embeddings, dtype=np.float32),
+            )
         try:
-            # Convert numpy arrays to protobuf format
-            request = embedding_pb2.SimilarityRequest()
-
-            for query_emb in query_embeddings:
-                emb_msg = request.query_embeddings.add()
-                emb_msg.values.extend(query_emb.tolist())
+            request = similarity_request(query_embeddings, document_embeddings)
+            response = self._call("ComputeSimilarity", request)
 
-            for doc_emb in document_embeddings:
-                emb_msg = request.document_embeddings.add()
-                emb_msg.values.extend(doc_emb.tolist())
-
-            response = self.stub.ComputeSimilarity(request)
-
-            # Reshape flat array into matrix
-            similarity_matrix = np.array(response.similarities).reshape(
-                response.num_queries, response.num_documents
-            )
+            # Reshape flat array into matrix; the scores are float32 on the wire
+            similarity_matrix = np.array(
+                response.similarities, dtype=np.float32
+            ).reshape(response.num_queries, response.num_documents)
 
             logging.debug(
                 f"Computed similarity matrix of shape {similarity_matrix.shape}"
@@ -149,6 +685,53 @@ class EmbeddingClient:
             logging.error(f"ComputeSimilarity failed: {e.code()}: {e.details()}")
             raise
 
+    def top_k_similarity(
+        self,
+        query_embeddings: np.ndarray,
+        document_embeddings: np.ndarray,
+        top_k: int,
+        min_score: Optional[float] = None,
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Find the best matching documents per query on the server.
+
+        Only the top_k matches per query cross the wire instead of the full
+        similarity matrix.
+
+        Args:
+            query_embeddings: numpy array of shape (num_queries, embedding_dim)
+            document_embeddings: numpy array of shape (num_docs, embedding_dim)
+            top_k: Number of matches to return per query
+            min_score: Optional lower bound on the cosine similarity
+
+        Returns:
+            List of lists, where each inner list contains (doc_index, score) tuples
+        """
+        if self._servicer is not None:
+            if top_k < 0:
+                raise ValueError("top_k cannot be negative")
+            return top_k_cosine(
+                np.asarray(query_embeddings, dtype=np.float32),
+                np.asarray(document_embeddings, dtype=np.float32),
+                top_k,
+                min_score,
+            )
+        try:
+            request = similarity_request(query_embeddings, document_embeddings)
+            request.top_k = top_k
+            if min_score is not None:
+                request.min_score = min_score
+
+            response = self._call("ComputeSimilarity", request)
+            return [
+                list(zip(matches.indices, matches.scores))
+                for matches in response.matches
+            ]
+
+        except grpc.RpcError as e:
+            logging.error(f"ComputeSimilarity failed: {e.code()}: {e.details()}")
+            raise
+
     def find_most_similar(
         self, queries: List[str], documents: List[str], top_k: int = 1
     ) -> List[List[Tuple[int, float]]]:
@@ -167,22 +750,177 @@ class EmbeddingClient:
         query_embs = self.encode_queries(queries)
         doc_embs = self.encode_documents(documents)
 
-        # Compute similarity
-        similarity_matrix = self.compute_similarity(query_embs, doc_embs)
+        # Let the server pick the top-k for each query
+        return self.top_k_similarity(query_embs, doc_embs, top_k)
+
+    def encode_and_search(
+        self,
+        query: str,
+        k: int = 10,
+        prompt_name: Optional[str] = None,
+        collection: Optional[str] = None,
+        wiki: Optional[str] = None,
+        hedge: Optional[bool] = None,
+    ) -> List[Tuple[float, int, str]]:
+        """
+        Find the categories closest to a query in the server's preloaded corpus.
+
+        Args:
+            query: Query text
+            k: Number of results
+            prompt_name: Optional prompt name for encoding the query
+            collection: Fail with NOT_FOUND unless the corpus was exported from
+                this collection, e.g. "enwiki-categories"
+            wiki: Only return categories that exist in this wiki, e.g. "tawiki"
+            hedge: Hedge this call across replicas; defaults to the client's
+                setting
+
+        Returns:
+            List of (score, qid, page_title) tuples, best first
+        """
+        try:
+            request = embedding_pb2.EncodeAndSearchRequest(
+                query=query,
+                k=k,
+                prompt_name=prompt_name,
+                collection=collection,
+                wiki=wiki,
+            )
+            response = self._call(
+                "EncodeAndSearch",
+                request,
+                self._hedge_delay("EncodeAndSearch", hedge, None),
+                self._owner(query, prompt_name),
+            )
+            return [
+                (result.score, result.qid, result.page_title)
+                for result in response.results
+            ]
+
+        except grpc.RpcError as e:
+            logging.error(f"EncodeAndSearch failed: {e.code()}: {e.details()}")
+            raise
 
-        # Find top-k for each query
-        results = []
-        for query_idx in range(len(queries)):
-            scores = similarity_matrix[query_idx]
-            top_indices = np.argsort(scores)[::-1][:top_k]
-            top_results = [(int(idx), float(scores[idx])) for idx in top_indices]
-            results.append(top_results)
+    def batch_search(
+        self,
+        queries: List[str],
+        k: int = 10,
+        prompt_name: Optional[str] = None,
+        collection: Optional[str] = None,
+        wiki: Optional[str] = None,
+        hedge: Optional[bool] = None,
+    ) -> List[List[Tuple[float, int, str]]]:
+        """
+        Search the server's preloaded corpus for many queries in one call.
 
-        return results
+        The queries are encoded together and scored against the corpus with
+        one matrix multiply per block, which is much cheaper than one
+        encode_and_search call per query.
+
+        Args:
+            queries: Query texts
+            k: Number of results per query
+            prompt_name: Optional prompt name for encoding the queries
+            collection: Fail with NOT_FOUND unless the corpus was exported from
+                this collection
+            wiki: Only return categories that exist in this wiki
+            hedge: Hedge this call across replicas; defaults to the client's
+                setting
+
+        Returns:
+            One list of (score, qid, page_title) tuples per query, best first
+        """
+        hedge_delay = self._hedge_delay("BatchSearch", hedge, None)
+
+        def search_share(owner: Optional[Replica], rows: np.ndarray):
+            request = embedding_pb2.BatchSearchRequest(
+                queries=[queries[i] for i in rows],
+                k=k,
+                prompt_name=prompt_name,
+                collection=collection,
+                wiki=wiki,
+            )
+            response = self._call("BatchSearch", request, hedge_delay, owner)
+            return [
+                [
+                    (result.score, result.qid, result.page_title)
+                    for result in entry.results
+                ]
+                for entry in response.results
+            ]
+
+        try:
+            shares = self._shares(queries, prompt_name)
+            parts = self._map_shares(search_share, shares)
+            results = [None] * len(queries)
+            for (_, rows), part in zip(shares, parts):
+                for row, entry in zip(rows, part):
+                    results[row] = entry
+            return results
+
+        except grpc.RpcError as e:
+            logging.error(f"BatchSearch failed: {e.code()}: {e.details()}")
+            raise
+
+    def search(
+        self,
+        query: str,
+        k: int = 10,
+        ef: Optional[int] = None,
+        prompt_name: Optional[str] = None,
+        collection: Optional[str] = None,
+        wiki: Optional[str] = None,
+        hedge: Optional[bool] = None,
+    ) -> List[Tuple[float, int, str]]:
+        """
+        Find approximately the closest categories using the server's HNSW index.
+
+        Args:
+            query: Query text
+            k: Number of results
+            ef: HNSW candidate list size; higher is slower and more accurate
+            prompt_name: Optional prompt name for encoding the query
+            collection: Fail with NOT_FOUND unless the corpus was exported from
+                this collection
+            wiki: Only return categories that exist in this wiki
+            hedge: Hedge this call across replicas; defaults to the client's
+                setting
+
+        Returns:
+            List of (score, qid, page_title) tuples, best first
+        """
+        try:
+            request = embedding_pb2.SearchRequest(
+                query=query,
+                k=k,
+                ef=ef,
+                prompt_name=prompt_name,
+                collection=collection,
+                wiki=wiki,
+            )
+            response = self._call(
+                "Search",
+                request,
+                self._hedge_delay("Search", hedge, None),
+                self._owner(query, prompt_name),
+            )
+            return [
+                (result.score, result.qid, result.page_title)
+                for result in response.results
+            ]
+
+        except grpc.RpcError as e:
+            logging.error(f"Search failed: {e.code()}: {e.details()}")
+            raise
 
     def close(self):
-        """Close the gRPC channel."""
-        self.channel.close()
+        """Close the gRPC channels, or release the model in local mode."""
+        if self._servicer is not None:
+            self._servicer.close()
+        if self._executor is not None:
+            self._executor.shutdown()
+        for replica in self.replicas:
+            replica.channel.close()
         logging.info("Connection closed")
 
     def __enter__(self):
@@ -194,6 +932,147 @@ class EmbeddingClient:
         self.close()
 
 
+class AsyncEmbeddingClient:
+    """grpc.aio client for encoding large inputs with several calls in flight."""
+
+    def __init__(self, host: str = "localhost", port: int = 50051):
+        """
+        Initialize the client. Must be called while an event loop is running.
+
+        Args:
+            host: Server hostname
+            port: Server port
+        """
+        self.address = f"{host}:{port}"
+        self.channel = grpc.aio.insecure_channel(self.address, options=CHANNEL_OPTIONS)
+        self.stub = embedding_pb2_grpc.EmbeddingServiceStub(self.channel)
+        logging.info(f"Connected to embedding service at {self.address}")
+
+    async def health_check(self) -> Tuple[bool, str]:
+        """
+        Check if the service is healthy.
+
+        Returns:
+            Tuple of (healthy: bool, model_name: str)
+        """
+        try:
+            response = await self.stub.HealthCheck(embedding_pb2.HealthCheckRequest())
+            return response.healthy, response.model_name
+        except grpc.RpcError as e:
+            logging.error(f"Health check failed: {e}")
+            return False, ""
+
+    async def encode(
+        self,
+        texts: List[str],
+        prompt_name: Optional[str] = None,
+        priority: Optional[str] = None,
+    ) -> np.ndarray:
+        """
+        Encode texts into embeddings with one Encode call.
+
+        Args:
+            texts: List of text strings to encode
+            prompt_name: Optional prompt name (e.g., "query" for queries)
+            priority: "interactive" (the server default for Encode) or "bulk"
+
+        Returns:
+            numpy array of shape (len(texts), embedding_dim)
+        """
+        try:
+            response = await self.stub.Encode(
+                encode_request(texts, prompt_name, priority)
+            )
+            return decode_embeddings(response)
+        except grpc.RpcError as e:
+            logging.error(f"Encode failed: {e.code()}: {e.details()}")
+            raise
+
+    async def encode_many(
+        self,
+        texts: List[str],
+        batch_size: int = 100,
+        max_in_flight: int = 4,
+        prompt_name: Optional[str] = None,
+        priority: Optional[str] = None,
+    ) -> np.ndarray:
+        """
+        Encode a large list of texts with up to max_in_flight calls outstanding.
+
+        The texts are split into batches of batch_size. Each reply is copied
+        into its rows of one preallocated array as it arrives, so the result
+        is in input order whatever order the calls finish in. If a call fails
+        the outstanding ones are cancelled and its error is raised.
+
+        Args:
+            texts: List of text strings to encode
+            batch_size: Number of texts per Encode call
+            max_in_flight: Number of Encode calls kept outstanding
+            prompt_name: Optional prompt name (e.g., "query" for queries)
+            priority: "interactive" (the server default for Encode) or "bulk"
+                for ingestion jobs that should not delay interactive callers
+
+        Returns:
+            float32 numpy array of shape (len(texts), embedding_dim)
+        """
+        if not texts:
+            raise ValueError("texts cannot be empty")
+        starts = iter(range(0, len(texts), batch_size))
+        embeddings = None
+
+        async def worker():
+            nonlocal embeddings
+            # The workers share one iterator, so each batch is sent exactly once
+            for start in starts:
+                batch = texts[start : start + batch_size]
+                block = await self.encode(batch, prompt_name, priority)
+                if embeddings is None:
+                    # The dimension is only known once the first reply is in
+                    embeddings = np.empty(
+                        (len(texts), block.shape[1]), dtype=np.float32
+                    )
+                embeddings[start : start + len(batch)] = block
+
+        num_batches = -(-len(texts) // batch_size)
+        workers = [
+            asyncio.create_task(worker())
+            for _ in range(min(max_in_flight, num_batches))
+        ]
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            for task in workers:
+                task.cancel()
+            raise
+
+        logging.debug(
+            f"Encoded {len(texts)} texts in {num_batches} calls "
+            f"into shape {embeddings.shape}"
+        )
+        return embeddings
+
+    async def close(self):
+        """Close the gRPC channel."""
+        await self.channel.close()
+        logging.info("Connection closed")
+
+    async def __aenter__(self):
+        """Async context manager entry."""
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Async context manager exit."""
+        await self.close()
+
+
+async def encode_many_example():
+    """Encode a larger batch with several calls in flight."""
+    async with AsyncEmbeddingClient() as client:
+        texts = [f"Concurrent text number {i}" for i in range(1000)]
+        embeddings = await client.encode_many(texts, batch_size=100, max_in_flight=4)
+        print(f"Encoded {len(texts)} texts into shape {embeddings.shape}")
+
+
 def main():
     """Example usage of the embedding client."""
     logging.basicConfig(
@@ -268,6 +1147,20 @@ def main():
         print(f"Encoded {len(large_batch)} texts")
         print(f"Embeddings shape: {batch_embeddings.shape}")
 
+        # Example 5: Streaming
+        print("\n" + "=" * 60)
+        print("Example 5: Streaming (id, text) pairs")
+        print("=" * 60)
+        items = ((i, f"Streamed text number {i}") for i in range(1000))
+        streamed = sum(1 for _ in client.encode_stream(items, batch_size=100))
+        print(f"Streamed {streamed} embeddings")
+
+    # Example 6: Several calls in flight
+    print("\n" + "=" * 60)
+    print("Example 6: Concurrent Encoding (AsyncEmbeddingClient)")
+    print("=" * 60)
+    asyncio.run(encode_many_example())
+
 
 if __name__ == "__main__":
     main()
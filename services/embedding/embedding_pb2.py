@@ -24,27 +24,51 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0f\x65mbedding.proto\x12\tembedding\"H\n\rEncodeRequest\x12\r\n\x05texts\x18\x01 \x03(\t\x12\x18\n\x0bprompt_name\x18\x02 \x01(\tH\x00\x88\x01\x01\x42\x0e\n\x0c_prompt_name\":\n\x0e\x45ncodeResponse\x12(\n\nembeddings\x18\x01 \x03(\x0b\x32\x14.embedding.Embedding\"\x1b\n\tEmbedding\x12\x0e\n\x06values\x18\x01 \x03(\x02\"v\n\x11SimilarityRequest\x12.\n\x10query_embeddings\x18\x01 \x03(\x0b\x32\x14.embedding.Embedding\x12\x31\n\x13\x64ocument_embeddings\x18\x02 \x03(\x0b\x32\x14.embedding.Embedding\"V\n\x12SimilarityResponse\x12\x14\n\x0csimilarities\x18\x01 \x03(\x02\x12\x13\n\x0bnum_queries\x18\x02 \x01(\x05\x12\x15\n\rnum_documents\x18\x03 \x01(\x05\"\x14\n\x12HealthCheckRequest\":\n\x13HealthCheckResponse\x12\x0f\n\x07healthy\x18\x01 \x01(\x08\x12\x12\n\nmodel_name\x18\x02 \x01(\t2\xf1\x01\n\x10\x45mbeddingService\x12=\n\x06\x45ncode\x12\x18.embedding.EncodeRequest\x1a\x19.embedding.EncodeResponse\x12P\n\x11\x43omputeSimilarity\x12\x1c.embedding.SimilarityRequest\x1a\x1d.embedding.SimilarityResponse\x12L\n\x0bHealthCheck\x12\x1d.embedding.HealthCheckRequest\x1a\x1e.embedding.HealthCheckResponseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0f\x65mbedding.proto\x12\tembedding\"\x7f\n\rEncodeRequest\x12\r\n\x05texts\x18\x01 \x03(\t\x12\x18\n\x0bprompt_name\x18\x02 \x01(\tH\x00\x88\x01\x01\x12\x0e\n\x06packed\x18\x03 \x01(\x08\x12%\n\x08priority\x18\x04 \x01(\x0e\x32\x13.embedding.PriorityB\x0e\n\x0c_prompt_name\"]\n\x0e\x45ncodeResponse\x12(\n\nembeddings\x18\x01 \x03(\x0b\x32\x14.embedding.Embedding\x12!\n\x06tensor\x18\x02 \x01(\x0b\x32\x11.embedding.Tensor\"\x82\x01\n\x13\x45ncodeStreamRequest\x12\x0b\n\x03ids\x18\x01 \x03(\x04\x12\r\n\x05texts\x18\x02 \x03(\t\x12\x18\n\x0bprompt_name\x18\x03 \x01(\tH\x00\x88\x01\x01\x12%\n\x08priority\x18\x04 \x01(\x0e\x32\x13.embedding.PriorityB\x0e\n\x0c_prompt_name\"F\n\x14\x45ncodeStreamResponse\x12\x0b\n\x03ids\x18\x01 \x03(\x04\x12!\n\x06tensor\x18\x02 \x01(\x0b\x32\x11.embedding.Tensor\"@\n\x06Tensor\x12\x0c\n\x04\x64\x61ta\x18\x01 \x01(\x0c\x12\r\n\x05\x64type\x18\x02 \x01(\t\x12\x0c\n\x04rows\x18\x03 \x01(\x05\x12\x0b\n\x03\x64im\x18\x04 \x01(\x05\"\x1b\n\tEmbedding\x12\x0e\n\x06values\x18\x01 \x03(\x02\"\xba\x01\n\x11SimilarityRequest\x12.\n\x10query_embeddings\x18\x01 \x03(\x0b\x32\x14.embedding.Embedding\x12\x31\n\x13\x64ocument_embeddings\x18\x02 \x03(\x0b\x32\x14.embedding.Embedding\x12\x12\n\x05top_k\x18\x03 \x01(\x05H\x00\x88\x01\x01\x12\x16\n\tmin_score\x18\x04 \x01(\x02H\x01\x88\x01\x01\x42\x08\n\x06_top_kB\x0c\n\n_min_score\"{\n\x12SimilarityResponse\x12\x14\n\x0csimilarities\x18\x01 \x03(\x02\x12\x13\n\x0bnum_queries\x18\x02 \x01(\x05\x12\x15\n\rnum_documents\x18\x03 \x01(\x05\x12#\n\x07matches\x18\x04 \x03(\x0b\x32\x12.embedding.Matches\"*\n\x07Matches\x12\x0f\n\x07indices\x18\x01 \x03(\x05\x12\x0e\n\x06scores\x18\x02 \x03(\x02\"\xc7\x01\n\x16\x45ncodeAndSearchRequest\x12\r\n\x05query\x18\x01 \x01(\t\x12\t\n\x01k\x18\x02 \x01(\x05\x12\x18\n\x0bprompt_name\x18\x03 \x01(\tH\x00\x88\x01\x01\x12\x17\n\ncollection\x18\x04 \x01(\tH\x01\x88\x01\x01\x12\x11\n\x04wiki\x18\x05 \x01(\tH\x02\x88\x01\x01\x12%\n\x08priority\x18\x06 \x01(\x0e\x32\x13.embedding.PriorityB\x0e\n\x0c_prompt_nameB\r\n\x0b_collectionB\x07\n\x05_wiki\"\xd6\x01\n\rSearchRequest\x12\r\n\x05query\x18\x01 \x01(\t\x12\t\n\x01k\x18\x02 \x01(\x05\x12\x18\n\x0bprompt_name\x18\x03 \x01(\tH\x00\x88\x01\x01\x12\x17\n\ncollection\x18\x04 \x01(\tH\x01\x88\x01\x01\x12\x0f\n\x02\x65\x66\x18\x05 \x01(\x05H\x02\x88\x01\x01\x12\x11\n\x04wiki\x18\x06 \x01(\tH\x03\x88\x01\x01\x12%\n\x08priority\x18\x07 \x01(\x0e\x32\x13.embedding.PriorityB\x0e\n\x0c_prompt_nameB\r\n\x0b_collectionB\x05\n\x03_efB\x07\n\x05_wiki\"\xc5\x01\n\x12\x42\x61tchSearchRequest\x12\x0f\n\x07queries\x18\x01 \x03(\t\x12\t\n\x01k\x18\x02 \x01(\x05\x12\x18\n\x0bprompt_name\x18\x03 \x01(\tH\x00\x88\x01\x01\x12\x17\n\ncollection\x18\x04 \x01(\tH\x01\x88\x01\x01\x12\x11\n\x04wiki\x18\x05 \x01(\tH\x02\x88\x01\x01\x12%\n\x08priority\x18\x06 \x01(\x0e\x32\x13.embedding.PriorityB\x0e\n\x0c_prompt_nameB\r\n\x0b_collectionB\x07\n\x05_wiki\">\n\x0cSearchResult\x12\r\n\x05score\x18\x01 \x01(\x02\x12\x0b\n\x03qid\x18\x02 \x01(\r\x12\x12\n\npage_title\x18\x03 \x01(\t\":\n\x0eSearchResponse\x12(\n\x07results\x18\x01 \x03(\x0b\x32\x17.embedding.SearchResult\"A\n\x13\x42\x61tchSearchResponse\x12*\n\x07results\x18\x01 \x03(\x0b\x32\x19.embedding.SearchResponse\"\x14\n\x12HealthCheckRequest\"\xe5\x02\n\x13HealthCheckResponse\x12\x0f\n\x07healthy\x18\x01 \x01(\x08\x12\x12\n\nmodel_name\x18\x02 \x01(\t\x12\x12\n\ncache_hits\x18\x03 \x01(\x04\x12\x14\n\x0c\x63\x61\x63he_misses\x18\x04 \x01(\x04\x12\x15\n\rcache_entries\x18\x05 \x01(\x04\x12\x13\n\x0b\x63\x61\x63he_bytes\x18\x06 \x01(\x04\x12\x17\n\x0f\x64isk_cache_hits\x18\x07 \x01(\x04\x12\x19\n\x11\x64isk_cache_misses\x18\x08 \x01(\x04\x12\x17\n\x0f\x64isk_cache_rows\x18\t \x01(\x04\x12\x1a\n\x12padding_efficiency\x18\n \x01(\x01\x12\x13\n\x0b\x63orpus_rows\x18\x0b \x01(\x04\x12\x17\n\x0f\x64uplicate_texts\x18\x0c \x01(\x04\x12\x17\n\x0f\x63oalesced_texts\x18\r \x01(\x04\x12#\n\x05lanes\x18\x0e \x03(\x0b\x32\x14.embedding.LaneStats\"\xad\x01\n\tLaneStats\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x17\n\x0fqueued_requests\x18\x02 \x01(\x04\x12\x14\n\x0cqueued_texts\x18\x03 \x01(\x04\x12\x10\n\x08requests\x18\x04 \x01(\x04\x12\x15\n\rmean_queue_ms\x18\x05 \x01(\x01\x12\x17\n\x0fmean_latency_ms\x18\x06 \x01(\x01\x12\x10\n\x08rejected\x18\x07 \x01(\x04\x12\x0f\n\x07skipped\x18\x08 \x01(\x04*M\n\x08Priority\x12\x14\n\x10PRIORITY_DEFAULT\x10\x00\x12\x18\n\x14PRIORITY_INTERACTIVE\x10\x01\x12\x11\n\rPRIORITY_BULK\x10\x02\x32\xa4\x04\n\x10\x45mbeddingService\x12=\n\x06\x45ncode\x12\x18.embedding.EncodeRequest\x1a\x19.embedding.EncodeResponse\x12S\n\x0c\x45ncodeStream\x12\x1e.embedding.EncodeStreamRequest\x1a\x1f.embedding.EncodeStreamResponse(\x01\x30\x01\x12P\n\x11\x43omputeSimilarity\x12\x1c.embedding.SimilarityRequest\x1a\x1d.embedding.SimilarityResponse\x12O\n\x0f\x45ncodeAndSearch\x12!.embedding.EncodeAndSearchRequest\x1a\x19.embedding.SearchResponse\x12=\n\x06Search\x12\x18.embedding.SearchRequest\x1a\x19.embedding.SearchResponse\x12L\n\x0b\x42\x61tchSearch\x12\x1d.embedding.BatchSearchRequest\x1a\x1e.embedding.BatchSearchResponse\x12L\n\x0bHealthCheck\x12\x1d.embedding.HealthCheckRequest\x1a\x1e.embedding.HealthCheckResponseb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'embedding_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
+  _globals['_PRIORITY']._serialized_start=2280
+  _globals['_PRIORITY']._serialized_end=2357
   _globals['_ENCODEREQUEST']._serialized_start=30
-  _globals['_ENCODEREQUEST']._serialized_end=102
-  _globals['_ENCODERESPONSE']._serialized_start=104
-  _globals['_ENCODERESPONSE']._serialized_end=162
-  _globals['_EMBEDDING']._serialized_start=164
-  _globals['_EMBEDDING']._serialized_end=191
-  _globals['_SIMILARITYREQUEST']._serialized_start=193
-  _globals['_SIMILARITYREQUEST']._serialized_end=311
-  _globals['_SIMILARITYRESPONSE']._serialized_start=313
-  _globals['_SIMILARITYRESPONSE']._serialized_end=399
-  _globals['_HEALTHCHECKREQUEST']._serialized_start=401
-  _globals['_HEALTHCHECKREQUEST']._serialized_end=421
-  _globals['_HEALTHCHECKRESPONSE']._serialized_start=423
-  _globals['_HEALTHCHECKRESPONSE']._serialized_end=481
-  _globals['_EMBEDDINGSERVICE']._serialized_start=484
-  _globals['_EMBEDDINGSERVICE']._serialized_end=725
+  _globals['_ENCODEREQUEST']._serialized_end=157
+  _globals['_ENCODERESPONSE']._serialized_start=159
+  _globals['_ENCODERESPONSE']._serialized_end=252
+  _globals['_ENCODESTREAMREQUEST']._serialized_start=255
+  _globals['_ENCODESTREAMREQUEST']._serialized_end=385
+  _globals['_ENCODESTREAMRESPONSE']._serialized_start=387
+  _globals['_ENCODESTREAMRESPONSE']._serialized_end=457
+  _globals['_TENSOR']._serialized_start=459
+  _globals['_TENSOR']._serialized_end=523
+  _globals['_EMBEDDING']._serialized_start=525
+  _globals['_EMBEDDING']._serialized_end=552
+  _globals['_SIMILARITYREQUEST']._serialized_start=555
+  _globals['_SIMILARITYREQUEST']._serialized_end=741
+  _globals['_SIMILARITYRESPONSE']._serialized_start=743
+  _globals['_SIMILARITYRESPONSE']._serialized_end=866
+  _globals['_MATCHES']._serialized_start=868
+  _globals['_MATCHES']._serialized_end=910
+  _globals['_ENCODEANDSEARCHREQUEST']._serialized_start=913
+  _globals['_ENCODEANDSEARCHREQUEST']._serialized_end=1112
+  _globals['_SEARCHREQUEST']._serialized_start=1115
+  _globals['_SEARCHREQUEST']._serialized_end=1329
+  _globals['_BATCHSEARCHREQUEST']._serialized_start=1332
+  _globals['_BATCHSEARCHREQUEST']._serialized_end=1529
+  _globals['_SEARCHRESULT']._serialized_start=1531
+  _globals['_SEARCHRESULT']._serialized_end=1593
+  _globals['_SEARCHRESPONSE']._serialized_start=1595
+  _globals['_SEARCHRESPONSE']._serialized_end=1653
+  _globals['_BATCHSEARCHRESPONSE']._serialized_start=1655
+  _globals['_BATCHSEARCHRESPONSE']._serialized_end=1720
+  _globals['_HEALTHCHECKREQUEST']._serialized_start=1722
+  _globals['_HEALTHCHECKREQUEST']._serialized_end=1742
+  _globals['_HEALTHCHECKRESPONSE']._serialized_start=1745
+  _globals['_HEALTHCHECKRESPONSE']._serialized_end=2102
+  _globals['_LANESTATS']._serialized_start=2105
+  _globals['_LANESTATS']._serialized_end=2278
+  _globals['_EMBEDDINGSERVICE']._serialized_start=2360
+  _globals['_EMBEDDINGSERVICE']._serialized_end=2908
 # @@protoc_insertion_point(module_scope)
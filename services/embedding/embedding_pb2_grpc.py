@@ -39,11 +39,31 @@ class EmbeddingServiceStub(object):
                 request_serializer=embedding__pb2.EncodeRequest.SerializeToString,
                 response_deserializer=embedding__pb2.EncodeResponse.FromString,
                 _registered_method=True)
+        self.EncodeStream = channel.stream_stream(
+                '/embedding.EmbeddingService/EncodeStream',
+                request_serializer=embedding__pb2.EncodeStreamRequest.SerializeToString,
+                response_deserializer=embedding__pb2.EncodeStreamResponse.FromString,
+                _registered_method=True)
         self.ComputeSimilarity = channel.unary_unary(
                 '/embedding.EmbeddingService/ComputeSimilarity',
                 request_serializer=embedding__pb2.SimilarityRequest.SerializeToString,
                 response_deserializer=embedding__pb2.SimilarityResponse.FromString,
                 _registered_method=True)
+        self.EncodeAndSearch = channel.unary_unary(
+                '/embedding.EmbeddingService/EncodeAndSearch',
+                request_serializer=embedding__pb2.EncodeAndSearchRequest.SerializeToString,
+                response_deserializer=embedding__pb2.SearchResponse.FromString,
+                _registered_method=True)
+        self.Search = channel.unary_unary(
+                '/embedding.EmbeddingService/Search',
+                request_serializer=embedding__pb2.SearchRequest.SerializeToString,
+                response_deserializer=embedding__pb2.SearchResponse.FromString,
+                _registered_method=True)
+        self.BatchSearch = channel.unary_unary(
+                '/embedding.EmbeddingService/BatchSearch',
+                request_serializer=embedding__pb2.BatchSearchRequest.SerializeToString,
+                response_deserializer=embedding__pb2.BatchSearchResponse.FromString,
+                _registered_method=True)
         self.HealthCheck = channel.unary_unary(
                 '/embedding.EmbeddingService/HealthCheck',
                 request_serializer=embedding__pb2.HealthCheckRequest.SerializeToString,
@@ -61,6 +81,13 @@ class EmbeddingServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def EncodeStream(self, request_iterator, context):
+        """Encode a stream of (id, text) chunks; results stream back per chunk
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def ComputeSimilarity(self, request, context):
         """Compute similarity between query and document embeddings
         """
@@ -68,6 +95,27 @@ class EmbeddingServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def EncodeAndSearch(self, request, context):
+        """Encode a query and search the preloaded category corpus
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def Search(self, request, context):
+        """Encode a query and search the corpus' HNSW index (approximate)
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchSearch(self, request, context):
+        """Encode several queries in one forward pass and search the corpus for each
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def HealthCheck(self, request, context):
         """Health check
         """
@@ -83,11 +131,31 @@ def add_EmbeddingServiceServicer_to_server(servicer, server):
                     request_deserializer=embedding__pb2.EncodeRequest.FromString,
                     response_serializer=embedding__pb2.EncodeResponse.SerializeToString,
             ),
+            'EncodeStream': grpc.stream_stream_rpc_method_handler(
+                    servicer.EncodeStream,
+                    request_deserializer=embedding__pb2.EncodeStreamRequest.FromString,
+                    response_serializer=embedding__pb2.EncodeStreamResponse.SerializeToString,
+            ),
             'ComputeSimilarity': grpc.unary_unary_rpc_method_handler(
                     servicer.ComputeSimilarity,
                     request_deserializer=embedding__pb2.SimilarityRequest.FromString,
                     response_serializer=embedding__pb2.SimilarityResponse.SerializeToString,
             ),
+            'EncodeAndSearch': grpc.unary_unary_rpc_method_handler(
+                    servicer.EncodeAndSearch,
+                    request_deserializer=embedding__pb2.EncodeAndSearchRequest.FromString,
+                    response_serializer=embedding__pb2.SearchResponse.SerializeToString,
+            ),
+            'Search': grpc.unary_unary_rpc_method_handler(
+                    servicer.Search,
+                    request_deserializer=embedding__pb2.SearchRequest.FromString,
+                    response_serializer=embedding__pb2.SearchResponse.SerializeToString,
+            ),
+            'BatchSearch': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchSearch,
+                    request_deserializer=embedding__pb2.BatchSearchRequest.FromString,
+                    response_serializer=embedding__pb2.BatchSearchResponse.SerializeToString,
+            ),
             'HealthCheck': grpc.unary_unary_rpc_method_handler(
                     servicer.HealthCheck,
                     request_deserializer=embedding__pb2.HealthCheckRequest.FromString,
@@ -131,6 +199,33 @@ class EmbeddingService(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def EncodeStream(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(
+            request_iterator,
+            target,
+            '/embedding.EmbeddingService/EncodeStream',
+            embedding__pb2.EncodeStreamRequest.SerializeToString,
+            embedding__pb2.EncodeStreamResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def ComputeSimilarity(request,
             target,
@@ -158,6 +253,87 @@ class EmbeddingService(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def EncodeAndSearch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/embedding.EmbeddingService/EncodeAndSearch',
+            embedding__pb2.EncodeAndSearchRequest.SerializeToString,
+            embedding__pb2.SearchResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def Search(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/embedding.EmbeddingService/Search',
+            embedding__pb2.SearchRequest.SerializeToString,
+            embedding__pb2.SearchResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def BatchSearch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/embedding.EmbeddingService/BatchSearch',
+            embedding__pb2.BatchSearchRequest.SerializeToString,
+            embedding__pb2.BatchSearchResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def HealthCheck(request,
             target,
@@ -2,6 +2,28 @@
 """
 gRPC server for vector embeddings using Qwen3-Embedding model.
 
+Requests run in an interactive or a bulk lane, chosen by the request's
+priority field or the x-embedding-priority metadata header; an unknown value
+fails with INVALID_ARGUMENT. Encode and the search RPCs default to
+interactive and EncodeStream to bulk. With the threaded server, keep
+--max-workers above the number of concurrent bulk clients so interactive
+RPCs still get a handler thread; --aio serves requests as grpc.aio
+coroutines instead, so the number queued is not capped by --max-workers.
+
+A request is rejected before queueing with RESOURCE_EXHAUSTED when its lane
+holds --max-queue-texts texts, and with DEADLINE_EXCEEDED when the queue
+ahead of it would outlast its gRPC deadline. HealthCheck counts both per
+lane as rejected, and requests dropped because their RPC ended first as
+skipped.
+
+EncodeStream answers each (id, text) chunk as soon as it is encoded, with at
+most --stream-window chunks of one stream in flight.
+
+Encode, ComputeSimilarity and the search RPCs report where their time went
+as trailing metadata: x-embedding-{stage}-ms for each stage that ran,
+x-embedding-total-ms, x-embedding-batch-size (texts in the merged batch) and
+x-embedding-reused (texts answered from a cache or a concurrent request).
+
 Installation:
     pip install grpcio grpcio-tools sentence-transformers transformers
 
@@ -9,31 +31,639 @@ Generate Python code from proto:
     python -m grpc_tools.protoc -I. --python_out=. --grpc_python_out=. embedding.proto
 """
 
+import argparse
+import asyncio
 import grpc
+from collections import deque
 from concurrent import futures
+from concurrent.futures import CancelledError, Future
+from contextlib import contextmanager
 import logging
+import os
 import signal
 import sys
+import threading
+import time
 import numpy as np
-from sentence_transformers import SentenceTransformer
+from typing import Dict, List, Optional, Tuple
 
 # Import generated protobuf code
 import embedding_pb2
 import embedding_pb2_grpc
+from backends import BACKENDS, DEFAULT_MODEL, load_model, model_id
+from batching import (
+    LANES,
+    BatchScheduler,
+    BatchTiming,
+    DeadlineUnreachable,
+    Overloaded,
+    PaddingStats,
+    QueueFull,
+    RequestCoalescer,
+    length_buckets,
+    resolve,
+)
+from corpus import DEFAULT_EF, WIKI_NAME, Corpus
+from disk_cache import DiskEmbeddingCache
+from embedding_cache import EmbeddingCache
+from vector_search import top_k_cosine
+from workers import WorkerPool
+
+
+PRIORITY_METADATA = "x-embedding-priority"
+# Trailing metadata keys are this prefix plus "{stage}-ms", "total-ms",
+# "batch-size" and "reused"
+TIMING_METADATA_PREFIX = "x-embedding-"
+LANE_BY_PRIORITY = {
+    embedding_pb2.PRIORITY_INTERACTIVE: "interactive",
+    embedding_pb2.PRIORITY_BULK: "bulk",
+}
+
+
+def fill_tensor(tensor, embeddings: np.ndarray):
+    """Copy a numpy matrix straight into a packed Tensor message."""
+    packed = np.ascontiguousarray(embeddings, dtype="<f4")
+    tensor.data = packed.tobytes()
+    tensor.dtype = "float32"
+    tensor.rows, tensor.dim = packed.shape
+
+
+def stream_response(ids, embeddings: np.ndarray):
+    """Build the EncodeStreamResponse for one finished chunk."""
+    response = embedding_pb2.EncodeStreamResponse(ids=ids)
+    fill_tensor(response.tensor, embeddings)
+    return response
+
+
+def chunk_mismatch(chunk) -> str:
+    return f"Chunk has {len(chunk.ids)} ids but {len(chunk.texts)} texts"
+
+
+class InvalidPriority(ValueError):
+    """A request asked for a priority the server has no lane for."""
+
+
+def request_lane(request, context, default: str = "interactive") -> str:
+    """
+    Pick the scheduling lane from the priority field, then the metadata.
+
+    Args:
+        request: Request with a priority field
+        context: The RPC's context, or None for in-process calls
+        default: Lane used when neither names one
+
+    Raises:
+        InvalidPriority: The field or the header holds an unknown value
+    """
+    if request.priority != embedding_pb2.PRIORITY_DEFAULT:
+        # proto3 keeps enum values it does not know, e.g. priority=7
+        if request.priority not in LANE_BY_PRIORITY:
+            raise InvalidPriority(f"Unknown priority {request.priority}")
+        return LANE_BY_PRIORITY[request.priority]
+    metadata = context.invocation_metadata() if context is not None else None
+    for key, value in metadata or ():
+        if key == PRIORITY_METADATA:
+            if value not in LANES:
+                raise InvalidPriority(
+                    f"{PRIORITY_METADATA} must be one of {', '.join(LANES)}"
+                )
+            return value
+    return default
+
+
+def timing_metadata(timing: BatchTiming, started: float) -> Tuple[Tuple[str, str], ...]:
+    """Trailing metadata telling the caller where the time of its call went."""
+    metadata = [
+        (f"{TIMING_METADATA_PREFIX}{stage}-ms", f"{seconds * 1000:.3f}")
+        for stage, seconds in timing.stages.items()
+    ]
+    total = time.perf_counter() - started
+    metadata.append((f"{TIMING_METADATA_PREFIX}total-ms", f"{total * 1000:.3f}"))
+    if timing.batch_size is not None:
+        metadata.append((f"{TIMING_METADATA_PREFIX}batch-size", str(timing.batch_size)))
+    if timing.reused is not None:
+        metadata.append((f"{TIMING_METADATA_PREFIX}reused", str(timing.reused)))
+    return tuple(metadata)
+
+
+def shed_status(error: Exception) -> Tuple[grpc.StatusCode, str]:
+    """Status for a request that was turned away or cancelled, not failed."""
+    if isinstance(error, InvalidPriority):
+        return grpc.StatusCode.INVALID_ARGUMENT, str(error)
+    if isinstance(error, QueueFull):
+        return grpc.StatusCode.RESOURCE_EXHAUSTED, str(error)
+    if isinstance(error, DeadlineUnreachable):
+        return grpc.StatusCode.DEADLINE_EXCEEDED, str(error)
+    return grpc.StatusCode.CANCELLED, "Request ended before its batch ran"
+
+
+def search_queries(request) -> List[str]:
+    """Query texts of an EncodeAndSearch, Search or BatchSearch request."""
+    if isinstance(request, embedding_pb2.BatchSearchRequest):
+        return list(request.queries)
+    return [request.query]
+
+
+def search_response_type(request):
+    if isinstance(request, embedding_pb2.BatchSearchRequest):
+        return embedding_pb2.BatchSearchResponse
+    return embedding_pb2.SearchResponse
+
+
+def fill_results(response, results):
+    """Add (score, qid, page_title) tuples to a SearchResponse."""
+    for score, qid, page_title in results:
+        response.results.add(score=score, qid=qid, page_title=page_title)
 
 
 class EmbeddingServicer(embedding_pb2_grpc.EmbeddingServiceServicer):
     """gRPC servicer for embedding operations."""
 
-    def __init__(self, model_name: str = "sentence-transformers/all-MiniLM-L12-v2"):
-        """Initialize the embedding model."""
-        logging.info(f"Loading model: {model_name}")
-        self.model = SentenceTransformer(model_name)
+    def __init__(
+        self,
+        model_name: str = DEFAULT_MODEL,
+        backend: str = "torch",
+        model_file: Optional[str] = None,
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+        interactive_wait_ms: float = 0.5,
+        max_queue_texts: int = 10000,
+        cache_mb: int = 256,
+        disk_cache_dir: Optional[str] = None,
+        disk_cache_max_rows: int = 0,
+        stream_window: int = 8,
+        workers: int = 0,
+        worker_threads: Optional[int] = None,
+        bucket_width: int = 16,
+        corpus_dir: Optional[str] = None,
+        hnsw: bool = False,
+        data_dir: str = "data",
+        metrics=None,
+    ):
+        """Initialize the model, the caches, the search corpus and the scheduler."""
+        logging.info(f"Loading model: {model_name} ({backend} backend)")
+        self.model = load_model(model_name, backend, model_file)
         self.model_name = model_name
+        # Cache key prefix; differs per backend since their outputs differ slightly
+        self.model_id = model_id(model_name, backend, model_file)
         logging.info("Model loaded successfully")
+        self.cache = EmbeddingCache(cache_mb * 1024 * 1024) if cache_mb > 0 else None
+        self.disk_cache = (
+            DiskEmbeddingCache(
+                disk_cache_dir,
+                self.model_id,
+                self.model.get_sentence_embedding_dimension(),
+                max_rows=disk_cache_max_rows or None,
+            )
+            if disk_cache_dir
+            else None
+        )
+        self.corpus = (
+            Corpus(corpus_dir, hnsw=hnsw, data_dir=data_dir) if corpus_dir else None
+        )
+        if (
+            self.corpus is not None
+            and self.corpus.dim != self.model.get_sentence_embedding_dimension()
+        ):
+            raise ValueError(
+                f"Corpus at {corpus_dir} has dimension {self.corpus.dim}, "
+                f"the model produces {self.model.get_sentence_embedding_dimension()}"
+            )
+        self.coalescer = RequestCoalescer()
+        # metrics.Metrics when the server exports Prometheus metrics
+        self.metrics = metrics
+        # Token-length bucket width for splitting merged batches (0 disables)
+        self.bucket_width = bucket_width
+        self.padding = PaddingStats()
+        # Chunks of one EncodeStream call that may be encoding at once
+        self.stream_window = stream_window
+        # With workers, this process' model only serves similarity scoring
+        self.worker_pool = (
+            WorkerPool(
+                model_name,
+                backend,
+                model_file,
+                workers,
+                max_batch_size,
+                self.model.get_sentence_embedding_dimension(),
+                threads_per_worker=worker_threads,
+            )
+            if workers > 0
+            else None
+        )
+        self.scheduler = BatchScheduler(
+            self._encode_batch,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            concurrency=max(1, workers),
+            interactive_wait_ms=interactive_wait_ms,
+            max_queue_texts=max_queue_texts,
+            observe_queue=metrics.observe_queue if metrics is not None else None,
+        )
+
+    def _encode_batch(self, texts, prompt_name, stages: Dict[str, float]):
+        """Run one merged batch as one forward pass per token-length bucket."""
+        started = time.perf_counter()
+        lengths = [
+            len(ids)
+            for ids in self.model.tokenizer(
+                texts, truncation=True, max_length=self.model.max_seq_length
+            )["input_ids"]
+        ]
+        tokenized = time.perf_counter()
+        buckets = length_buckets(lengths, self.bucket_width)
+        self.padding.record(lengths, buckets)
+        groups = [[texts[i] for i in bucket] for bucket in buckets]
+
+        if self.worker_pool is not None:
+            results = self.worker_pool.encode_many(groups, prompt_name)
+        else:
+            results = [
+                self.model.encode(group, prompt_name=prompt_name, batch_size=len(group))
+                for group in groups
+            ]
+        stages["tokenize"] = tokenized - started
+        stages["forward"] = time.perf_counter() - tokenized
+        if self.metrics is not None:
+            self.metrics.observe_batch(lengths, stages["tokenize"], stages["forward"])
+
+        # Restore the original order
+        embeddings = np.empty((len(texts), results[0].shape[1]), dtype=np.float32)
+        for bucket, result in zip(buckets, results):
+            embeddings[bucket] = result
+        return embeddings
+
+    def _submit(
+        self,
+        texts,
+        prompt_name,
+        lane: str = "interactive",
+        timeout: Optional[float] = None,
+        timing: Optional[BatchTiming] = None,
+    ) -> Future:
+        """
+        Encode texts, serving cached embeddings and batching only the misses.
+
+        Repeated texts are encoded once, and texts that another request is
+        already encoding are taken from that request's result. Cancelling the
+        returned future drops texts nobody else waits for before they run.
+
+        Args:
+            texts: Texts to encode
+            prompt_name: Prompt name for the forward pass
+            lane: "interactive" or "bulk"
+            timeout: Seconds left until the RPC's deadline, if it has one
+            timing: Filled in with the stages of the batch that encodes the
+                misses, if any, before the future resolves
+
+        Raises:
+            Overloaded: The misses cannot be queued within the lane's limit or
+                encoded before the deadline
+
+        Returns:
+            Future resolving to a numpy array of shape (len(texts), embedding_dim)
+        """
+        num_texts = len(texts)
+        texts, positions = self.coalescer.dedupe(list(texts))
+        keys = [(self.model_id, prompt_name, text) for text in texts]
+        embeddings = (
+            self.cache.get_many(keys) if self.cache is not None else [None] * len(keys)
+        )
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+
+        if missing and self.disk_cache is not None:
+            stored = self.disk_cache.get_many([keys[i] for i in missing])
+            found = [(i, emb) for i, emb in zip(missing, stored) if emb is not None]
+            if found and self.cache is not None:
+                self.cache.put_many(
+                    [keys[i] for i, _ in found], np.stack([emb for _, emb in found])
+                )
+            for i, embedding in found:
+                embeddings[i] = embedding
+            missing = [i for i in missing if embeddings[i] is None]
+
+        result = Future()
+        if not missing:
+            if timing is not None:
+                timing.reused = num_texts
+            result.set_result(np.stack(embeddings)[positions])
+            return result
+
+        self.scheduler.admit(len(missing), lane, timeout)
+        claimed, owned, joined = self.coalescer.claim(
+            [keys[i] for i in missing], result
+        )
+        if timing is not None:
+            timing.reused = num_texts - len(owned)
+        # Rows to copy out of each pending result: (index into texts, row)
+        waiting: Dict[Future, List[Tuple[int, int]]] = {}
+        for row, j in enumerate(owned):
+            waiting.setdefault(claimed, []).append((missing[j], row))
+        for j, pending, row in joined:
+            waiting.setdefault(pending, []).append((missing[j], row))
+
+        remaining = [len(waiting)]
+        lock = threading.Lock()
+
+        def collect(pending: Future, rows: List[Tuple[int, int]]):
+            # result may be cancelled by the RPC ending at any point, so it is
+            # only ever set through resolve()
+            try:
+                computed = pending.result()
+            except Exception as e:
+                resolve(result, error=e)
+                return
+            for i, row in rows:
+                embeddings[i] = computed[row]
+            with lock:
+                remaining[0] -= 1
+                finished = remaining[0] == 0
+            if finished:
+                resolve(result, np.stack(embeddings)[positions])
+
+        for pending, rows in waiting.items():
+            pending.add_done_callback(lambda done, rows=rows: collect(done, rows))
+
+        if owned:
+            owned_keys = [keys[missing[j]] for j in owned]
+
+            def finish(pending: Future):
+                try:
+                    computed = pending.result()
+                    if self.cache is not None:
+                        self.cache.put_many(owned_keys, computed)
+                    if self.disk_cache is not None:
+                        self.disk_cache.put_many(owned_keys, computed)
+                except Exception as e:
+                    self.coalescer.release(claimed)
+                    claimed.set_exception(e)
+                    return
+                # Cached before release, so a later request always finds them
+                self.coalescer.release(claimed)
+                claimed.set_result(computed)
+
+            self.scheduler.submit(
+                [texts[missing[j]] for j in owned],
+                prompt_name,
+                lane,
+                abandoned=lambda: self.coalescer.abandon(claimed),
+                timing=timing,
+            ).add_done_callback(finish)
+        return result
+
+    def _embed(
+        self,
+        texts,
+        prompt_name,
+        context,
+        lane: str = "interactive",
+        timing: Optional[BatchTiming] = None,
+    ):
+        """Encode texts for a threaded RPC and block until they are ready."""
+        pending = self._submit(
+            texts, prompt_name, lane, context.time_remaining(), timing
+        )
+        # A cancelled or timed out RPC cancels pending, so the handler thread
+        # is freed and the texts are skipped if their batch has not started
+        if not context.add_callback(pending.cancel):
+            pending.cancel()
+        return pending.result()
+
+    def encode(
+        self,
+        texts: List[str],
+        prompt_name: Optional[str] = None,
+        lane: str = "interactive",
+        timing: Optional[BatchTiming] = None,
+    ) -> np.ndarray:
+        """
+        Encode texts in this process, as Encode does, and block until they are ready.
+
+        Raises:
+            ValueError: texts is empty
+            Overloaded: The texts cannot be queued within the lane's limit
+
+        Returns:
+            float32 array of shape (len(texts), embedding_dim)
+        """
+        if not texts:
+            raise ValueError("texts cannot be empty")
+        return self._submit(list(texts), prompt_name, lane, timing=timing).result()
+
+    def search(self, request, timing: Optional[BatchTiming] = None):
+        """
+        Answer an EncodeAndSearch, Search or BatchSearch request in this process.
+
+        Raises:
+            ValueError: The request would fail its RPC's checks; the message is
+                the status details the server would send
+
+        Returns:
+            SearchResponse, or BatchSearchResponse for a BatchSearchRequest
+        """
+        error = self._check_search(request)
+        if error is not None:
+            raise ValueError(error[1])
+        prompt_name = request.prompt_name if request.HasField("prompt_name") else None
+        embeddings = self.encode(
+            search_queries(request),
+            prompt_name,
+            request_lane(request, None),
+            timing,
+        )
+        return self._search(request, embeddings, timing)
+
+    def close(self):
+        """Stop the batching scheduler and the worker processes."""
+        self.scheduler.stop()
+        if self.worker_pool is not None:
+            self.worker_pool.close()
+
+    @contextmanager
+    def _stage(self, stage: str, timing: Optional[BatchTiming] = None):
+        """Time a with block as one stage, for the metrics and the call's timing."""
+        started = time.perf_counter()
+        yield
+        seconds = time.perf_counter() - started
+        if self.metrics is not None:
+            self.metrics.observe_stage(stage, seconds)
+        if timing is not None:
+            timing.stages[stage] = seconds
+
+    def _encode_response(
+        self, request, embeddings: np.ndarray, timing: Optional[BatchTiming] = None
+    ):
+        """Build an EncodeResponse in the format the request asked for."""
+        response = embedding_pb2.EncodeResponse()
+        with self._stage("serialize", timing):
+            if request.packed:
+                fill_tensor(response.tensor, embeddings)
+            else:
+                # Convert numpy arrays to protobuf format
+                for embedding in embeddings:
+                    emb_msg = response.embeddings.add()
+                    emb_msg.values.extend(embedding.tolist())
+
+        logging.debug(f"Successfully encoded {len(embeddings)} embeddings")
+        return response
+
+    def similarity(self, query_embs: np.ndarray, doc_embs: np.ndarray) -> np.ndarray:
+        """Similarity matrix of shape (num_queries, num_documents) from the model."""
+        similarity_matrix = self.model.similarity(query_embs, doc_embs)
+
+        # Convert to numpy if needed
+        if hasattr(similarity_matrix, "cpu"):
+            similarity_matrix = similarity_matrix.cpu().numpy()
+        return np.asarray(similarity_matrix, dtype=np.float32)
+
+    def _compute_similarity(self, request, timing: Optional[BatchTiming] = None):
+        """Score every query embedding against every document embedding."""
+        # Convert protobuf embeddings to numpy arrays
+        with self._stage("decode", timing):
+            query_embs = np.array(
+                [list(emb.values) for emb in request.query_embeddings],
+                dtype=np.float32,
+            )
+            doc_embs = np.array(
+                [list(emb.values) for emb in request.document_embeddings],
+                dtype=np.float32,
+            )
+
+        logging.debug(f"Computing similarity: {query_embs.shape} x {doc_embs.shape}")
+
+        if request.HasField("top_k"):
+            min_score = request.min_score if request.HasField("min_score") else None
+            with self._stage("similarity", timing):
+                best = top_k_cosine(query_embs, doc_embs, request.top_k, min_score)
+            with self._stage("serialize", timing):
+                response = embedding_pb2.SimilarityResponse(
+                    num_queries=len(query_embs), num_documents=len(doc_embs)
+                )
+                for matches in best:
+                    entry = response.matches.add()
+                    entry.indices.extend(index for index, _ in matches)
+                    entry.scores.extend(score for _, score in matches)
+            return response
+
+        with self._stage("similarity", timing):
+            similarity_matrix = self.similarity(query_embs, doc_embs)
+
+        with self._stage("serialize", timing):
+            response = embedding_pb2.SimilarityResponse(
+                similarities=similarity_matrix.flatten().tolist(),
+                num_queries=len(request.query_embeddings),
+                num_documents=len(request.document_embeddings),
+            )
+
+        logging.debug("Similarity computation successful")
+        return response
+
+    def _check_search(self, request) -> Optional[Tuple[grpc.StatusCode, str]]:
+        """Return the status to fail a search call with, if any."""
+        if self.corpus is None:
+            return (
+                grpc.StatusCode.FAILED_PRECONDITION,
+                "No search corpus loaded, start the server with --corpus",
+            )
+        if (
+            request.HasField("collection")
+            and request.collection != self.corpus.collection
+        ):
+            return (
+                grpc.StatusCode.NOT_FOUND,
+                f"Corpus holds {self.corpus.collection}, not {request.collection}",
+            )
+        if isinstance(request, embedding_pb2.BatchSearchRequest):
+            if not request.queries or not all(request.queries):
+                return (
+                    grpc.StatusCode.INVALID_ARGUMENT,
+                    "queries must be non-empty strings",
+                )
+        elif not request.query:
+            return grpc.StatusCode.INVALID_ARGUMENT, "query field cannot be empty"
+        if request.k <= 0:
+            return grpc.StatusCode.INVALID_ARGUMENT, "k must be positive"
+        if request.HasField("wiki"):
+            if not WIKI_NAME.match(request.wiki):
+                return grpc.StatusCode.INVALID_ARGUMENT, "invalid wiki name"
+            if not os.path.exists(self.corpus.categories_path(request.wiki)):
+                return (
+                    grpc.StatusCode.NOT_FOUND,
+                    f"No categories for {request.wiki} in {self.corpus.data_dir}",
+                )
+        if isinstance(request, embedding_pb2.SearchRequest):
+            if self.corpus.hnsw is None:
+                return (
+                    grpc.StatusCode.FAILED_PRECONDITION,
+                    "No HNSW index loaded, start the server with --hnsw",
+                )
+            if request.HasField("ef") and request.ef <= 0:
+                return grpc.StatusCode.INVALID_ARGUMENT, "ef must be positive"
+        return None
+
+    def _search(
+        self, request, embeddings: np.ndarray, timing: Optional[BatchTiming] = None
+    ):
+        """Search the corpus with the query embeddings, exactly or via HNSW."""
+        wiki = request.wiki if request.HasField("wiki") else None
+        if isinstance(request, embedding_pb2.BatchSearchRequest):
+            with self._stage("search", timing):
+                batch = self.corpus.search_many(embeddings, request.k, wiki)
+            response = embedding_pb2.BatchSearchResponse()
+            with self._stage("serialize", timing):
+                for results in batch:
+                    fill_results(response.results.add(), results)
+            return response
+
+        with self._stage("search", timing):
+            if isinstance(request, embedding_pb2.SearchRequest):
+                ef = request.ef if request.HasField("ef") else DEFAULT_EF
+                results = self.corpus.search_hnsw(embeddings[0], request.k, ef, wiki)
+            else:
+                results = self.corpus.search(embeddings[0], request.k, wiki)
+        response = embedding_pb2.SearchResponse()
+        with self._stage("serialize", timing):
+            fill_results(response, results)
+        return response
+
+    def _encode_and_search(self, request, context, rpc: str):
+        """Shared body of EncodeAndSearch, Search and BatchSearch."""
+        started = time.perf_counter()
+        error = self._check_search(request)
+        if error is not None:
+            context.set_code(error[0])
+            context.set_details(error[1])
+            return search_response_type(request)()
+
+        try:
+            prompt_name = (
+                request.prompt_name if request.HasField("prompt_name") else None
+            )
+            timing = BatchTiming()
+            embeddings = self._embed(
+                search_queries(request),
+                prompt_name,
+                context,
+                request_lane(request, context),
+                timing,
+            )
+            response = self._search(request, embeddings, timing)
+            context.set_trailing_metadata(timing_metadata(timing, started))
+            return response
+
+        except (InvalidPriority, Overloaded, CancelledError) as e:
+            context.set_code(shed_status(e)[0])
+            context.set_details(shed_status(e)[1])
+            return search_response_type(request)()
+        except Exception as e:
+            logging.error(f"Error in {rpc}: {str(e)}", exc_info=True)
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(f"Search failed: {str(e)}")
+            return search_response_type(request)()
 
     def Encode(self, request, context):
         """Encode texts into embeddings."""
+        started = time.perf_counter()
         try:
             if not request.texts:
                 context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
@@ -49,25 +679,123 @@ class EmbeddingServicer(embedding_pb2_grpc.EmbeddingServiceServicer):
             logging.debug(
                 f"Encoding {len(request.texts)} texts with prompt_name={prompt_name}"
             )
-            embeddings = self.model.encode(request.texts, prompt_name=prompt_name)
-
-            # Convert numpy arrays to protobuf format
-            response = embedding_pb2.EncodeResponse()
-            for embedding in embeddings:
-                emb_msg = response.embeddings.add()
-                emb_msg.values.extend(embedding.tolist())
-
-            logging.debug(f"Successfully encoded {len(response.embeddings)} embeddings")
+            timing = BatchTiming()
+            embeddings = self._embed(
+                list(request.texts),
+                prompt_name,
+                context,
+                request_lane(request, context),
+                timing,
+            )
+            response = self._encode_response(request, embeddings, timing)
+            context.set_trailing_metadata(timing_metadata(timing, started))
             return response
 
+        except (InvalidPriority, Overloaded, CancelledError) as e:
+            context.set_code(shed_status(e)[0])
+            context.set_details(shed_status(e)[1])
+            return embedding_pb2.EncodeResponse()
         except Exception as e:
             logging.error(f"Error in Encode: {str(e)}", exc_info=True)
             context.set_code(grpc.StatusCode.INTERNAL)
             context.set_details(f"Encoding failed: {str(e)}")
             return embedding_pb2.EncodeResponse()
 
+    def EncodeStream(self, request_iterator, context):
+        """Encode a stream of (id, text) chunks, replying as each chunk finishes."""
+        in_flight = deque()
+        changed = threading.Condition()
+        reading = True
+        closed = False
+        error = None
+
+        def close():
+            # Once the stream ends early, its queued chunks are skipped
+            nonlocal closed
+            with changed:
+                closed = True
+                for _, pending in in_flight:
+                    pending.cancel()
+                changed.notify_all()
+
+        context.add_callback(close)
+
+        def read():
+            # Chunks are read on their own thread, so a finished chunk is
+            # answered without waiting for the client to send the next one
+            nonlocal reading, error
+            try:
+                for chunk in request_iterator:
+                    if len(chunk.ids) != len(chunk.texts):
+                        error = (
+                            grpc.StatusCode.INVALID_ARGUMENT,
+                            chunk_mismatch(chunk),
+                        )
+                        return
+                    if not chunk.texts:
+                        continue
+
+                    prompt_name = (
+                        chunk.prompt_name if chunk.HasField("prompt_name") else None
+                    )
+                    try:
+                        pending = self._submit(
+                            list(chunk.texts),
+                            prompt_name,
+                            request_lane(chunk, context, default="bulk"),
+                            context.time_remaining(),
+                        )
+                    except (InvalidPriority, Overloaded) as e:
+                        error = shed_status(e)
+                        return
+                    with changed:
+                        in_flight.append((list(chunk.ids), pending))
+                        changed.notify_all()
+                        # Once the window is full, stop reading until the oldest
+                        # chunk is answered so HTTP/2 flow control pushes back
+                        changed.wait_for(
+                            lambda: closed or len(in_flight) < self.stream_window
+                        )
+                        if closed:
+                            return
+            except grpc.RpcError:
+                # The client cancelled the call
+                pass
+            finally:
+                with changed:
+                    reading = False
+                    changed.notify_all()
+
+        def reply(ids, pending):
+            try:
+                embeddings = pending.result()
+            except (Overloaded, CancelledError) as e:
+                context.abort(*shed_status(e))
+            except Exception as e:
+                logging.error(f"Error in EncodeStream: {str(e)}", exc_info=True)
+                context.abort(grpc.StatusCode.INTERNAL, f"Encoding failed: {str(e)}")
+            with self._stage("serialize"):
+                return stream_response(ids, embeddings)
+
+        threading.Thread(target=read, name="encode-stream", daemon=True).start()
+        while True:
+            with changed:
+                changed.wait_for(lambda: in_flight or not reading)
+                if not in_flight:
+                    break
+                ids, pending = in_flight[0]
+            response = reply(ids, pending)
+            with changed:
+                in_flight.popleft()
+                changed.notify_all()
+            yield response
+
+        if error is not None:
+            context.abort(*error)
+
     def ComputeSimilarity(self, request, context):
         """Compute similarity between query and document embeddings."""
+        started = time.perf_counter()
         try:
             if not request.query_embeddings or not request.document_embeddings:
                 context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
@@ -75,62 +803,319 @@ class EmbeddingServicer(embedding_pb2_grpc.EmbeddingServiceServicer):
                     "Both query_embeddings and document_embeddings must be provided"
                 )
                 return embedding_pb2.SimilarityResponse()
+            if request.HasField("top_k") and request.top_k < 0:
+                context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+                context.set_details("top_k cannot be negative")
+                return embedding_pb2.SimilarityResponse()
 
-            # Convert protobuf embeddings to numpy arrays
-            query_embs = np.array(
-                [list(emb.values) for emb in request.query_embeddings]
+            timing = BatchTiming()
+            response = self._compute_similarity(request, timing)
+            context.set_trailing_metadata(timing_metadata(timing, started))
+            return response
+
+        except Exception as e:
+            logging.error(f"Error in ComputeSimilarity: {str(e)}", exc_info=True)
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(f"Similarity computation failed: {str(e)}")
+            return embedding_pb2.SimilarityResponse()
+
+    def EncodeAndSearch(self, request, context):
+        """Encode a query and return its nearest categories from the corpus."""
+        return self._encode_and_search(request, context, "EncodeAndSearch")
+
+    def Search(self, request, context):
+        """Encode a query and return its nearest categories from the HNSW index."""
+        return self._encode_and_search(request, context, "Search")
+
+    def BatchSearch(self, request, context):
+        """Encode several queries at once and search the corpus for each."""
+        return self._encode_and_search(request, context, "BatchSearch")
+
+    def HealthCheck(self, request, context):
+        """Health check endpoint."""
+        response = embedding_pb2.HealthCheckResponse(
+            healthy=True, model_name=self.model_name
+        )
+        if self.cache is not None:
+            response.cache_hits = self.cache.hits
+            response.cache_misses = self.cache.misses
+            response.cache_entries = len(self.cache)
+            response.cache_bytes = self.cache.current_bytes
+        if self.disk_cache is not None:
+            response.disk_cache_hits = self.disk_cache.hits
+            response.disk_cache_misses = self.disk_cache.misses
+            response.disk_cache_rows = self.disk_cache.num_rows
+        response.padding_efficiency = self.padding.efficiency
+        response.duplicate_texts = self.coalescer.duplicates
+        response.coalesced_texts = self.coalescer.coalesced
+        for name, lane in self.scheduler.lanes.items():
+            response.lanes.add(
+                name=name,
+                queued_requests=lane.queued_requests,
+                queued_texts=lane.queued_texts,
+                requests=lane.requests,
+                mean_queue_ms=lane.mean_queue_ms,
+                mean_latency_ms=lane.mean_latency_ms,
+                rejected=lane.rejected,
+                skipped=lane.skipped,
             )
-            doc_embs = np.array(
-                [list(emb.values) for emb in request.document_embeddings]
+        if self.corpus is not None:
+            response.corpus_rows = self.corpus.num_rows
+        return response
+
+
+class AsyncEmbeddingServicer(EmbeddingServicer):
+    """
+    grpc.aio servicer sharing the model, caches and scheduler of EmbeddingServicer.
+
+    Handlers are coroutines, so a queued request costs a suspended task rather
+    than a thread. Encoding runs on the batching scheduler thread, similarity
+    scoring and corpus search on a dedicated inference executor.
+    """
+
+    def __init__(self, inference_threads: int = 2, **servicer_options):
+        super().__init__(**servicer_options)
+        self.inference_executor = futures.ThreadPoolExecutor(
+            max_workers=inference_threads, thread_name_prefix="inference"
+        )
+
+    def close(self):
+        """Stop the batching scheduler and the inference executor."""
+        super().close()
+        self.inference_executor.shutdown()
+
+    async def Encode(self, request, context):
+        """Encode texts into embeddings."""
+        started = time.perf_counter()
+        if not request.texts:
+            await context.abort(
+                grpc.StatusCode.INVALID_ARGUMENT, "texts field cannot be empty"
             )
 
-            logging.debug(
-                f"Computing similarity: {query_embs.shape} x {doc_embs.shape}"
+        prompt_name = request.prompt_name if request.HasField("prompt_name") else None
+        timing = BatchTiming()
+        try:
+            # Cancelling the handler task cancels the wrapped future as well
+            embeddings = await asyncio.wrap_future(
+                self._submit(
+                    list(request.texts),
+                    prompt_name,
+                    request_lane(request, context),
+                    context.time_remaining(),
+                    timing,
+                )
             )
+            response = self._encode_response(request, embeddings, timing)
+            context.set_trailing_metadata(timing_metadata(timing, started))
+            return response
+        except (InvalidPriority, Overloaded, CancelledError) as e:
+            await context.abort(*shed_status(e))
+        except Exception as e:
+            logging.error(f"Error in Encode: {str(e)}", exc_info=True)
+            await context.abort(grpc.StatusCode.INTERNAL, f"Encoding failed: {str(e)}")
 
-            # Compute similarity using the model
-            similarity_matrix = self.model.similarity(query_embs, doc_embs)
+    async def EncodeStream(self, request_iterator, context):
+        """Encode a stream of (id, text) chunks, replying as each chunk finishes."""
+        in_flight = deque()
+        changed = asyncio.Condition()
+        reading = True
+        error = None
 
-            # Convert to numpy if needed and flatten
-            if hasattr(similarity_matrix, "cpu"):
-                similarity_matrix = similarity_matrix.cpu().numpy()
-            similarities_flat = similarity_matrix.flatten().tolist()
+        async def read():
+            # Chunks are read by their own task, so a finished chunk is
+            # answered without waiting for the client to send the next one
+            nonlocal reading, error
+            try:
+                async for chunk in request_iterator:
+                    if len(chunk.ids) != len(chunk.texts):
+                        error = (
+                            grpc.StatusCode.INVALID_ARGUMENT,
+                            chunk_mismatch(chunk),
+                        )
+                        return
+                    if not chunk.texts:
+                        continue
 
-            response = embedding_pb2.SimilarityResponse(
-                similarities=similarities_flat,
-                num_queries=len(request.query_embeddings),
-                num_documents=len(request.document_embeddings),
+                    prompt_name = (
+                        chunk.prompt_name if chunk.HasField("prompt_name") else None
+                    )
+                    try:
+                        submitted = self._submit(
+                            list(chunk.texts),
+                            prompt_name,
+                            request_lane(chunk, context, default="bulk"),
+                            context.time_remaining(),
+                        )
+                    except (InvalidPriority, Overloaded) as e:
+                        error = shed_status(e)
+                        return
+                    async with changed:
+                        in_flight.append(
+                            (list(chunk.ids), asyncio.wrap_future(submitted))
+                        )
+                        changed.notify_all()
+                        # Once the window is full, stop reading until the oldest
+                        # chunk is answered so HTTP/2 flow control pushes back
+                        await changed.wait_for(
+                            lambda: len(in_flight) < self.stream_window
+                        )
+            finally:
+                async with changed:
+                    reading = False
+                    changed.notify_all()
+
+        async def reply(ids, pending):
+            try:
+                embeddings = await pending
+            except (Overloaded, CancelledError) as e:
+                await context.abort(*shed_status(e))
+            except Exception as e:
+                logging.error(f"Error in EncodeStream: {str(e)}", exc_info=True)
+                await context.abort(
+                    grpc.StatusCode.INTERNAL, f"Encoding failed: {str(e)}"
+                )
+            with self._stage("serialize"):
+                return stream_response(ids, embeddings)
+
+        reader = asyncio.create_task(read())
+        try:
+            while True:
+                async with changed:
+                    await changed.wait_for(lambda: in_flight or not reading)
+                    if not in_flight:
+                        break
+                    ids, pending = in_flight[0]
+                response = await reply(ids, pending)
+                async with changed:
+                    in_flight.popleft()
+                    changed.notify_all()
+                yield response
+
+            # Raises what the reader failed with, if anything
+            await reader
+            if error is not None:
+                await context.abort(*error)
+        finally:
+            # Once the stream ends early, its queued chunks are skipped
+            reader.cancel()
+            for _, pending in in_flight:
+                pending.cancel()
+
+    async def ComputeSimilarity(self, request, context):
+        """Compute similarity between query and document embeddings."""
+        started = time.perf_counter()
+        if not request.query_embeddings or not request.document_embeddings:
+            await context.abort(
+                grpc.StatusCode.INVALID_ARGUMENT,
+                "Both query_embeddings and document_embeddings must be provided",
+            )
+        if request.HasField("top_k") and request.top_k < 0:
+            await context.abort(
+                grpc.StatusCode.INVALID_ARGUMENT, "top_k cannot be negative"
             )
 
-            logging.debug("Similarity computation successful")
+        loop = asyncio.get_running_loop()
+        timing = BatchTiming()
+        try:
+            response = await loop.run_in_executor(
+                self.inference_executor, self._compute_similarity, request, timing
+            )
+            context.set_trailing_metadata(timing_metadata(timing, started))
             return response
-
         except Exception as e:
             logging.error(f"Error in ComputeSimilarity: {str(e)}", exc_info=True)
-            context.set_code(grpc.StatusCode.INTERNAL)
-            context.set_details(f"Similarity computation failed: {str(e)}")
-            return embedding_pb2.SimilarityResponse()
+            await context.abort(
+                grpc.StatusCode.INTERNAL, f"Similarity computation failed: {str(e)}"
+            )
 
-    def HealthCheck(self, request, context):
+    async def _encode_and_search(self, request, context, rpc: str):
+        """Shared body of EncodeAndSearch, Search and BatchSearch."""
+        started = time.perf_counter()
+        error = self._check_search(request)
+        if error is not None:
+            await context.abort(*error)
+
+        prompt_name = request.prompt_name if request.HasField("prompt_name") else None
+        loop = asyncio.get_running_loop()
+        timing = BatchTiming()
+        try:
+            embeddings = await asyncio.wrap_future(
+                self._submit(
+                    search_queries(request),
+                    prompt_name,
+                    request_lane(request, context),
+                    context.time_remaining(),
+                    timing,
+                )
+            )
+            response = await loop.run_in_executor(
+                self.inference_executor, self._search, request, embeddings, timing
+            )
+            context.set_trailing_metadata(timing_metadata(timing, started))
+            return response
+        except (InvalidPriority, Overloaded, CancelledError) as e:
+            await context.abort(*shed_status(e))
+        except Exception as e:
+            logging.error(f"Error in {rpc}: {str(e)}", exc_info=True)
+            await context.abort(grpc.StatusCode.INTERNAL, f"Search failed: {str(e)}")
+
+    async def EncodeAndSearch(self, request, context):
+        """Encode a query and return its nearest categories from the corpus."""
+        return await self._encode_and_search(request, context, "EncodeAndSearch")
+
+    async def Search(self, request, context):
+        """Encode a query and return its nearest categories from the HNSW index."""
+        return await self._encode_and_search(request, context, "Search")
+
+    async def BatchSearch(self, request, context):
+        """Encode several queries at once and search the corpus for each."""
+        return await self._encode_and_search(request, context, "BatchSearch")
+
+    async def HealthCheck(self, request, context):
         """Health check endpoint."""
-        return embedding_pb2.HealthCheckResponse(
-            healthy=True, model_name=self.model_name
-        )
+        return super().HealthCheck(request, context)
+
+
+SERVER_OPTIONS = [
+    ("grpc.max_send_message_length", 100 * 1024 * 1024),  # 100MB
+    ("grpc.max_receive_message_length", 100 * 1024 * 1024),  # 100MB
+]
 
 
-def serve(port: int = 50051, max_workers: int = 10):
-    """Start the gRPC server."""
+def serve(
+    port: int = 50051,
+    max_workers: int = 10,
+    metrics_port: Optional[int] = None,
+    **servicer_options,
+):
+    """
+    Start the gRPC server.
+
+    Args:
+        port: Port to listen on
+        max_workers: Threads handling RPCs
+        metrics_port: HTTP port serving Prometheus metrics, if any
+        servicer_options: Keyword arguments for EmbeddingServicer
+    """
+    metrics = None
+    interceptors = []
+    if metrics_port:
+        from metrics import Metrics, MetricsInterceptor
+
+        metrics = Metrics()
+        interceptors.append(MetricsInterceptor(metrics))
     server = grpc.server(
         futures.ThreadPoolExecutor(max_workers=max_workers),
-        options=[
-            ("grpc.max_send_message_length", 100 * 1024 * 1024),  # 100MB
-            ("grpc.max_receive_message_length", 100 * 1024 * 1024),  # 100MB
-        ],
+        interceptors=interceptors,
+        options=SERVER_OPTIONS,
     )
 
-    embedding_pb2_grpc.add_EmbeddingServiceServicer_to_server(
-        EmbeddingServicer(), server
-    )
+    servicer = EmbeddingServicer(metrics=metrics, **servicer_options)
+    embedding_pb2_grpc.add_EmbeddingServiceServicer_to_server(servicer, server)
+    if metrics is not None:
+        metrics.watch(servicer)
+        metrics.serve(metrics_port)
+        logging.info(f"Serving metrics on port {metrics_port}")
 
     server.add_insecure_port(f"[::]:{port}")
     server.start()
@@ -142,6 +1127,7 @@ def serve(port: int = 50051, max_workers: int = 10):
         logging.info("Received shutdown signal")
         done_event = server.stop(grace=10)
         done_event.wait()
+        servicer.close()
         logging.info("Server stopped")
         sys.exit(0)
 
@@ -151,10 +1137,217 @@ def serve(port: int = 50051, max_workers: int = 10):
     server.wait_for_termination()
 
 
+async def serve_aio(
+    port: int = 50051,
+    inference_threads: int = 2,
+    metrics_port: Optional[int] = None,
+    **servicer_options,
+):
+    """
+    Start the grpc.aio server and run until SIGTERM or SIGINT.
+
+    Args:
+        port: Port to listen on
+        inference_threads: Threads of the executor running similarity scoring
+        metrics_port: HTTP port serving Prometheus metrics, if any
+        servicer_options: Keyword arguments for EmbeddingServicer
+    """
+    metrics = None
+    interceptors = []
+    if metrics_port:
+        from metrics import AsyncMetricsInterceptor, Metrics
+
+        metrics = Metrics()
+        interceptors.append(AsyncMetricsInterceptor(metrics))
+    server = grpc.aio.server(interceptors=interceptors, options=SERVER_OPTIONS)
+
+    servicer = AsyncEmbeddingServicer(
+        inference_threads=inference_threads, metrics=metrics, **servicer_options
+    )
+    embedding_pb2_grpc.add_EmbeddingServiceServicer_to_server(servicer, server)
+    if metrics is not None:
+        metrics.watch(servicer)
+        metrics.serve(metrics_port)
+        logging.info(f"Serving metrics on port {metrics_port}")
+
+    server.add_insecure_port(f"[::]:{port}")
+    await server.start()
+
+    logging.info(f"Async server started on port {port}")
+
+    # Graceful shutdown
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, stop.set)
+    loop.add_signal_handler(signal.SIGINT, stop.set)
+    await stop.wait()
+
+    logging.info("Received shutdown signal")
+    await server.stop(grace=10)
+    servicer.close()
+    logging.info("Server stopped")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Embedding gRPC server")
+    parser.add_argument("--port", type=int, default=50051)
+    parser.add_argument(
+        "--model", default=DEFAULT_MODEL, help="Model id or local model directory"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="torch",
+        help="Run the model on PyTorch or ONNX Runtime",
+    )
+    parser.add_argument(
+        "--model-file",
+        default=None,
+        help="ONNX file inside the model directory, e.g. a quantized int8 model",
+    )
+    parser.add_argument(
+        "--max-workers", type=int, default=10, help="gRPC handler threads"
+    )
+    parser.add_argument(
+        "--aio",
+        action="store_true",
+        help="Serve with grpc.aio coroutines instead of a handler thread pool",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="Serve Prometheus metrics over HTTP on this port (needs the metrics extra)",
+    )
+    parser.add_argument(
+        "--inference-threads",
+        type=int,
+        default=2,
+        help="Threads running similarity scoring and search in --aio mode",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Model worker processes, each pinned to its own cores (0 runs in-process)",
+    )
+    parser.add_argument(
+        "--worker-threads",
+        type=int,
+        default=None,
+        help="Torch threads per worker process (defaults to its share of cores)",
+    )
+    parser.add_argument(
+        "--max-batch-size",
+        type=int,
+        default=64,
+        help="Maximum texts merged into one forward pass",
+    )
+    parser.add_argument(
+        "--max-wait-ms",
+        type=float,
+        default=5.0,
+        help="How long a bulk batch waits for more texts before running",
+    )
+    parser.add_argument(
+        "--interactive-wait-ms",
+        type=float,
+        default=0.5,
+        help="How long an interactive batch waits for more texts before running",
+    )
+    parser.add_argument(
+        "--max-queue-texts",
+        type=int,
+        default=10000,
+        help="Texts a priority lane may hold before new requests fail with "
+        "RESOURCE_EXHAUSTED (0 leaves the lanes unbounded)",
+    )
+    parser.add_argument(
+        "--cache-mb",
+        type=int,
+        default=256,
+        help="Memory budget of the embedding cache in MiB (0 disables it)",
+    )
+    parser.add_argument(
+        "--disk-cache-dir",
+        default=None,
+        help="Directory of a persistent embedding cache shared across restarts",
+    )
+    parser.add_argument(
+        "--disk-cache-max-rows",
+        type=int,
+        default=0,
+        help="Rows after which the disk cache stops growing (0 leaves it unbounded)",
+    )
+    parser.add_argument(
+        "--stream-window",
+        type=int,
+        default=8,
+        help="Chunks of one EncodeStream call encoded concurrently",
+    )
+    parser.add_argument(
+        "--bucket-width",
+        type=int,
+        default=16,
+        help="Token-length bucket width for splitting batches (0 disables bucketing)",
+    )
+    parser.add_argument(
+        "--corpus",
+        default=None,
+        help="Corpus directory written by corpus.py export, served by EncodeAndSearch",
+    )
+    parser.add_argument(
+        "--hnsw",
+        action="store_true",
+        help="Also load the corpus' HNSW index (corpus.py build-hnsw) to serve Search",
+    )
+    parser.add_argument(
+        "--data-dir",
+        default=os.environ.get("DATA_DIR", "data"),
+        help="Directory with {wiki}/categories.parquet for per-wiki search filters",
+    )
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
     logging.basicConfig(
         level=logging.INFO,
         format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
     )
 
-    serve()
+    args = parse_args()
+    servicer_options = dict(
+        model_name=args.model,
+        backend=args.backend,
+        model_file=args.model_file,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        interactive_wait_ms=args.interactive_wait_ms,
+        max_queue_texts=args.max_queue_texts,
+        cache_mb=args.cache_mb,
+        disk_cache_dir=args.disk_cache_dir,
+        disk_cache_max_rows=args.disk_cache_max_rows,
+        stream_window=args.stream_window,
+        workers=args.workers,
+        worker_threads=args.worker_threads,
+        bucket_width=args.bucket_width,
+        corpus_dir=args.corpus,
+        hnsw=args.hnsw,
+        data_dir=args.data_dir,
+    )
+    if args.aio:
+        asyncio.run(
+            serve_aio(
+                port=args.port,
+                inference_threads=args.inference_threads,
+                metrics_port=args.metrics_port,
+                **servicer_options,
+            )
+        )
+    else:
+        serve(
+            port=args.port,
+            max_workers=args.max_workers,
+            metrics_port=args.metrics_port,
+            **servicer_options,
+        )
@@ -0,0 +1,65 @@
+"""
+Consistent hashing of texts to embedding server replicas.
+
+Every replica owns many points on a 64-bit ring and a text belongs to the
+replica owning the first point at or after the text's hash. Each replica
+then caches its own share of the texts, so adding replicas adds cache
+capacity, and adding or removing one replica only moves the texts on the
+arcs it gains or loses (about 1/N of them) instead of reshuffling all.
+"""
+
+import hashlib
+from typing import List, Optional
+
+import numpy as np
+
+# Ring points per replica; more points spread the texts more evenly
+VIRTUAL_NODES = 160
+
+
+def ring_hash(key: str) -> int:
+    """Stable 64-bit hash of key; Python's hash() differs between processes."""
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def routing_key(text: str, prompt_name: Optional[str] = None) -> str:
+    """The key a text is routed by; servers cache it per prompt as well."""
+    return f"{prompt_name or ''}\x00{text}"
+
+
+class HashRing:
+    """Maps keys to one of a fixed list of nodes."""
+
+    def __init__(self, nodes: List[str], virtual_nodes: int = VIRTUAL_NODES):
+        """
+        Args:
+            nodes: Node names, e.g. "host:port"; positions on the ring depend
+                only on the names, not on their order
+            virtual_nodes: Ring points per node
+        """
+        if not nodes:
+            raise ValueError("A hash ring needs at least one node")
+        self.nodes = list(nodes)
+        points = sorted(
+            (ring_hash(f"{node}#{i}"), index)
+            for index, node in enumerate(self.nodes)
+            for i in range(virtual_nodes)
+        )
+        self._points = np.array([point for point, _ in points], dtype=np.uint64)
+        self._owners = np.array([index for _, index in points], dtype=np.int64)
+
+    def assign(self, keys: List[str]) -> np.ndarray:
+        """
+        Find the node of every key.
+
+        Returns:
+            Array of indices into nodes, aligned with keys
+        """
+        hashes = np.array([ring_hash(key) for key in keys], dtype=np.uint64)
+        positions = np.searchsorted(self._points, hashes) % len(self._points)
+        return self._owners[positions]
+
+    def node(self, key: str) -> str:
+        """The node a single key belongs to."""
+        return self.nodes[self.assign([key])[0]]
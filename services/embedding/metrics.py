@@ -0,0 +1,325 @@
+"""
+Prometheus metrics for the embedding server.
+
+Started with --metrics-port, the server serves /metrics on that side HTTP
+port (needs the metrics extra: uv sync --extra metrics):
+
+    embedding_requests_total{rpc,code}       finished RPCs by status code,
+                                             UNKNOWN when a handler raised
+    embedding_rpc_seconds{rpc}               RPC latency as seen by the server
+    embedding_stage_seconds{stage}           time spent per stage: tokenize,
+                                             forward, search and serialize
+    embedding_queue_seconds{lane}            time requests waited for a batch
+    embedding_batch_texts                    texts per forward pass
+    embedding_batch_tokens                   real tokens per forward pass
+    embedding_cache_{hits,misses}_total{cache}
+    embedding_cache_hit_ratio{cache}         memory and disk cache
+    embedding_queue_{requests,texts}{lane}   waiting for a batch right now
+    embedding_shed_requests_total{lane,reason}
+    embedding_padding_efficiency
+    process_resident_memory_bytes            and the other process_* metrics
+
+Ratios and rates are better computed in PromQL from the counters; the hit
+ratio gauge is there for quick looks at a single server.
+"""
+
+import time
+from typing import List
+
+import grpc
+
+try:
+    from prometheus_client import CollectorRegistry, Counter, Histogram
+    from prometheus_client import ProcessCollector, start_http_server
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+except ImportError as e:
+    raise SystemExit(
+        "Serving metrics needs prometheus-client installed (uv sync --extra metrics)"
+    ) from e
+
+SECONDS_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+TEXTS_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+TOKENS_BUCKETS = (16, 64, 256, 1024, 4096, 16384, 65536)
+
+
+class Metrics:
+    """Metrics of one embedding server, in their own registry."""
+
+    def __init__(self):
+        self.registry = CollectorRegistry()
+        ProcessCollector(registry=self.registry)
+        self.requests = Counter(
+            "embedding_requests",
+            "Finished RPCs",
+            ["rpc", "code"],
+            registry=self.registry,
+        )
+        self.rpc_seconds = Histogram(
+            "embedding_rpc_seconds",
+            "RPC latency measured in the server",
+            ["rpc"],
+            buckets=SECONDS_BUCKETS,
+            registry=self.registry,
+        )
+        self.stage_seconds = Histogram(
+            "embedding_stage_seconds",
+            "Time spent in each processing stage",
+            ["stage"],
+            buckets=SECONDS_BUCKETS,
+            registry=self.registry,
+        )
+        self.queue_seconds = Histogram(
+            "embedding_queue_seconds",
+            "Time requests waited for a batch",
+            ["lane"],
+            buckets=SECONDS_BUCKETS,
+            registry=self.registry,
+        )
+        self.batch_texts = Histogram(
+            "embedding_batch_texts",
+            "Texts per forward pass",
+            buckets=TEXTS_BUCKETS,
+            registry=self.registry,
+        )
+        self.batch_tokens = Histogram(
+            "embedding_batch_tokens",
+            "Real (unpadded) tokens per forward pass",
+            buckets=TOKENS_BUCKETS,
+            registry=self.registry,
+        )
+
+    def watch(self, servicer):
+        """Export the caches, lanes and padding counters of servicer."""
+        self.registry.register(ServicerCollector(servicer))
+
+    def serve(self, port: int):
+        """Serve /metrics on port from a background thread."""
+        start_http_server(port, registry=self.registry)
+
+    def observe_stage(self, stage: str, seconds: float):
+        self.stage_seconds.labels(stage).observe(seconds)
+
+    def observe_queue(self, lane: str, seconds: float):
+        self.queue_seconds.labels(lane).observe(seconds)
+
+    def observe_batch(self, lengths: List[int], tokenize: float, forward: float):
+        """Record one merged batch and its tokenize and forward durations."""
+        self.batch_texts.observe(len(lengths))
+        self.batch_tokens.observe(sum(lengths))
+        self.observe_stage("tokenize", tokenize)
+        self.observe_stage("forward", forward)
+
+    def observe_rpc(self, rpc: str, code, seconds: float):
+        if code is None:
+            name = "OK"
+        elif isinstance(code, grpc.StatusCode):
+            name = code.name
+        else:
+            name = str(code)
+        self.requests.labels(rpc, name).inc()
+        self.rpc_seconds.labels(rpc).observe(seconds)
+
+
+class ServicerCollector:
+    """Reads the counters the servicer already keeps at scrape time."""
+
+    def __init__(self, servicer):
+        self.servicer = servicer
+
+    def collect(self):
+        servicer = self.servicer
+        hits = CounterMetricFamily(
+            "embedding_cache_hits",
+            "Cache lookups that found the text",
+            labels=["cache"],
+        )
+        misses = CounterMetricFamily(
+            "embedding_cache_misses", "Cache lookups that missed", labels=["cache"]
+        )
+        ratio = GaugeMetricFamily(
+            "embedding_cache_hit_ratio",
+            "Cache hits over lookups since startup",
+            labels=["cache"],
+        )
+        for name, cache in (("memory", servicer.cache), ("disk", servicer.disk_cache)):
+            if cache is None:
+                continue
+            lookups = cache.hits + cache.misses
+            hits.add_metric([name], cache.hits)
+            misses.add_metric([name], cache.misses)
+            ratio.add_metric([name], cache.hits / lookups if lookups else 0.0)
+        yield hits
+        yield misses
+        yield ratio
+
+        queue_requests = GaugeMetricFamily(
+            "embedding_queue_requests", "Requests waiting for a batch", labels=["lane"]
+        )
+        queue_texts = GaugeMetricFamily(
+            "embedding_queue_texts", "Texts waiting for a batch", labels=["lane"]
+        )
+        shed = CounterMetricFamily(
+            "embedding_shed_requests",
+            "Requests rejected before queueing or skipped after their RPC ended",
+            labels=["lane", "reason"],
+        )
+        for name, lane in servicer.scheduler.lanes.items():
+            queue_requests.add_metric([name], lane.queued_requests)
+            queue_texts.add_metric([name], lane.queued_texts)
+            shed.add_metric([name, "rejected"], lane.rejected)
+            shed.add_metric([name, "skipped"], lane.skipped)
+        yield queue_requests
+        yield queue_texts
+        yield shed
+
+        yield GaugeMetricFamily(
+            "embedding_padding_efficiency",
+            "Fraction of computed token positions that held real tokens",
+            value=servicer.padding.efficiency,
+        )
+
+
+def _rpc_name(handler_call_details) -> str:
+    return handler_call_details.method.rsplit("/", 1)[-1]
+
+
+def _rpc_code(context, raised: bool):
+    """Status code of a finished RPC; grpc ends a handler that raised as UNKNOWN."""
+    code = context.code()
+    if code is None and raised:
+        return grpc.StatusCode.UNKNOWN
+    return code
+
+
+class MetricsInterceptor(grpc.ServerInterceptor):
+    """Counts and times the RPCs of the threaded server."""
+
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+        rpc = _rpc_name(handler_call_details)
+        metrics = self.metrics
+
+        if handler.unary_unary is not None:
+
+            def unary_unary(request, context):
+                started = time.perf_counter()
+                raised = False
+                try:
+                    return handler.unary_unary(request, context)
+                except Exception:
+                    raised = True
+                    raise
+                finally:
+                    metrics.observe_rpc(
+                        rpc, _rpc_code(context, raised), time.perf_counter() - started
+                    )
+
+            return grpc.unary_unary_rpc_method_handler(
+                unary_unary,
+                request_deserializer=handler.request_deserializer,
+                response_serializer=handler.response_serializer,
+            )
+
+        if handler.stream_stream is not None:
+
+            def stream_stream(request_iterator, context):
+                started = time.perf_counter()
+                raised = False
+                try:
+                    yield from handler.stream_stream(request_iterator, context)
+                except Exception:
+                    raised = True
+                    raise
+                finally:
+                    metrics.observe_rpc(
+                        rpc, _rpc_code(context, raised), time.perf_counter() - started
+                    )
+
+            return grpc.stream_stream_rpc_method_handler(
+                stream_stream,
+                request_deserializer=handler.request_deserializer,
+                response_serializer=handler.response_serializer,
+            )
+
+        return handler
+
+
+class AsyncMetricsInterceptor(grpc.aio.ServerInterceptor):
+    """Counts and times the RPCs of the grpc.aio server."""
+
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return None
+        rpc = _rpc_name(handler_call_details)
+        metrics = self.metrics
+
+        if handler.unary_unary is not None:
+
+            async def unary_unary(request, context):
+                started = time.perf_counter()
+                raised = False
+                try:
+                    return await handler.unary_unary(request, context)
+                except Exception:
+                    raised = True
+                    raise
+                finally:
+                    metrics.observe_rpc(
+                        rpc, _rpc_code(context, raised), time.perf_counter() - started
+                    )
+
+            return grpc.unary_unary_rpc_method_handler(
+                unary_unary,
+                request_deserializer=handler.request_deserializer,
+                response_serializer=handler.response_serializer,
+            )
+
+        if handler.stream_stream is not None:
+
+            async def stream_stream(request_iterator, context):
+                started = time.perf_counter()
+                raised = False
+                try:
+                    async for response in handler.stream_stream(
+                        request_iterator, context
+                    ):
+                        yield response
+                except Exception:
+                    raised = True
+                    raise
+                finally:
+                    metrics.observe_rpc(
+                        rpc, _rpc_code(context, raised), time.perf_counter() - started
+                    )
+
+            return grpc.stream_stream_rpc_method_handler(
+                stream_stream,
+                request_deserializer=handler.request_deserializer,
+                response_serializer=handler.response_serializer,
+            )
+
+        return handler
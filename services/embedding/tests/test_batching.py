@@ -0,0 +1,289 @@
+"""Tests for the batch scheduler, admission control and request coalescing."""
+
+import threading
+import time
+from concurrent.futures import CancelledError, Future
+
+import numpy as np
+import pytest
+
+from batching import (
+    BatchScheduler,
+    BatchTiming,
+    DeadlineUnreachable,
+    PaddingStats,
+    QueueFull,
+    RequestCoalescer,
+    length_buckets,
+)
+
+
+class StubEncoder:
+    """encode_fn stand-in: text "t<n>" encodes to [n, 0]; records every batch."""
+
+    def __init__(self):
+        self.batches = []
+        self.started = threading.Event()
+        # Cleared to hold the runner inside its forward pass
+        self.gate = threading.Event()
+        self.gate.set()
+        self.error = None
+
+    def __call__(self, texts, prompt_name, stages):
+        self.batches.append((list(texts), prompt_name))
+        self.started.set()
+        self.gate.wait(5)
+        stages["forward"] = 0.25
+        if self.error is not None:
+            raise self.error
+        return np.array([[float(text[1:]), 0.0] for text in texts], np.float32)
+
+
+@pytest.fixture
+def encoder():
+    return StubEncoder()
+
+
+@pytest.fixture
+def make_scheduler(encoder):
+    schedulers = []
+
+    def make(**options):
+        scheduler = BatchScheduler(encoder, **options)
+        schedulers.append(scheduler)
+        return scheduler
+
+    yield make
+    encoder.gate.set()
+    for scheduler in schedulers:
+        scheduler.stop()
+
+
+def texts(*numbers):
+    return [f"t{n}" for n in numbers]
+
+
+def hold_runner(scheduler, encoder):
+    """Occupy the runner so later submissions stay queued."""
+    encoder.gate.clear()
+    blocker = scheduler.submit(texts(999))
+    assert encoder.started.wait(5)
+    return blocker
+
+
+def test_merged_batch_returns_each_caller_its_slice(make_scheduler, encoder):
+    scheduler = make_scheduler(max_wait_ms=200, max_batch_size=64)
+    futures = [
+        scheduler.submit(texts(1, 2)),
+        scheduler.submit(texts(3)),
+        scheduler.submit(texts(4, 5, 6)),
+    ]
+
+    results = [future.result(5) for future in futures]
+
+    assert len(encoder.batches) == 1
+    assert [result[:, 0].tolist() for result in results] == [[1, 2], [3], [4, 5, 6]]
+
+
+def test_batches_are_split_by_prompt_name(make_scheduler, encoder):
+    scheduler = make_scheduler(max_wait_ms=200)
+    query = scheduler.submit(texts(1), "query")
+    document = scheduler.submit(texts(2), None)
+
+    assert query.result(5)[:, 0].tolist() == [1]
+    assert document.result(5)[:, 0].tolist() == [2]
+    assert sorted(encoder.batches, key=str) == [(["t1"], "query"), (["t2"], None)]
+
+
+def test_max_batch_size_splits_the_queue(make_scheduler, encoder):
+    scheduler = make_scheduler(max_wait_ms=50, max_batch_size=4)
+    hold_runner(scheduler, encoder)
+    futures = [scheduler.submit(texts(n, n + 100)) for n in range(5)]
+    encoder.gate.set()
+
+    for n, future in enumerate(futures):
+        assert future.result(5)[:, 0].tolist() == [n, n + 100]
+    assert all(len(batch) <= 4 for batch, _ in encoder.batches)
+
+
+def test_interactive_is_served_before_bulk(make_scheduler, encoder):
+    scheduler = make_scheduler(max_wait_ms=1, interactive_wait_ms=1)
+    hold_runner(scheduler, encoder)
+    bulk = scheduler.submit(texts(1), lane="bulk")
+    interactive = scheduler.submit(texts(2), lane="interactive")
+    encoder.gate.set()
+
+    bulk.result(5)
+    interactive.result(5)
+    # The blocker first, then the interactive batch although bulk came first
+    assert [batch for batch, _ in encoder.batches[1:]] == [["t2"], ["t1"]]
+    assert scheduler.lanes["interactive"].requests == 1
+
+
+def test_queue_full_is_raised_past_the_cap(make_scheduler, encoder):
+    scheduler = make_scheduler(max_queue_texts=5)
+    hold_runner(scheduler, encoder)
+    scheduler.submit(texts(1, 2, 3, 4), lane="bulk")
+
+    scheduler.admit(1, "bulk")
+    with pytest.raises(QueueFull):
+        scheduler.admit(2, "bulk")
+    assert scheduler.lanes["bulk"].rejected == 1
+    # A request larger than the cap is still taken on an empty lane
+    scheduler.admit(10, "interactive")
+
+
+def test_deadline_unreachable_is_raised_when_the_wait_is_too_long(make_scheduler):
+    scheduler = make_scheduler(max_wait_ms=5)
+    scheduler.seconds_per_text = 0.01
+
+    scheduler.admit(10, "bulk", timeout=1.0)
+    with pytest.raises(DeadlineUnreachable):
+        scheduler.admit(500, "bulk", timeout=1.0)
+    assert scheduler.lanes["bulk"].rejected == 1
+
+
+def test_abandoned_requests_are_skipped(make_scheduler, encoder):
+    scheduler = make_scheduler(max_wait_ms=1)
+    hold_runner(scheduler, encoder)
+    dropped = scheduler.submit(texts(1), lane="bulk", abandoned=lambda: True)
+    kept = scheduler.submit(texts(2), lane="bulk", abandoned=lambda: False)
+    encoder.gate.set()
+
+    assert kept.result(5)[:, 0].tolist() == [2]
+    assert dropped.cancelled()
+    assert all("t1" not in batch for batch, _ in encoder.batches)
+    assert scheduler.lanes["bulk"].skipped == 1
+
+
+def test_concurrency_runs_batches_side_by_side(make_scheduler, encoder):
+    scheduler = make_scheduler(max_wait_ms=1, concurrency=2)
+    hold_runner(scheduler, encoder)
+    second = scheduler.submit(texts(1))
+
+    deadline = time.monotonic() + 5
+    while len(encoder.batches) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # Both batches are inside a forward pass at once
+    assert len(encoder.batches) == 2
+    encoder.gate.set()
+    assert second.result(5)[:, 0].tolist() == [1]
+
+
+def test_encode_errors_fail_every_request_of_the_batch(make_scheduler, encoder):
+    scheduler = make_scheduler(max_wait_ms=1)
+    hold_runner(scheduler, encoder)
+    encoder.error = RuntimeError("model failed")
+    first = scheduler.submit(texts(1))
+    second = scheduler.submit(texts(2))
+    encoder.gate.set()
+
+    for future in (first, second):
+        with pytest.raises(RuntimeError, match="model failed"):
+            future.result(5)
+
+
+def test_a_cancelled_request_does_not_block_its_batch(make_scheduler, encoder):
+    scheduler = make_scheduler(max_wait_ms=1)
+    hold_runner(scheduler, encoder)
+    cancelled = scheduler.submit(texts(1), lane="bulk")
+    other = scheduler.submit(texts(2), lane="bulk")
+    # No abandoned() check, so the cancelled texts still ride in the batch
+    assert cancelled.cancel()
+    encoder.gate.set()
+
+    assert other.result(5)[:, 0].tolist() == [2]
+    with pytest.raises(CancelledError):
+        cancelled.result(5)
+
+
+def test_encode_blocks_until_the_batch_ran(make_scheduler):
+    scheduler = make_scheduler(max_wait_ms=1)
+
+    assert scheduler.encode(texts(7, 8))[:, 0].tolist() == [7, 8]
+
+
+def test_timing_reports_the_stages_and_batch_size(make_scheduler):
+    scheduler = make_scheduler(max_wait_ms=200)
+    timing, other = BatchTiming(), BatchTiming()
+    first = scheduler.submit(texts(1, 2), timing=timing)
+    scheduler.submit(texts(3), timing=other).result(5)
+    first.result(5)
+
+    assert timing.batch_size == other.batch_size == 3
+    assert timing.stages["forward"] == 0.25
+    assert timing.stages["queue"] >= 0
+
+
+def test_queue_waits_are_observed_per_lane(make_scheduler):
+    waits = []
+    scheduler = make_scheduler(
+        max_wait_ms=1, observe_queue=lambda lane, seconds: waits.append(lane)
+    )
+    scheduler.submit(texts(1), lane="interactive").result(5)
+    scheduler.submit(texts(2, 3)).result(5)
+
+    assert waits == ["interactive", "bulk"]
+
+
+def test_length_buckets_group_by_width():
+    buckets = length_buckets([3, 17, 9, 16, 1, 40], width=8)
+
+    assert [bucket.tolist() for bucket in buckets] == [[0, 4], [2, 3], [1], [5]]
+
+
+def test_zero_width_keeps_one_bucket():
+    assert [bucket.tolist() for bucket in length_buckets([5, 1, 9], 0)] == [[0, 1, 2]]
+
+
+def test_padding_efficiency_counts_each_bucket_to_its_longest_text():
+    stats = PaddingStats()
+    lengths = [2, 4, 10]
+
+    stats.record(lengths, [np.array([0, 1]), np.array([2])])
+
+    assert (stats.tokens, stats.padded_tokens) == (16, 18)
+    assert stats.efficiency == pytest.approx(16 / 18)
+
+
+def test_dedupe_keeps_first_seen_order():
+    coalescer = RequestCoalescer()
+
+    unique, positions = coalescer.dedupe(["b", "a", "b", "c", "a"])
+
+    assert unique == ["b", "a", "c"]
+    assert [unique[i] for i in positions] == ["b", "a", "b", "c", "a"]
+    assert coalescer.duplicates == 2
+
+
+def test_claim_joins_keys_already_in_flight():
+    coalescer = RequestCoalescer()
+    first, owned, joined = coalescer.claim(["a", "b"], Future())
+    assert owned == [0, 1] and joined == []
+
+    _, owned, joined = coalescer.claim(["b", "c"], Future())
+
+    assert owned == [1]
+    # "b" is row 1 of the first claim's result
+    assert joined == [(0, first, 1)]
+    assert coalescer.coalesced == 1
+
+    coalescer.release(first)
+    _, owned, joined = coalescer.claim(["a", "b"], Future())
+    assert owned == [0, 1] and joined == []
+
+
+def test_abandon_waits_for_every_consumer():
+    coalescer = RequestCoalescer()
+    owner, joiner = Future(), Future()
+    claimed, _, _ = coalescer.claim(["a"], owner)
+    coalescer.claim(["a"], joiner)
+
+    owner.cancel()
+    assert not coalescer.abandon(claimed)
+
+    joiner.cancel()
+    assert coalescer.abandon(claimed)
+    # The key can be claimed anew
+    _, owned, joined = coalescer.claim(["a"], Future())
+    assert owned == [0] and joined == []
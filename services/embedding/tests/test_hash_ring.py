@@ -0,0 +1,59 @@
+"""Tests for consistent-hash routing of texts to replicas."""
+
+import numpy as np
+import pytest
+
+from hash_ring import HashRing, routing_key
+
+NODES = ["10.0.0.1:50051", "10.0.0.2:50051", "10.0.0.3:50051"]
+KEYS = [routing_key(f"Category {i}", None) for i in range(5000)]
+
+
+def owners(ring: HashRing):
+    return np.array(ring.nodes)[ring.assign(KEYS)]
+
+
+def test_assignment_does_not_depend_on_node_order():
+    np.testing.assert_array_equal(
+        owners(HashRing(NODES)), owners(HashRing(list(reversed(NODES))))
+    )
+
+
+def test_node_agrees_with_assign():
+    ring = HashRing(NODES)
+    assigned = owners(ring)
+    assert [ring.node(key) for key in KEYS[:50]] == assigned[:50].tolist()
+
+
+def test_keys_are_spread_over_all_nodes():
+    _, counts = np.unique(owners(HashRing(NODES)), return_counts=True)
+    assert len(counts) == len(NODES)
+    assert counts.min() > len(KEYS) / len(NODES) * 0.7
+
+
+def test_adding_a_node_only_moves_keys_to_it():
+    before = owners(HashRing(NODES))
+    after = owners(HashRing(NODES + ["10.0.0.4:50051"]))
+
+    moved = before != after
+    assert set(after[moved]) == {"10.0.0.4:50051"}
+    # About a quarter of the keys belong to the new node
+    assert 0.15 < moved.mean() < 0.35
+
+
+def test_removing_a_node_only_moves_its_keys():
+    before = owners(HashRing(NODES))
+    after = owners(HashRing(NODES[:2]))
+
+    moved = before != after
+    assert set(before[moved]) == {NODES[2]}
+    assert (after[before != NODES[2]] == before[before != NODES[2]]).all()
+
+
+def test_prompt_names_route_separately():
+    assert routing_key("Physics", "query") != routing_key("Physics", None)
+
+
+def test_an_empty_ring_is_rejected():
+    with pytest.raises(ValueError):
+        HashRing([])
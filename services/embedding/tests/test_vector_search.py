@@ -0,0 +1,76 @@
+"""Tests for the top-k helpers against a brute-force argsort."""
+
+import numpy as np
+import pytest
+
+from vector_search import blocked_top_k, normalize, pack_mask, top_k, top_k_cosine
+
+
+def brute_force(scores: np.ndarray, k: int, allowed=None):
+    """Indices and scores of the k best columns per row by a full sort."""
+    columns = np.arange(scores.shape[1])
+    if allowed is not None:
+        columns = columns[allowed]
+    order = np.argsort(-scores[:, columns], axis=1, kind="stable")[:, :k]
+    indices = columns[order]
+    return indices, np.take_along_axis(scores, indices, axis=1)
+
+
+@pytest.fixture
+def vectors():
+    rng = np.random.default_rng(0)
+    return normalize(rng.normal(size=(5, 16))), normalize(rng.normal(size=(203, 16)))
+
+
+@pytest.mark.parametrize("k", [0, 1, 7, 203, 500])
+def test_top_k_matches_a_full_sort(vectors, k):
+    queries, documents = vectors
+    scores = queries @ documents.T
+
+    indices, best = top_k(scores, k)
+
+    expected_indices, expected_scores = brute_force(scores, k)
+    np.testing.assert_array_equal(indices, expected_indices)
+    np.testing.assert_allclose(best, expected_scores)
+
+
+@pytest.mark.parametrize("k", [1, 10, 203])
+@pytest.mark.parametrize("block_rows", [8, 64, 16384])
+def test_blocked_top_k_matches_a_full_sort(vectors, k, block_rows):
+    queries, documents = vectors
+
+    indices, best = blocked_top_k(queries, documents, k, block_rows=block_rows)
+
+    expected_indices, expected_scores = brute_force(queries @ documents.T, k)
+    np.testing.assert_array_equal(indices, expected_indices)
+    np.testing.assert_allclose(best, expected_scores, atol=1e-6)
+
+
+@pytest.mark.parametrize("k", [1, 10, 203])
+@pytest.mark.parametrize("block_rows", [8, 64, 16384])
+def test_blocked_top_k_only_scores_allowed_rows(vectors, k, block_rows):
+    queries, documents = vectors
+    allowed = np.random.default_rng(1).random(len(documents)) < 0.3
+
+    indices, best = blocked_top_k(
+        queries, documents, k, block_rows=block_rows, allowed=pack_mask(allowed)
+    )
+
+    expected_indices, expected_scores = brute_force(queries @ documents.T, k, allowed)
+    assert indices.shape[1] == min(k, allowed.sum())
+    np.testing.assert_array_equal(indices, expected_indices)
+    np.testing.assert_allclose(best, expected_scores, atol=1e-6)
+
+
+def test_top_k_cosine_normalizes_and_filters_by_score(vectors):
+    queries, documents = vectors
+    # Scaling must not change cosine scores
+    matches = top_k_cosine(queries * 3, documents * 0.5, 10, min_score=0.2)
+
+    expected_indices, expected_scores = brute_force(queries @ documents.T, 10)
+    for row, found in enumerate(matches):
+        keep = expected_scores[row] >= 0.2
+        assert [index for index, _ in found] == expected_indices[row][keep].tolist()
+        np.testing.assert_allclose(
+            [score for _, score in found], expected_scores[row][keep], atol=1e-6
+        )
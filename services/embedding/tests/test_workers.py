@@ -0,0 +1,70 @@
+"""Tests for the multi-process worker pool, run with a stub model."""
+
+import os
+import signal
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from workers import POLL_SECONDS, WorkerPool
+
+
+class StubModel:
+    """Text "t<n>" encodes to [n, 0]; a batch containing "hang" never returns."""
+
+    def encode(self, texts, prompt_name=None, batch_size=None):
+        if "hang" in texts:
+            time.sleep(600)
+        time.sleep(0.02)
+        return np.array([[float(text[1:]), 0.0] for text in texts], np.float32)
+
+
+def load_stub_model(model_name, backend, model_file, threads):
+    return StubModel()
+
+
+@pytest.fixture
+def pool():
+    pool = WorkerPool(
+        "stub", "torch", None, 3, max_batch_size=4, dim=2, load_model=load_stub_model
+    )
+    yield pool
+    pool.close()
+
+
+def test_encode_splits_jobs_across_workers(pool):
+    texts = [f"t{n}" for n in range(10)]
+
+    embeddings = pool.encode(texts)
+
+    np.testing.assert_array_equal(embeddings[:, 0], np.arange(10))
+
+
+def test_a_killed_worker_fails_its_job_while_the_others_are_busy(pool):
+    hung = pool.submit(["hang"])
+    # The only job so far, handed to a worker as soon as it was submitted
+    index = next(i for i, job in enumerate(pool._assigned) if job is not None)
+
+    # Keep the other workers answering, so results never stop arriving
+    stop = threading.Event()
+    answered = []
+
+    def load():
+        while not stop.is_set():
+            answered.append(pool.encode(["t1", "t2"]))
+
+    loader = threading.Thread(target=load)
+    loader.start()
+    try:
+        time.sleep(0.2)
+        os.kill(pool._processes[index].pid, signal.SIGKILL)
+
+        with pytest.raises(RuntimeError, match=f"Worker {index}"):
+            hung.result(timeout=POLL_SECONDS * 5)
+    finally:
+        stop.set()
+        loader.join()
+    assert answered
+    np.testing.assert_array_equal(pool.encode(["t7"]), [[7.0, 0.0]])
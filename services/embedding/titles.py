@@ -0,0 +1,42 @@
+"""
+Category titles to exercise the model with.
+
+Used by the backend parity check and the benchmark. Kept apart from
+backends.py so the benchmark can read titles without importing torch.
+"""
+
+import random
+from typing import List, Optional
+
+# Used when no titles file is given
+SAMPLE_TITLES = [
+    "Physics",
+    "Machine learning",
+    "Association football clubs established in 1892",
+    "21st-century American women writers",
+    "Populated places in Kerala",
+    "Members of the European Parliament for the United Kingdom 1999–2004",
+    "Bridges completed in 1932",
+    "Fictional detectives",
+    "Tamil-language films",
+    "Extinct languages of Africa",
+    "Renaissance architecture in Florence",
+    "People from Thiruvananthapuram district",
+]
+
+
+def read_titles(path: Optional[str], sample: int) -> List[str]:
+    """Read category titles from a parquet file or a text file with one per line."""
+    if path is None:
+        return SAMPLE_TITLES
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise SystemExit("Reading parquet titles needs pyarrow installed") from e
+        titles = pq.read_table(path, columns=["page_title"]).column(0).to_pylist()
+    else:
+        with open(path, encoding="utf-8") as f:
+            titles = [line.strip() for line in f]
+    titles = [title.replace("_", " ") for title in titles if title]
+    return random.Random(0).sample(titles, min(sample, len(titles)))
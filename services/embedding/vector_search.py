@@ -0,0 +1,133 @@
+"""
+Vector scoring helpers for the embedding server.
+
+Scores are cosine similarities computed as a float32 matrix multiply on
+L2-normalized vectors, and the best matches are picked with a partial
+selection instead of a full sort. Large document matrices are scored in
+row blocks, so the score buffer stays small and a memory-mapped matrix is
+streamed through once per query batch.
+"""
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Rows scored per block in blocked_top_k (24 MB of 384-d float32)
+BLOCK_ROWS = 16384
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Return float32 copies of the rows scaled to unit length."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, np.finfo(np.float32).tiny)
+
+
+def top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pick the k highest scores of every row, best first.
+
+    Args:
+        scores: Matrix of shape (num_queries, num_documents)
+        k: Number of matches per row; capped at num_documents
+
+    Returns:
+        (indices, scores), both of shape (num_queries, min(k, num_documents))
+    """
+    k = min(k, scores.shape[1])
+    if k == 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(scores.dtype)
+    if k < scores.shape[1]:
+        indices = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        indices = np.broadcast_to(np.arange(k), scores.shape).copy()
+    best = np.take_along_axis(scores, indices, axis=1)
+    order = np.argsort(-best, axis=1, kind="stable")
+    return (
+        np.take_along_axis(indices, order, axis=1),
+        np.take_along_axis(best, order, axis=1),
+    )
+
+
+def top_k_cosine(
+    queries: np.ndarray,
+    documents: np.ndarray,
+    k: int,
+    min_score: Optional[float] = None,
+) -> List[List[Tuple[int, float]]]:
+    """
+    Find the k documents most similar to each query.
+
+    Args:
+        queries: Matrix of shape (num_queries, dim)
+        documents: Matrix of shape (num_documents, dim)
+        k: Number of matches per query
+        min_score: Drop matches scoring below this
+
+    Returns:
+        One list of (document_index, score) pairs per query, best first
+    """
+    scores = normalize(queries) @ normalize(documents).T
+    indices, best = top_k(scores, k)
+    results = []
+    for row_indices, row_scores in zip(indices, best):
+        if min_score is not None:
+            keep = row_scores >= min_score
+            row_indices, row_scores = row_indices[keep], row_scores[keep]
+        results.append(list(zip(row_indices.tolist(), row_scores.tolist())))
+    return results
+
+
+def pack_mask(mask: np.ndarray) -> np.ndarray:
+    """Pack a boolean row mask into a bitmap, bit i of byte i // 8 per row."""
+    return np.packbits(mask, bitorder="little")
+
+
+def blocked_top_k(
+    queries: np.ndarray,
+    documents: np.ndarray,
+    k: int,
+    block_rows: int = BLOCK_ROWS,
+    allowed: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find the k highest dot products per query, one block of documents at a time.
+
+    Both sides are expected to be L2-normalized already, so the scores are
+    cosine similarities. Each block keeps its own top k, which is merged into
+    the running best, so memory is bounded by the block size and not by the
+    number of documents.
+
+    Args:
+        queries: Matrix of shape (num_queries, dim)
+        documents: Matrix of shape (num_documents, dim), may be a np.memmap
+        k: Number of matches per query
+        block_rows: Documents scored per block, a multiple of 8
+        allowed: Optional bitmap from pack_mask(); only documents whose bit is
+            set are scored
+
+    Returns:
+        (indices, scores), both of shape (num_queries, min(k, candidates))
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+    best_indices = np.empty((len(queries), 0), dtype=np.int64)
+    best_scores = np.empty((len(queries), 0), dtype=np.float32)
+    for start in range(0, len(documents), block_rows):
+        block = documents[start : start + block_rows]
+        if allowed is None:
+            indices, scores = top_k(queries @ block.T, k)
+            indices += start
+        else:
+            rows = np.flatnonzero(
+                np.unpackbits(
+                    allowed[start // 8 :], count=len(block), bitorder="little"
+                )
+            )
+            indices, scores = top_k(queries @ block[rows].T, k)
+            indices = rows[indices] + start
+        merged_indices = np.concatenate([best_indices, indices], axis=1)
+        merged_scores = np.concatenate([best_scores, scores], axis=1)
+        order, best_scores = top_k(merged_scores, k)
+        best_indices = np.take_along_axis(merged_indices, order, axis=1)
+    return best_indices, best_scores
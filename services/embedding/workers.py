@@ -0,0 +1,355 @@
+"""
+Multi-process inference workers for the embedding server.
+
+A single process running SentenceTransformer is held back by the GIL during
+tokenization and by one torch thread pool. WorkerPool starts N model
+processes, each pinned to a disjoint set of cores with its own torch
+intra-op thread count. The parent hands each batch to an idle worker through
+the worker's own queue, so the next batch always goes to a free worker and
+the parent knows which job every worker is running. Embeddings come back
+through a per-worker shared memory slot instead of being pickled.
+
+A worker that fails to load the model fails the pool's startup. The workers'
+liveness is checked every POLL_SECONDS, busy or not; a worker that dies later,
+e.g. killed for memory or crashed in native code, fails the job it was handed
+instead of leaving its caller waiting. Once no worker is left, every job fails.
+"""
+
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Seconds between liveness checks of the workers
+POLL_SECONDS = 1.0
+
+
+def _load_worker_model(
+    model_name: str, backend: str, model_file: Optional[str], threads: int
+):
+    """Load the model in a worker process with `threads` torch threads."""
+    import torch
+
+    from backends import load_model
+
+    torch.set_num_threads(threads)
+    return load_model(model_name, backend, model_file)
+
+
+def _worker_main(
+    index: int,
+    model_name: str,
+    backend: str,
+    model_file: Optional[str],
+    cores: List[int],
+    threads: int,
+    load_model: Callable,
+    jobs,
+    results,
+    slot_name: str,
+    slot_free,
+    max_rows: int,
+    dim: int,
+):
+    """Entry point of a worker process."""
+    os.sched_setaffinity(0, cores)
+
+    try:
+        model = load_model(model_name, backend, model_file, threads)
+    except (Exception, SystemExit) as e:
+        results.put(("failed", index, None, f"{type(e).__name__}: {e}"))
+        return
+
+    # Spawned workers share the parent's resource tracker, and the parent
+    # unlinks the segment in close()
+    slot = shared_memory.SharedMemory(name=slot_name)
+    out = np.ndarray((max_rows, dim), dtype=np.float32, buffer=slot.buf)
+    results.put(("ready", index, None, None))
+
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        job_id, texts, prompt_name = job
+        try:
+            embeddings = model.encode(
+                texts, prompt_name=prompt_name, batch_size=len(texts)
+            )
+            slot_free.wait()
+            slot_free.clear()
+            out[: len(texts)] = embeddings
+            results.put(("done", index, job_id, len(texts)))
+        except Exception as e:
+            results.put(("error", index, job_id, f"{type(e).__name__}: {e}"))
+
+    del out
+    slot.close()
+
+
+class WorkerPool:
+    """Pool of model processes, each handed one job at a time."""
+
+    def __init__(
+        self,
+        model_name: str,
+        backend: str,
+        model_file: Optional[str],
+        num_workers: int,
+        max_batch_size: int,
+        dim: int,
+        threads_per_worker: Optional[int] = None,
+        load_model: Callable = _load_worker_model,
+    ):
+        """
+        Start the worker processes and wait until every model is loaded.
+
+        Args:
+            model_name: Model each worker loads
+            backend: Backend each worker runs the model on
+            model_file: ONNX file inside the model directory, if any
+            num_workers: Number of worker processes
+            max_batch_size: Largest number of texts sent to a worker at once
+            dim: Embedding dimension of the model
+            threads_per_worker: Torch intra-op threads per worker, defaults to
+                the worker's share of the available cores
+            load_model: Module-level function called in each worker as
+                load_model(model_name, backend, model_file, threads) to get
+                an object with SentenceTransformer's encode()
+        """
+        self.max_batch_size = max_batch_size
+        self.dim = dim
+        ctx = mp.get_context("spawn")
+        self._results = ctx.Queue()
+        self._pending: Dict[int, Future] = {}
+        # Jobs waiting for an idle worker
+        self._queued: Deque[Tuple[int, List[str], Optional[str]]] = deque()
+        self._next_job = 0
+        self._lock = threading.Lock()
+
+        cores = sorted(os.sched_getaffinity(0))
+        per_worker = max(1, len(cores) // num_workers)
+        threads = threads_per_worker or per_worker
+
+        self._slots = []
+        self._slot_free = []
+        self._inboxes = []
+        # Job each worker was handed, set before the job is sent to it
+        self._assigned: List[Optional[int]] = []
+        self._processes = []
+        self._dead = set()
+        for index in range(num_workers):
+            slot = shared_memory.SharedMemory(
+                create=True, size=max_batch_size * dim * 4
+            )
+            slot_free = ctx.Event()
+            slot_free.set()
+            inbox = ctx.Queue()
+            # Wrap around when there are more workers than cores
+            start = (index * per_worker) % len(cores)
+            worker_cores = cores[start : start + per_worker]
+            process = ctx.Process(
+                target=_worker_main,
+                args=(
+                    index,
+                    model_name,
+                    backend,
+                    model_file,
+                    worker_cores,
+                    threads,
+                    load_model,
+                    inbox,
+                    self._results,
+                    slot.name,
+                    slot_free,
+                    max_batch_size,
+                    dim,
+                ),
+                name=f"embedding-worker-{index}",
+                daemon=True,
+            )
+            process.start()
+            self._slots.append(slot)
+            self._slot_free.append(slot_free)
+            self._inboxes.append(inbox)
+            self._assigned.append(None)
+            self._processes.append(process)
+            logging.info(
+                f"Started worker {index} (pid {process.pid}) on cores {worker_cores} "
+                f"with {threads} torch threads"
+            )
+
+        try:
+            self._wait_ready()
+        except RuntimeError:
+            self._terminate()
+            raise
+        logging.info(f"All {num_workers} workers loaded the model")
+
+        self._collector = threading.Thread(
+            target=self._collect, name="worker-results", daemon=True
+        )
+        self._collector.start()
+
+    def _wait_ready(self):
+        """Wait for every worker to load the model, failing if one cannot."""
+        ready = 0
+        while ready < len(self._processes):
+            try:
+                kind, index, _, payload = self._results.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                for index, process in enumerate(self._processes):
+                    if process.exitcode is not None:
+                        raise RuntimeError(
+                            f"Worker {index} exited with code {process.exitcode} "
+                            "while loading the model"
+                        )
+                continue
+            if kind == "failed":
+                raise RuntimeError(
+                    f"Worker {index} failed to load the model: {payload}"
+                )
+            ready += 1
+
+    def _check_workers(self):
+        """Fail the jobs of workers that died since the last check."""
+        for index, process in enumerate(self._processes):
+            if index in self._dead or process.exitcode is None:
+                continue
+            error = RuntimeError(
+                f"Worker {index} (pid {process.pid}) exited with code {process.exitcode}"
+            )
+            logging.error(str(error))
+            with self._lock:
+                self._dead.add(index)
+                failed = [self._pending.pop(self._assigned[index], None)]
+                self._assigned[index] = None
+                if len(self._dead) == len(self._processes):
+                    # Nobody is left to take the queued jobs
+                    failed.extend(self._pending.values())
+                    self._pending.clear()
+                    self._queued.clear()
+            for future in failed:
+                if future is not None:
+                    future.set_exception(error)
+
+    def _dispatch(self):
+        """Hand queued jobs to idle workers. Called with the lock held."""
+        for index, assigned in enumerate(self._assigned):
+            if not self._queued:
+                return
+            if assigned is None and index not in self._dead:
+                job = self._queued.popleft()
+                self._assigned[index] = job[0]
+                self._inboxes[index].put(job)
+
+    def submit(self, texts: List[str], prompt_name: Optional[str] = None) -> Future:
+        """Queue at most max_batch_size texts for the next idle worker."""
+        future = Future()
+        with self._lock:
+            if len(self._dead) == len(self._processes):
+                future.set_exception(RuntimeError("All worker processes exited"))
+                return future
+            job_id = self._next_job
+            self._next_job += 1
+            self._pending[job_id] = future
+            self._queued.append((job_id, texts, prompt_name))
+            self._dispatch()
+        return future
+
+    def encode(self, texts: List[str], prompt_name: Optional[str] = None) -> np.ndarray:
+        """
+        Encode texts on the workers, splitting them into slot-sized jobs.
+
+        Returns:
+            numpy array of shape (len(texts), dim)
+        """
+        return self.encode_many([texts], prompt_name)[0]
+
+    def encode_many(
+        self, groups: List[List[str]], prompt_name: Optional[str] = None
+    ) -> List[np.ndarray]:
+        """
+        Encode several groups of texts, keeping each job within one group.
+
+        All jobs are queued before waiting, so groups run in parallel.
+
+        Returns:
+            One numpy array per group
+        """
+        jobs = [
+            [
+                self.submit(group[start : start + self.max_batch_size], prompt_name)
+                for start in range(0, len(group), self.max_batch_size)
+            ]
+            for group in groups
+        ]
+        return [np.concatenate([job.result() for job in group]) for group in jobs]
+
+    def _collect(self):
+        checked = time.monotonic()
+        while True:
+            # Results keep coming under load, so check on a timer rather than
+            # only when the queue is idle
+            if time.monotonic() - checked >= POLL_SECONDS:
+                self._check_workers()
+                checked = time.monotonic()
+            try:
+                kind, index, job_id, payload = self._results.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                continue
+            if kind == "stop":
+                return
+            with self._lock:
+                future = self._pending.pop(job_id, None)
+                if self._assigned[index] == job_id:
+                    self._assigned[index] = None
+                    self._dispatch()
+            if future is None:
+                # Already failed when its worker was found dead
+                self._slot_free[index].set()
+                continue
+            if kind == "error":
+                future.set_exception(RuntimeError(f"Worker {index} failed: {payload}"))
+                continue
+
+            slot = np.ndarray(
+                (payload, self.dim), dtype=np.float32, buffer=self._slots[index].buf
+            )
+            embeddings = slot.copy()
+            del slot
+            self._slot_free[index].set()
+            future.set_result(embeddings)
+
+    def close(self):
+        """Stop the workers and release the shared memory slots."""
+        with self._lock:
+            queued = [self._pending.pop(job_id, None) for job_id, _, _ in self._queued]
+            self._queued.clear()
+        for future in queued:
+            if future is not None:
+                future.set_exception(RuntimeError("Worker pool closed"))
+        for inbox in self._inboxes:
+            inbox.put(None)
+        for process in self._processes:
+            process.join(timeout=30)
+        self._results.put(("stop", None, None, None))
+        self._collector.join()
+        self._terminate()
+
+    def _terminate(self):
+        """Kill workers that are still running and release the slots."""
+        for process in self._processes:
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        for slot in self._slots:
+            slot.close()
+            slot.unlink()
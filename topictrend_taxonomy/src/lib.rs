@@ -17,10 +17,12 @@ use qdrant_client::{
     },
 };
 
-use std::sync::Arc;
+use std::sync::{Arc, OnceLock};
 
 pub use crate::models::SearchResult;
 use crate::sentence_embedder::SentenceEmbedder;
+pub use crate::sentence_embedder::StageTimings;
+use crate::sentence_embedder::embedding::Priority;
 mod models;
 mod sentence_embedder;
 
@@ -33,6 +35,19 @@ pub async fn get_connection() -> Result<Qdrant, Box<dyn Error>> {
     Ok(client)
 }
 
+/// The embedding server client shared by every search and ingestion.
+///
+/// Created on first use and cloned per call, so the replica channels are
+/// shared and their outstanding calls, failures and latencies accumulate
+/// across calls for the balancing and hedging to use.
+fn embedder() -> Result<SentenceEmbedder, Box<dyn Error>> {
+    static EMBEDDER: OnceLock<Result<SentenceEmbedder, String>> = OnceLock::new();
+    match EMBEDDER.get_or_init(|| SentenceEmbedder::new().map_err(|e| e.to_string())) {
+        Ok(embedder) => Ok(embedder.clone()),
+        Err(e) => Err(e.clone().into()),
+    }
+}
+
 pub async fn injest(db: &Qdrant, wiki: String) -> Result<(), Box<dyn std::error::Error>> {
     let data_dir = std::env::var("DATA_DIR").unwrap_or_else(|_| "data".to_string());
     let parquet_path = format!("{}/{}/categories.parquet", data_dir, wiki);
@@ -67,7 +82,8 @@ pub async fn injest(db: &Qdrant, wiki: String) -> Result<(), Box<dyn std::error:
     println!("Found {} records to process", total_records);
     let mut processed = 0;
     let mut batch = Vec::new();
-    let mut encoder = SentenceEmbedder::new().await?;
+    let mut encoder = embedder()?;
+    encoder.set_priority(Priority::Bulk);
     for (page_qid, page_title) in page_ids_vec.into_iter().zip(page_titles_vec.into_iter()) {
         if let (Some(qid), Some(title)) = (page_qid, page_title) {
             batch.push((qid, title));
@@ -158,11 +174,117 @@ pub async fn search(
     wiki: String,
     limit: u64,
 ) -> Result<Vec<SearchResult>, Box<dyn std::error::Error>> {
-    let client = get_connection().await?;
+    Ok(search_filtered(query, wiki, None, limit).await?.0)
+}
+
+/// Search `wiki`'s categories, keeping only those that also exist in `target_wiki`.
+///
+/// When the embedding server serves the collection, the filter is applied
+/// before the top `limit` results are picked. On the Qdrant fallback the
+/// results are unfiltered, so callers still need their own QID lookup.
+pub async fn search_in_wiki(
+    query: String,
+    wiki: String,
+    target_wiki: String,
+    limit: u64,
+) -> Result<Vec<SearchResult>, Box<dyn std::error::Error>> {
+    Ok(search_in_wiki_timed(query, wiki, target_wiki, limit)
+        .await?
+        .0)
+}
+
+/// `search_in_wiki`, also returning where the embedding server spent its time.
+///
+/// The timings cover the server side of the call that encoded the query; on
+/// the Qdrant fallback the vector search itself is not included.
+pub async fn search_in_wiki_timed(
+    query: String,
+    wiki: String,
+    target_wiki: String,
+    limit: u64,
+) -> Result<(Vec<SearchResult>, Option<StageTimings>), Box<dyn std::error::Error>> {
+    let target_wiki = (target_wiki != wiki).then_some(target_wiki);
+    search_filtered(query, wiki, target_wiki, limit).await
+}
+
+/// Search `wiki`'s categories for several queries, filtered like `search_in_wiki`.
+///
+/// When the embedding server serves the collection, all queries are encoded
+/// and scored in one batched call. Otherwise each query is searched in Qdrant.
+pub async fn search_many_in_wiki(
+    queries: Vec<String>,
+    wiki: String,
+    target_wiki: String,
+    limit: u64,
+) -> Result<Vec<Vec<SearchResult>>, Box<dyn std::error::Error>> {
+    let collection_name = format!("{}-categories", wiki);
+    let target_wiki = (target_wiki != wiki).then_some(target_wiki);
+    let mut encoder = embedder()?;
+    encoder.set_hedging(true, None);
+
+    match encoder
+        .batch_search(&queries, &collection_name, target_wiki.as_deref(), limit)
+        .await
+    {
+        Ok(batches) => {
+            return Ok(batches
+                .into_iter()
+                .map(|results| results.into_iter().map(SearchResult::from).collect())
+                .collect());
+        }
+        Err(status) if corpus_unavailable(&status) => {}
+        Err(status) => return Err(status.into()),
+    }
+
+    let mut results = Vec::with_capacity(queries.len());
+    for query in &queries {
+        results.push(search_qdrant(&mut encoder, query, &collection_name, limit).await?);
+    }
+    Ok(results)
+}
+
+async fn search_filtered(
+    query: String,
+    wiki: String,
+    target_wiki: Option<String>,
+    limit: u64,
+) -> Result<(Vec<SearchResult>, Option<StageTimings>), Box<dyn std::error::Error>> {
     let collection_name = format!("{}-categories", wiki);
+    let mut encoder = embedder()?;
+    // Interactive searches are hedged when there are several replicas
+    encoder.set_hedging(true, None);
+
+    // Served in one round trip when the embedding server preloaded this collection
+    let results = match encoder
+        .search(&query, &collection_name, target_wiki.as_deref(), limit)
+        .await
+    {
+        Ok(results) => results.into_iter().map(SearchResult::from).collect(),
+        Err(status) if corpus_unavailable(&status) => {
+            search_qdrant(&mut encoder, &query, &collection_name, limit).await?
+        }
+        Err(status) => return Err(status.into()),
+    };
+
+    Ok((results, encoder.last_timings().cloned()))
+}
+
+/// Whether the embedding server lacks the corpus or allowlist for a search.
+fn corpus_unavailable(status: &tonic::Status) -> bool {
+    matches!(
+        status.code(),
+        tonic::Code::FailedPrecondition | tonic::Code::NotFound | tonic::Code::Unimplemented
+    )
+}
 
-    let mut encoder = SentenceEmbedder::new().await?;
-    let query_embedding = encoder.encode(&query).await?;
+async fn search_qdrant(
+    encoder: &mut SentenceEmbedder,
+    query: &str,
+    collection_name: &str,
+    limit: u64,
+) -> Result<Vec<SearchResult>, Box<dyn std::error::Error>> {
+    let client = get_connection().await?;
+    let query_embedding = encoder.encode(query).await?;
 
     let search_result = client
         .search_points(
@@ -217,9 +339,7 @@ mod integration_tests {
             (5u32, "ഡീപ് ലേങിങ്ങ്".to_string()),
         ];
 
-        let mut encoder = SentenceEmbedder::new()
-            .await
-            .expect("Failed to create encoder");
+        let mut encoder = SentenceEmbedder::new().expect("Failed to create encoder");
         let embeddings_result = fetch_embeddings(&mut encoder, &batch).await;
 
         match embeddings_result {
@@ -19,6 +19,16 @@ impl fmt::Display for SearchResult {
     }
 }
 
+impl From<crate::sentence_embedder::embedding::SearchResult> for SearchResult {
+    fn from(result: crate::sentence_embedder::embedding::SearchResult) -> Self {
+        SearchResult {
+            score: result.score,
+            qid: result.qid,
+            page_title: result.page_title,
+        }
+    }
+}
+
 // Internal helper to convert from Qdrant payload
 impl SearchResult {
     pub(crate) fn from_qdrant_result(score: f32, payload: HashMap<String, Value>) -> Option<Self> {
@@ -1,4 +1,15 @@
-use tonic::Request;
+use std::borrow::Cow;
+use std::collections::{HashMap, VecDeque};
+use std::fmt;
+use std::future::Future;
+use std::sync::atomic::{AtomicUsize, Ordering};
+use std::sync::{Arc, Mutex};
+use std::time::{Duration, Instant};
+
+use byteorder::{ByteOrder, LittleEndian};
+use tonic::metadata::{KeyAndValueRef, MetadataMap};
+use tonic::transport::{Channel, Endpoint};
+use tonic::{Code, Request, Response, Status};
 
 // Include the generated protobuf code
 pub mod embedding {
@@ -7,19 +18,359 @@ pub mod embedding {
 
 use embedding::HealthCheckRequest;
 use embedding::embedding_service_client::EmbeddingServiceClient;
-use embedding::{EncodeRequest, SimilarityRequest};
+use embedding::{
+    BatchSearchRequest, EncodeAndSearchRequest, EncodeRequest, Priority, SearchResult,
+    SimilarityRequest, Tensor,
+};
+
+/// Prefix of the trailing metadata keys carrying the server's stage timings.
+const TIMING_METADATA_PREFIX: &str = "x-embedding-";
+
+/// Recent latencies kept per RPC to derive the hedging delay from.
+const LATENCY_WINDOW: usize = 256;
+/// An RPC is only hedged once this many of its latencies have been seen.
+const HEDGE_MIN_SAMPLES: usize = 20;
+/// How long a replica that could not be reached is only picked as a last resort.
+const FAILURE_BACKOFF: Duration = Duration::from_secs(5);
+/// Time allowed to open a connection to a replica before the call fails.
+const CONNECT_TIMEOUT: Duration = Duration::from_secs(2);
+
+/// Where the embedding server spent the time of one call.
+///
+/// Read from the call's trailing metadata. Stages are the ones the server
+/// reports, e.g. `queue`, `tokenize`, `forward`, `search` and `serialize`,
+/// plus `total` for the whole call inside the server.
+#[derive(Clone, Debug, Default)]
+pub struct StageTimings {
+    /// (stage, milliseconds) in the order the server reported them
+    pub stages: Vec<(String, f64)>,
+    /// Texts in the merged batch the request rode in
+    pub batch_size: Option<u32>,
+    /// Texts answered from the cache or by a concurrent request
+    pub reused: Option<u32>,
+}
+
+impl StageTimings {
+    fn from_metadata(metadata: &MetadataMap) -> Self {
+        let mut timings = Self::default();
+        for entry in metadata.iter() {
+            let KeyAndValueRef::Ascii(key, value) = entry else {
+                continue;
+            };
+            let (Some(name), Ok(value)) = (
+                key.as_str().strip_prefix(TIMING_METADATA_PREFIX),
+                value.to_str(),
+            ) else {
+                continue;
+            };
+            match name {
+                "batch-size" => timings.batch_size = value.parse().ok(),
+                "reused" => timings.reused = value.parse().ok(),
+                _ => {
+                    if let (Some(stage), Ok(ms)) = (name.strip_suffix("-ms"), value.parse()) {
+                        timings.stages.push((stage.to_string(), ms));
+                    }
+                }
+            }
+        }
+        timings
+    }
+
+    /// Milliseconds the server spent in `stage`, if it reported it.
+    pub fn stage_ms(&self, stage: &str) -> Option<f64> {
+        self.stages
+            .iter()
+            .find(|(name, _)| name == stage)
+            .map(|(_, ms)| *ms)
+    }
+}
+
+impl fmt::Display for StageTimings {
+    fn fmt(&self, f: &mut fmt::Formatter<'_>) -> fmt::Result {
+        let mut parts: Vec<String> = self
+            .stages
+            .iter()
+            .map(|(stage, ms)| format!("{}={:.2}ms", stage, ms))
+            .collect();
+        if let Some(batch_size) = self.batch_size {
+            parts.push(format!("batch_size={}", batch_size));
+        }
+        if let Some(reused) = self.reused {
+            parts.push(format!("reused={}", reused));
+        }
+        write!(f, "{}", parts.join(" "))
+    }
+}
+
+/// Outstanding calls and failures per endpoint, and recent latencies per RPC.
+///
+/// Shared by an embedder and its clones, so concurrent searches see each
+/// other's load, failures and latencies.
+#[derive(Default)]
+struct Balancer {
+    outstanding: Mutex<HashMap<String, usize>>,
+    /// Replicas that could not be reached, until when they are avoided
+    failing: Mutex<HashMap<String, Instant>>,
+    latencies: Mutex<HashMap<&'static str, VecDeque<Duration>>>,
+    /// Rotates the starting replica so ties are spread round robin
+    next: AtomicUsize,
+}
+
+impl Balancer {
+    /// Claim the replica with the fewest outstanding calls, other than `exclude`.
+    ///
+    /// Replicas that recently could not be reached are only picked when every
+    /// other one failed too.
+    fn pick(self: &Arc<Self>, replicas: &[Replica], exclude: Option<usize>) -> (usize, InFlight) {
+        let mut outstanding = self.outstanding.lock().unwrap();
+        let failing = self.failing.lock().unwrap();
+        let now = Instant::now();
+        let start = self.next.fetch_add(1, Ordering::Relaxed);
+        let index = (0..replicas.len())
+            .map(|i| (start + i) % replicas.len())
+            .filter(|&i| Some(i) != exclude)
+            .min_by_key(|&i| {
+                let endpoint = &replicas[i].endpoint;
+                (
+                    failing.get(endpoint).is_some_and(|until| *until > now),
+                    outstanding.get(endpoint).copied().unwrap_or(0),
+                )
+            })
+            .expect("no replica to pick");
+        drop(failing);
+        let endpoint = replicas[index].endpoint.clone();
+        *outstanding.entry(endpoint.clone()).or_default() += 1;
+        (
+            index,
+            InFlight {
+                balancer: Arc::clone(self),
+                endpoint,
+            },
+        )
+    }
+
+    fn record(&self, rpc: &'static str, latency: Duration) {
+        let mut latencies = self.latencies.lock().unwrap();
+        let window = latencies.entry(rpc).or_default();
+        if window.len() == LATENCY_WINDOW {
+            window.pop_front();
+        }
+        window.push_back(latency);
+    }
 
+    /// p95 latency of the recent calls of `rpc`, once enough were seen.
+    fn p95(&self, rpc: &'static str) -> Option<Duration> {
+        let latencies = self.latencies.lock().unwrap();
+        let window = latencies.get(rpc)?;
+        if window.len() < HEDGE_MIN_SAMPLES {
+            return None;
+        }
+        let mut sorted: Vec<Duration> = window.iter().copied().collect();
+        sorted.sort_unstable();
+        Some(sorted[(sorted.len() - 1) * 95 / 100])
+    }
+}
+
+/// A call counted as outstanding on its replica until it is dropped.
+struct InFlight {
+    balancer: Arc<Balancer>,
+    endpoint: String,
+}
+
+impl InFlight {
+    /// Note whether the replica could be reached for the call.
+    fn finish<T>(&self, result: &Result<T, Status>) {
+        let mut failing = self.balancer.failing.lock().unwrap();
+        match result {
+            Err(status) if status.code() == Code::Unavailable => {
+                let until = Instant::now() + FAILURE_BACKOFF;
+                if failing.insert(self.endpoint.clone(), until).is_none() {
+                    eprintln!(
+                        "Embedding server {} is unavailable: {}",
+                        self.endpoint,
+                        status.message()
+                    );
+                }
+            }
+            _ => {
+                failing.remove(&self.endpoint);
+            }
+        }
+    }
+}
+
+impl Drop for InFlight {
+    fn drop(&mut self) {
+        let mut outstanding = self.balancer.outstanding.lock().unwrap();
+        if let Some(count) = outstanding.get_mut(&self.endpoint) {
+            *count = count.saturating_sub(1);
+        }
+    }
+}
+
+struct Replica {
+    endpoint: String,
+    client: EmbeddingServiceClient<Channel>,
+}
+
+/// Client of a set of embedding server replicas.
+///
+/// Clones share the channels and the balancing state, and each has its own
+/// priority, hedging and last timings, so one embedder created at startup can
+/// be cloned for every search.
+#[derive(Clone)]
 pub struct SentenceEmbedder {
-    client: EmbeddingServiceClient<tonic::transport::Channel>,
+    replicas: Arc<[Replica]>,
+    balancer: Arc<Balancer>,
+    priority: Priority,
+    hedge: bool,
+    hedge_delay: Option<Duration>,
+    last_timings: Option<StageTimings>,
 }
 
 impl SentenceEmbedder {
-    pub async fn new() -> Result<Self, Box<dyn std::error::Error>> {
+    /// Use the servers listed, comma separated, in `EMBEDDING_SERVER`.
+    pub fn new() -> Result<Self, Box<dyn std::error::Error + Send + Sync>> {
         let embedding_server = std::env::var("EMBEDDING_SERVER")
             .unwrap_or_else(|_| "http://localhost:50051".to_string());
-        let client = EmbeddingServiceClient::connect(embedding_server).await?;
+        Self::connect(embedding_server.split(','))
+    }
 
-        Ok(Self { client })
+    /// Use every endpoint of a set of server replicas.
+    ///
+    /// Channels connect lazily and reconnect on their own, so a replica that is
+    /// down now is used again once it is back. Each call goes to the replica
+    /// with the fewest calls outstanding from this embedder and its clones; one
+    /// that could not be reached is avoided for a while, and a call it failed is
+    /// retried once on another replica. Fails only on malformed endpoints.
+    ///
+    /// Must be called inside a Tokio runtime.
+    pub fn connect<I, S>(endpoints: I) -> Result<Self, Box<dyn std::error::Error + Send + Sync>>
+    where
+        I: IntoIterator<Item = S>,
+        S: AsRef<str>,
+    {
+        let mut replicas = Vec::new();
+        for endpoint in endpoints {
+            let endpoint = endpoint.as_ref().trim().to_string();
+            if endpoint.is_empty() {
+                continue;
+            }
+            let channel = Endpoint::from_shared(endpoint.clone())?
+                .connect_timeout(CONNECT_TIMEOUT)
+                .connect_lazy();
+            replicas.push(Replica {
+                endpoint,
+                client: EmbeddingServiceClient::new(channel),
+            });
+        }
+        if replicas.is_empty() {
+            return Err("no embedding server endpoint given".into());
+        }
+
+        Ok(Self {
+            replicas: replicas.into(),
+            balancer: Arc::default(),
+            priority: Priority::Default,
+            hedge: false,
+            hedge_delay: None,
+            last_timings: None,
+        })
+    }
+
+    /// Server-side stage timings of the last successful call.
+    pub fn last_timings(&self) -> Option<&StageTimings> {
+        self.last_timings.as_ref()
+    }
+
+    /// Set the scheduling lane of every request sent from now on.
+    ///
+    /// Ingestion jobs use `Priority::Bulk` so they do not delay interactive
+    /// searches sharing the same embedding server.
+    pub fn set_priority(&mut self, priority: Priority) {
+        self.priority = priority;
+    }
+
+    /// Hedge the calls sent from now on across replicas.
+    ///
+    /// A hedged call is sent to a second replica as well when the first has
+    /// not answered after `delay`, or after the p95 latency of the recent
+    /// calls of the same RPC when `delay` is `None`; the first answer wins.
+    /// Bulk calls and embedders with a single replica are never hedged.
+    pub fn set_hedging(&mut self, hedge: bool, delay: Option<Duration>) {
+        self.hedge = hedge;
+        self.hedge_delay = delay;
+    }
+
+    fn hedge_delay(&self, rpc: &'static str) -> Option<Duration> {
+        if !self.hedge || self.priority == Priority::Bulk || self.replicas.len() < 2 {
+            return None;
+        }
+        self.hedge_delay.or_else(|| self.balancer.p95(rpc))
+    }
+
+    /// Make a unary call on the least loaded replica, hedged when enabled.
+    ///
+    /// A call whose replica could not be reached is sent again to another one.
+    async fn call<Req, Resp, F, Fut>(
+        &mut self,
+        rpc: &'static str,
+        request: Req,
+        call: F,
+    ) -> Result<Response<Resp>, Status>
+    where
+        Req: Clone,
+        F: Fn(EmbeddingServiceClient<Channel>, Req) -> Fut,
+        Fut: Future<Output = Result<Response<Resp>, Status>>,
+    {
+        let balancer = Arc::clone(&self.balancer);
+        let replicas = &self.replicas;
+        let call = &call;
+        let attempt = |index: usize, in_flight: InFlight, request: Req| {
+            let client = replicas[index].client.clone();
+            async move {
+                let result = call(client, request).await;
+                in_flight.finish(&result);
+                result
+            }
+        };
+        let started = Instant::now();
+        let delay = self.hedge_delay(rpc);
+        // A second copy of the request for the hedge or the retry
+        let spare = (replicas.len() > 1).then(|| request.clone());
+        let (first, in_flight) = balancer.pick(replicas, None);
+        let primary = attempt(first, in_flight, request);
+        tokio::pin!(primary);
+        let result = tokio::select! {
+            result = &mut primary => match (result, spare) {
+                (Err(status), Some(request)) if status.code() == Code::Unavailable => {
+                    let (second, in_flight) = balancer.pick(replicas, Some(first));
+                    attempt(second, in_flight, request).await
+                }
+                (result, _) => result,
+            },
+            _ = tokio::time::sleep(delay.unwrap_or_default()), if delay.is_some() => {
+                let request = spare.expect("hedged calls have several replicas");
+                let (second, in_flight) = balancer.pick(replicas, Some(first));
+                let hedged = attempt(second, in_flight, request);
+                tokio::pin!(hedged);
+                // The first answer wins; after an error, wait for the other call
+                tokio::select! {
+                    result = &mut primary => match result {
+                        Ok(response) => Ok(response),
+                        Err(_) => hedged.await,
+                    },
+                    result = &mut hedged => match result {
+                        Ok(response) => Ok(response),
+                        Err(_) => primary.await,
+                    },
+                }
+            }
+        };
+        if result.is_ok() {
+            balancer.record(rpc, started.elapsed());
+        }
+        result
     }
 
     pub async fn encode(&mut self, text: &str) -> Result<Vec<f32>, Box<dyn std::error::Error>> {
@@ -36,21 +387,143 @@ impl SentenceEmbedder {
         let request = EncodeRequest {
             texts: texts_owned,
             prompt_name: None,
+            packed: true,
+            priority: self.priority as i32,
+        };
+
+        let response = self
+            .call("Encode", request, |mut client, request| async move {
+                client.encode(Request::new(request)).await
+            })
+            .await?;
+        // tonic merges the trailers of a unary call into its metadata
+        self.last_timings = Some(StageTimings::from_metadata(response.metadata()));
+        let response = response.into_inner();
+        match response.tensor {
+            Some(tensor) => {
+                let dim = tensor.dim as usize;
+                let values = tensor_as_f32(&tensor)?;
+                Ok(values.chunks(dim.max(1)).map(|row| row.to_vec()).collect())
+            }
+            // Server predates the packed format
+            None => Ok(response.embeddings.into_iter().map(|e| e.values).collect()),
+        }
+    }
+
+    /// Search the category corpus preloaded in the embedding server.
+    ///
+    /// With `wiki`, only categories that exist in that wiki are returned.
+    /// Fails with `FailedPrecondition` when the server has no corpus, and with
+    /// `NotFound` when its corpus was exported from another collection or it
+    /// has no category list for `wiki`.
+    pub async fn search(
+        &mut self,
+        query: &str,
+        collection: &str,
+        wiki: Option<&str>,
+        k: u64,
+    ) -> Result<Vec<SearchResult>, tonic::Status> {
+        let request = EncodeAndSearchRequest {
+            query: query.to_string(),
+            k: k as i32,
+            prompt_name: None,
+            collection: Some(collection.to_string()),
+            wiki: wiki.map(str::to_string),
+            priority: self.priority as i32,
         };
 
-        let response = self.client.encode(Request::new(request)).await?;
-        let embeddings = response.into_inner().embeddings;
+        let response = self
+            .call(
+                "EncodeAndSearch",
+                request,
+                |mut client, request| async move {
+                    client.encode_and_search(Request::new(request)).await
+                },
+            )
+            .await?;
+        self.last_timings = Some(StageTimings::from_metadata(response.metadata()));
+        Ok(response.into_inner().results)
+    }
 
-        Ok(embeddings.into_iter().map(|e| e.values).collect())
+    /// Search the preloaded corpus for several queries in one call.
+    ///
+    /// Returns one result list per query, in order. Fails like `search`.
+    pub async fn batch_search(
+        &mut self,
+        queries: &[String],
+        collection: &str,
+        wiki: Option<&str>,
+        k: u64,
+    ) -> Result<Vec<Vec<SearchResult>>, tonic::Status> {
+        let request = BatchSearchRequest {
+            queries: queries.to_vec(),
+            k: k as i32,
+            prompt_name: None,
+            collection: Some(collection.to_string()),
+            wiki: wiki.map(str::to_string),
+            priority: self.priority as i32,
+        };
+
+        let response = self
+            .call("BatchSearch", request, |mut client, request| async move {
+                client.batch_search(Request::new(request)).await
+            })
+            .await?;
+        self.last_timings = Some(StageTimings::from_metadata(response.metadata()));
+        Ok(response
+            .into_inner()
+            .results
+            .into_iter()
+            .map(|entry| entry.results)
+            .collect())
     }
 }
 
+/// View a packed float32 tensor as `&[f32]`.
+///
+/// The buffer is reinterpreted in place when it is suitably aligned on a
+/// little-endian host, and decoded into a new vector otherwise.
+pub fn tensor_as_f32(tensor: &Tensor) -> Result<Cow<'_, [f32]>, Box<dyn std::error::Error>> {
+    if tensor.dtype != "float32" {
+        return Err(format!("unsupported tensor dtype: {}", tensor.dtype).into());
+    }
+    let expected = tensor.rows as usize * tensor.dim as usize * std::mem::size_of::<f32>();
+    if tensor.data.len() != expected {
+        return Err(format!(
+            "tensor holds {} bytes, expected {} for {}x{}",
+            tensor.data.len(),
+            expected,
+            tensor.rows,
+            tensor.dim
+        )
+        .into());
+    }
+
+    if cfg!(target_endian = "little") {
+        // SAFETY: every bit pattern is a valid f32, and align_to only returns
+        // the bytes that are correctly aligned in the middle slice.
+        let (prefix, values, suffix) = unsafe { tensor.data.align_to::<f32>() };
+        if prefix.is_empty() && suffix.is_empty() {
+            return Ok(Cow::Borrowed(values));
+        }
+    }
+
+    let mut values = vec![0f32; tensor.data.len() / std::mem::size_of::<f32>()];
+    LittleEndian::read_f32_into(&tensor.data, &mut values);
+    Ok(Cow::Owned(values))
+}
+
 #[tokio::main]
 async fn main() -> Result<(), Box<dyn std::error::Error>> {
-    // Connect to the server
-    let embedding_server =
+    // Connect to the first server listed
+    let embedding_servers =
         std::env::var("EMBEDDING_SERVER").unwrap_or_else(|_| "http://localhost:50051".to_string());
-    let mut client = EmbeddingServiceClient::connect(embedding_server).await?;
+    let embedding_server = embedding_servers
+        .split(',')
+        .next()
+        .unwrap_or_default()
+        .trim();
+    let mut client = EmbeddingServiceClient::connect(embedding_server.to_string()).await?;
 
     // Health check
     println!("=== Health Check ===");
@@ -73,9 +546,15 @@ async fn main() -> Result<(), Box<dyn std::error::Error>> {
     let query_request = EncodeRequest {
         texts: queries.clone(),
         prompt_name: Some("query".to_string()),
+        packed: false,
+        priority: Priority::Interactive as i32,
     };
 
     let query_response = client.encode(Request::new(query_request)).await?;
+    println!(
+        "Server timings: {}",
+        StageTimings::from_metadata(query_response.metadata())
+    );
     let query_embeddings = query_response.into_inner().embeddings;
 
     println!("Encoded {} queries", query_embeddings.len());
@@ -94,6 +573,8 @@ async fn main() -> Result<(), Box<dyn std::error::Error>> {
     let doc_request = EncodeRequest {
         texts: documents.clone(),
         prompt_name: None,
+        packed: false,
+        priority: Priority::Interactive as i32,
     };
 
     let doc_response = client.encode(Request::new(doc_request)).await?;
@@ -106,6 +587,8 @@ async fn main() -> Result<(), Box<dyn std::error::Error>> {
     let similarity_request = SimilarityRequest {
         query_embeddings: query_embeddings.clone(),
         document_embeddings: document_embeddings.clone(),
+        top_k: None,
+        min_score: None,
     };
 
     let similarity_response = client
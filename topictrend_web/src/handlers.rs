@@ -6,6 +6,7 @@ use axum::{
 };
 use axum_macros::debug_handler;
 use std::sync::Arc;
+use std::time::Instant;
 
 use crate::{
     models::{
@@ -316,6 +317,34 @@ pub async fn get_article_delta_handler(
     }))
 }
 
+/// Search the English category embeddings for categories that exist in `wiki`.
+///
+/// Logs the end-to-end latency next to the embedding server's own stage
+/// timings at debug level, to tell queueing, the forward pass and network
+/// time apart when a search is slow.
+async fn search_categories_in_wiki(
+    query: String,
+    wiki: String,
+    limit: u64,
+) -> Result<Vec<topictrend_taxonomy::SearchResult>, ApiError> {
+    let started = Instant::now();
+    let (results, timings) =
+        topictrend_taxonomy::search_in_wiki_timed(query, "enwiki".to_string(), wiki, limit)
+            .await
+            .map_err(|e| {
+                ApiError::ServiceError(crate::services::ServiceError::CoreError(
+                    crate::services::core::CoreServiceError::InternalError(e.to_string()),
+                ))
+            })?;
+    tracing::debug!(
+        "Category search took {:.2?} ({} results); embedding server: {}",
+        started.elapsed(),
+        results.len(),
+        timings.map_or_else(|| "no timings".to_string(), |t| t.to_string())
+    );
+    Ok(results)
+}
+
 pub async fn search_categories(
     Query(params): Query<CategorySearchParams>,
     State(state): State<Arc<AppState>>,
@@ -323,14 +352,8 @@ pub async fn search_categories(
     let limit: u64 = params.limit.unwrap_or(1000u64);
     let match_threshold = params.match_threshold.unwrap_or(0.6);
 
-    let search_results: Vec<topictrend_taxonomy::SearchResult> =
-        topictrend_taxonomy::search(params.query.clone(), "enwiki".to_string(), limit)
-            .await
-            .map_err(|e| {
-                ApiError::ServiceError(crate::services::ServiceError::CoreError(
-                    crate::services::core::CoreServiceError::InternalError(e.to_string()),
-                ))
-            })?;
+    let search_results =
+        search_categories_in_wiki(params.query.clone(), params.wiki.clone(), limit).await?;
 
     let mut categories: Vec<CategorySearchItemResponse> = search_results
         .into_iter()
@@ -374,14 +397,9 @@ pub async fn get_categories_trend_by_search_handler(
 ) -> Result<Json<CategoriesTrendResponse>, ApiError> {
     let limit: u64 = params.limit.unwrap_or(1000u64);
     let match_threshold = params.match_threshold.unwrap_or(0.6);
-    let search_results: Vec<topictrend_taxonomy::SearchResult> =
-        topictrend_taxonomy::search(params.category_query.clone(), "enwiki".to_string(), limit)
-            .await
-            .map_err(|e| {
-                ApiError::ServiceError(crate::services::ServiceError::CoreError(
-                    crate::services::core::CoreServiceError::InternalError(e.to_string()),
-                ))
-            })?;
+    let search_results =
+        search_categories_in_wiki(params.category_query.clone(), params.wiki.clone(), limit)
+            .await?;
 
     let category_qids: Vec<u32> = search_results
         .into_iter()
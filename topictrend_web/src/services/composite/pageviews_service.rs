@@ -60,12 +60,14 @@ impl PageViewsService {
         let limit = 1000u64;
         let match_threshold = 0.6;
 
-        let search_results =
-            topictrend_taxonomy::search(category.to_string(), "enwiki".to_string(), limit)
-                .await
-                .map_err(|e| {
-                    CoreServiceError::InternalError(format!("Taxonomy search failed: {}", e))
-                })?;
+        let search_results = topictrend_taxonomy::search_in_wiki(
+            category.to_string(),
+            "enwiki".to_string(),
+            wiki.to_string(),
+            limit,
+        )
+        .await
+        .map_err(|e| CoreServiceError::InternalError(format!("Taxonomy search failed: {}", e)))?;
 
         let category_qids: Vec<u32> = search_results
             .into_iter()